@@ -7,5 +7,69 @@ class Settings:
     SECRET_KEY: str = os.environ["SECRET_KEY"]
     ALGORITHM: str = os.environ.get("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+    # Сколько недавно проверенных access-токенов держать без повторного jwt.decode
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = int(os.environ.get("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+    # Сколько секунд токен проверяется без обращения к БД (задержка отзыва в других воркерах)
+    AUTH_USER_CACHE_TTL_SECONDS: int = int(os.environ.get("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+    AUTH_USER_CACHE_MAX_ENTRIES: int = int(os.environ.get("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
+
+    # Параметры argon2; хэши со старыми параметрами пересчитываются при входе
+    ARGON2_TIME_COST: int = int(os.environ.get("ARGON2_TIME_COST", "3"))
+    ARGON2_MEMORY_COST_KIB: int = int(os.environ.get("ARGON2_MEMORY_COST_KIB", "65536"))
+    ARGON2_PARALLELISM: int = int(os.environ.get("ARGON2_PARALLELISM", "4"))
+    # Пул хэширования паролей: "thread" или "process"
+    AUTH_HASH_EXECUTOR: str = os.environ.get("AUTH_HASH_EXECUTOR", "thread")
+    AUTH_HASH_WORKERS: int = int(os.environ.get("AUTH_HASH_WORKERS", "2"))
+    # Сколько хэширований может ждать в очереди, сверх — 503
+    AUTH_HASH_MAX_PENDING: int = int(os.environ.get("AUTH_HASH_MAX_PENDING", "64"))
+
+    DB_EXECUTOR_WORKERS: int = int(os.environ.get("DB_EXECUTOR_WORKERS", "16"))
+
+    # Страница списков полей (keyset по id) и её верхняя граница
+    FIELDS_PAGE_SIZE: int = int(os.environ.get("FIELDS_PAGE_SIZE", "100"))
+    FIELDS_PAGE_MAX: int = int(os.environ.get("FIELDS_PAGE_MAX", "500"))
+
+    # Размер ячейки сетки пространственного индекса полей в градусах (~5 км)
+    FIELD_INDEX_CELL_DEG: float = float(os.environ.get("FIELD_INDEX_CELL_DEG", "0.05"))
+    FIELD_INDEX_MAX_OWNERS: int = int(os.environ.get("FIELD_INDEX_MAX_OWNERS", "1000"))
+    # Как часто сетка владельца сверяется с БД (изменения из других воркеров); 0 — не сверять
+    FIELD_INDEX_CHECK_SECONDS: float = float(os.environ.get("FIELD_INDEX_CHECK_SECONDS", "5"))
+
+    # Дисковый кэш векторных тайлов полей и параметры тайлов MVT
+    FIELD_TILE_CACHE_DIR: str = os.environ.get("FIELD_TILE_CACHE_DIR", ".cache/field-tiles")
+    FIELD_TILE_EXTENT: int = int(os.environ.get("FIELD_TILE_EXTENT", "4096"))
+    FIELD_TILE_BUFFER: int = int(os.environ.get("FIELD_TILE_BUFFER", "64"))
+
+    # Возраст снимка правил севооборота, после которого он перечитывается из БД
+    # (изменения справочника из других воркеров); 0 — только по событиям процесса
+    RULE_INDEX_TTL_SECONDS: int = int(os.environ.get("RULE_INDEX_TTL_SECONDS", "60"))
+
+    RECOMMENDATION_RETENTION_DAYS: int = int(os.environ.get("RECOMMENDATION_RETENTION_DAYS", "90"))
+    RECOMMENDATION_KEEP_LATEST: int = int(os.environ.get("RECOMMENDATION_KEEP_LATEST", "5"))
+    RECOMMENDATION_COMPACTION_INTERVAL_MINUTES: int = int(
+        os.environ.get("RECOMMENDATION_COMPACTION_INTERVAL_MINUTES", "360")
+    )
+
+    # "memory" — кэш в процессе, redis://... — общий кэш для всех воркеров
+    RECOMMENDATION_CACHE_URL: str = os.environ.get("RECOMMENDATION_CACHE_URL", "memory")
+    RECOMMENDATION_CACHE_MAX_ENTRIES: int = int(os.environ.get("RECOMMENDATION_CACHE_MAX_ENTRIES", "10000"))
+    RECOMMENDATION_CACHE_TTL_SECONDS: int = int(os.environ.get("RECOMMENDATION_CACHE_TTL_SECONDS", "86400"))
+
+    RECOMMENDATION_JOB_WORKERS: int = int(os.environ.get("RECOMMENDATION_JOB_WORKERS", "2"))
+    RECOMMENDATION_JOB_MAX_PENDING: int = int(os.environ.get("RECOMMENDATION_JOB_MAX_PENDING", "100"))
+
+    # Путь к JSON-фикстуре вместо ISS MOEX (офлайн-запуск и тесты); пусто — HTTP
+    MOEX_FIXTURE_PATH: str = os.environ.get("MOEX_FIXTURE_PATH", "")
+    MOEX_SECURITIES_TTL_SECONDS: int = int(os.environ.get("MOEX_SECURITIES_TTL_SECONDS", "3600"))
+    MOEX_QUOTE_TTL_SECONDS: int = int(os.environ.get("MOEX_QUOTE_TTL_SECONDS", "300"))
+    MOEX_REFRESH_INTERVAL_SECONDS: int = int(os.environ.get("MOEX_REFRESH_INTERVAL_SECONDS", "60"))
+    MOEX_REQUEST_TIMEOUT_SECONDS: float = float(os.environ.get("MOEX_REQUEST_TIMEOUT_SECONDS", "3"))
+    MOEX_RETRIES: int = int(os.environ.get("MOEX_RETRIES", "2"))
+    MOEX_POOL_SIZE: int = int(os.environ.get("MOEX_POOL_SIZE", "20"))
+    # Верхняя граница ожидания цены культуры при пустом кэше
+    MOEX_PRICE_TIMEOUT_SECONDS: float = float(os.environ.get("MOEX_PRICE_TIMEOUT_SECONDS", "5"))
+    MOEX_BREAKER_THRESHOLD: int = int(os.environ.get("MOEX_BREAKER_THRESHOLD", "5"))
+    MOEX_BREAKER_RESET_SECONDS: int = int(os.environ.get("MOEX_BREAKER_RESET_SECONDS", "30"))
 
 settings = Settings()
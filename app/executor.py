@@ -0,0 +1,76 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+
+
+class DbExecutor:
+    """
+    Отдельный пул потоков для синхронной работы с БД (PonyORM, psycopg2).
+
+    Блокирующие обработчики не занимают event loop и общий threadpool
+    Starlette; размер пула задаётся DB_EXECUTOR_WORKERS.
+    """
+
+    def __init__(self, max_workers: int, name: str = "db"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-executor")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+        try:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(self._timed, func, queued_at, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _timed(self, func, queued_at: float, *args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self.total_wait += started_at - queued_at
+                self.total_run += finished_at - started_at
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.submitted - self.in_flight
+            return {
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "in_flight": self.in_flight,
+                "avg_wait_ms": round(self.total_wait / done * 1000, 3) if done else 0,
+                "avg_run_ms": round(self.total_run / done * 1000, 3) if done else 0
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+db_executor = DbExecutor(settings.DB_EXECUTOR_WORKERS)
+
+
+def in_db_executor(func):
+    """Выполнить синхронный обработчик маршрута в пуле db_executor"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await db_executor.run(func, *args, **kwargs)
+
+    return wrapper
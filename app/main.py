@@ -1,23 +1,56 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from app.config import settings
+from app.executor import db_executor
+from auth.hashing import hash_executor
 from auth.router import router as auth_router
 from crops.router import router as crops_router
-from db.models import db
-from db.seeder import create_detailed_seed_data
+from db.migrations import prepare_database
+from db.seeder import create_detailed_seed_data, create_crop_economics_seed_data
 from fields.router import router as fields_router
+from fields.tiles import tile_cache
 from groups.router import router as groups_router
 from seasons.router import router as seasons_router
-from recommendations.router import router as recommendations_router
+from recommendations.router import router as recommendations_router, job_manager
+from recommendations.compaction import compact_recommendations
 from calculator.router import router as calculator_router
+from calculator.economics_index import economics_index
+from calculator.moex_parser import MoexParser
+
+logger = logging.getLogger(__name__)
+
+
+async def run_recommendation_compaction():
+    while True:
+        try:
+            await asyncio.to_thread(compact_recommendations)
+        except Exception:
+            logger.exception("Recommendation compaction failed")
+        await asyncio.sleep(settings.RECOMMENDATION_COMPACTION_INTERVAL_MINUTES * 60)
+
 
 @asynccontextmanager
 async def init_db(app: FastAPI):
-    db.generate_mapping(create_tables=True)
+    prepare_database()
 
     create_detailed_seed_data()
+    create_crop_economics_seed_data()
+    economics_index.get()
+
+    compaction_task = asyncio.create_task(run_recommendation_compaction())
+    MoexParser.market_data.start()
 
     yield
+
+    compaction_task.cancel()
+    await MoexParser.market_data.stop()
+    job_manager.shutdown()
+    hash_executor.shutdown()
+    tile_cache.shutdown()
+    db_executor.shutdown()
 app = FastAPI(title="Agro App", lifespan=init_db)
 
 url_prefix = "/api"
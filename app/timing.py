@@ -0,0 +1,23 @@
+import logging
+import time
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+
+class TimedRoute(APIRoute):
+    """Маршрут, измеряющий время обработки запроса (заголовок X-Process-Time, мс)"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            started_at = time.perf_counter()
+            response = await handler(request)
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            response.headers["X-Process-Time"] = f"{elapsed_ms:.2f}"
+            logger.debug("%s %s took %.2f ms", request.method, request.url.path, elapsed_ms)
+            return response
+
+        return timed_handler
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+from pony.orm import db_session, select, commit, OptimisticCheckError, UnrepeatableReadError
+
+from app.config import settings
+from auth.security import create_refresh_token, hash_refresh_token
+from db.models import User, RefreshToken
+
+
+@db_session
+def email_exists(email: str) -> bool:
+    return User.exists(email=email)
+
+
+@db_session
+def create_user(email: str, password_hash: str):
+    if User.exists(email=email):
+        raise ValueError("Email already registered")
+
+    user = User(email=email, password_hash=password_hash)
+    user.flush()
+    return {"id": user.id, "email": user.email}
+
+
+@db_session
+def get_credentials(email: str):
+    user = User.get(email=email)
+    if not user:
+        return None
+    return {"id": user.id, "password_hash": user.password_hash, "token_version": user.token_version}
+
+
+@db_session
+def update_password_hash(user_id: int, password_hash: str):
+    user = User.get(id=user_id)
+    if user:
+        user.password_hash = password_hash
+        user.updated_at = datetime.utcnow()
+
+
+def _issue_refresh_token(user: User) -> str:
+    now = datetime.utcnow()
+    # Истёкшие токены пользователя больше не нужны даже для обнаружения повторов
+    select(t for t in RefreshToken if t.user == user and t.expires_at < now).delete(bulk=True)
+
+    token, token_hash = create_refresh_token()
+    RefreshToken(
+        user=user,
+        token_hash=token_hash,
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    return token
+
+
+@db_session
+def issue_refresh_token(user_id: int) -> str:
+    user = User.get(id=user_id)
+    if not user:
+        raise ValueError("User not found")
+    return _issue_refresh_token(user)
+
+
+def rotate_refresh_token(token: str):
+    """
+    Обменять refresh-токен на новый. Повторное предъявление уже заменённого
+    токена считается утечкой: отзываются все refresh-токены пользователя.
+    """
+    try:
+        return _rotate_refresh_token(token)
+    except (OptimisticCheckError, UnrepeatableReadError):
+        # Параллельный запрос с тем же токеном заменил его первым. Повторная
+        # попытка видит токен уже отозванным и идёт по пути обнаружения повтора
+        return _rotate_refresh_token(token)
+
+
+@db_session
+def _rotate_refresh_token(token: str):
+    stored = RefreshToken.get(token_hash=hash_refresh_token(token))
+    now = datetime.utcnow()
+    if not stored or stored.expires_at <= now:
+        raise ValueError("Invalid refresh token")
+
+    user = stored.user
+    if stored.revoked_at is not None:
+        _revoke_all(user, now)
+        commit()
+        raise ValueError("Refresh token reused")
+
+    stored.revoked_at = now
+    return {
+        "user_id": user.id,
+        "token_version": user.token_version,
+        "refresh_token": _issue_refresh_token(user)
+    }
+
+
+def _revoke_all(user: User, now: datetime):
+    for token in select(t for t in RefreshToken if t.user == user and t.revoked_at is None):
+        token.revoked_at = now
+
+
+@db_session
+def revoke_user_tokens(user_id: int):
+    """Отозвать все токены пользователя: access — через token_version, refresh — явно"""
+    user = User.get(id=user_id)
+    if not user:
+        raise ValueError("User not found")
+    now = datetime.utcnow()
+    user.token_version += 1
+    user.updated_at = now
+    _revoke_all(user, now)
@@ -1,32 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pony.orm import db_session
 
 from app.config import settings
 from db.models import User
+from db.signals import subscribe
 from auth.security import decode_token
 
 bearer_scheme = HTTPBearer()
 
 
-@db_session
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    token = credentials.credentials
+@dataclass(frozen=True)
+class TokenUser:
+    """Пользователь из проверенного токена — без загрузки сущности User"""
+    id: int
+    token_version: int
+
+
+class UserCache:
+    """
+    Кэш актуальных версий токенов пользователей с коротким TTL.
+
+    Пока запись жива, токен проверяется без обращения к БД. Изменение или
+    удаление User (в том числе отзыв токенов) сбрасывает запись сразу в этом
+    процессе, в остальных воркерах — не позже чем через TTL.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int | None = None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries or None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> int | None:
+        """Версия токенов пользователя или None, если её нужно прочитать из БД"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_id: int, token_version: int):
+        with self._lock:
+            self._entries[user_id] = (token_version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_TTL_SECONDS, settings.AUTH_USER_CACHE_MAX_ENTRIES)
+
+subscribe("User", user_cache.invalidate, key=lambda user: user.id)
+
 
+def _unauthorized(detail: str):
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _decode(credentials: HTTPAuthorizationCredentials) -> dict:
     # Декодируем и проверяем токен
-    payload = decode_token(token, settings.SECRET_KEY, settings.ALGORITHM)
+    payload = decode_token(credentials.credentials, settings.SECRET_KEY, settings.ALGORITHM)
     if not payload or "sub" not in payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized("Invalid token")
+    return payload
+
+
+@db_session
+def _load_token_version(user_id: int) -> int | None:
+    user = User.get(id=user_id)
+    return user.token_version if user else None
+
+
+def get_token_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> TokenUser:
+    """
+    Лёгкая зависимость для роутеров, которым нужен только id пользователя.
+
+    Доверяет подписанным claims токена; существование пользователя и версия
+    токенов берутся из user_cache, в БД — только при промахе. Токены без
+    claim "ver" (выданные до его появления) считаются версией 0.
+    """
+    payload = _decode(credentials)
+    user_id = int(payload["sub"])
+
+    token_version = user_cache.get(user_id)
+    if token_version is None:
+        token_version = _load_token_version(user_id)
+        if token_version is None:
+            raise _unauthorized("User not found")
+        user_cache.set(user_id, token_version)
+
+    if payload.get("ver", 0) != token_version:
+        raise _unauthorized("Token revoked")
+    return TokenUser(id=user_id, token_version=token_version)
+
+
+@db_session
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    """Полная сущность User — для эндпоинтов, которым нужны её поля"""
+    payload = _decode(credentials)
 
     user = User.get(id=int(payload["sub"]))
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized("User not found")
+    if payload.get("ver", 0) != user.token_version:
+        raise _unauthorized("Token revoked")
     return user
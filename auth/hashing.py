@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from app.config import settings
+from auth import security
+
+
+class HashingQueueFull(Exception):
+    """Очередь хэширования переполнена — запрос нужно повторить позже"""
+
+
+def _timed(func, *args):
+    # Выполняется в воркере (возможно, в другом процессе): время работы
+    # возвращается вместе с результатом, ожидание считается в вызывающем
+    started_at = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started_at, result
+
+
+class HashingExecutor:
+    """
+    Отдельный пул для argon2 с ограничением очереди.
+
+    Хэширование паролей не занимает общий threadpool Starlette и пул БД:
+    всплеск логинов ждёт только своих воркеров, а при max_pending ожидающих
+    задачах новые запросы сразу отклоняются. kind="process" выносит argon2
+    в отдельные процессы.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError("Тип пула хэширования: thread или process")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.max_workers, thread_name_prefix="hashing-executor"
+                        )
+        return self._executor
+
+    async def run(self, func, *args):
+        """func и аргументы должны сериализоваться pickle для пула процессов"""
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_pending:
+                self.rejected += 1
+                raise HashingQueueFull("Слишком много одновременных входов, повторите позже")
+            self.submitted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        try:
+            run_time, result = await loop.run_in_executor(self._pool(), functools.partial(_timed, func, *args))
+            with self._lock:
+                self.completed += 1
+                self.total_run += run_time
+                self.total_wait += max(time.perf_counter() - queued_at - run_time, 0.0)
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def hash_password(self, password: str) -> str:
+        return await self.run(security.hash_password, password)
+
+    async def verify_and_update_password(self, password: str, password_hash: str) -> tuple[bool, str | None]:
+        return await self.run(security.verify_and_update_password, password, password_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "in_flight": self.in_flight,
+                "queued": max(self.in_flight - self.max_workers, 0),
+                "max_in_flight": self.max_in_flight,
+                "avg_wait_ms": round(self.total_wait / self.completed * 1000, 3) if self.completed else 0,
+                "avg_run_ms": round(self.total_run / self.completed * 1000, 3) if self.completed else 0
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hash_executor = HashingExecutor(
+    settings.AUTH_HASH_WORKERS, settings.AUTH_HASH_MAX_PENDING, settings.AUTH_HASH_EXECUTOR
+)
@@ -2,43 +2,102 @@ from fastapi import APIRouter, HTTPException, Depends
 from pony.orm import db_session, commit
 
 from app.config import settings
-from auth.schemas import UserPublic, UserCreate, Token
-from auth.security import hash_password, verify_password, create_access_token
+from app.executor import db_executor
+from auth import crud
+from auth.hashing import hash_executor, HashingQueueFull
+from auth.schemas import UserPublic, UserCreate, Token, RefreshRequest
+from auth.security import create_access_token, token_cache
 from db.models import User
-from auth.deps import get_current_user
+from auth.deps import get_current_user, get_token_user, user_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _hashing_unavailable(e: HashingQueueFull):
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
 @router.post("/register", response_model=UserPublic)
-@db_session
-def register_user(data: UserCreate):
-    if User.get(email=data.email):
+async def register_user(data: UserCreate):
+    # Повторный email отсекается до дорогого хэширования
+    if await db_executor.run(crud.email_exists, data.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    user = User(
-        email=data.email,
-        password_hash=hash_password(data.password)
-    )
+    try:
+        password_hash = await hash_executor.hash_password(data.password)
+    except HashingQueueFull as e:
+        raise _hashing_unavailable(e)
 
-    return user
+    try:
+        return await db_executor.run(crud.create_user, data.email, password_hash)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/login", response_model=Token)
-@db_session
-def login_user(data: UserCreate):
-    user = User.get(email=data.email)
-    if not user or not verify_password(data.password, user.password_hash):
+async def login_user(data: UserCreate):
+    credentials = await db_executor.run(crud.get_credentials, data.email)
+    if not credentials:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+
+    try:
+        verified, new_hash = await hash_executor.verify_and_update_password(
+            data.password, credentials["password_hash"]
+        )
+    except HashingQueueFull as e:
+        raise _hashing_unavailable(e)
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
+
+    # Хэш со старыми параметрами argon2 заменяется пересчитанным
+    if new_hash:
+        await db_executor.run(crud.update_password_hash, credentials["id"], new_hash)
+
+    refresh_token = await db_executor.run(crud.issue_refresh_token, credentials["id"])
+    return _token_pair(credentials["id"], credentials["token_version"], refresh_token)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_tokens(data: RefreshRequest):
+    """Новая пара токенов по refresh-токену — без проверки пароля"""
+    try:
+        rotated = await db_executor.run(crud.rotate_refresh_token, data.refresh_token)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    return _token_pair(rotated["user_id"], rotated["token_version"], rotated["refresh_token"])
+
+
+def _token_pair(user_id: int, token_version: int, refresh_token: str) -> dict:
     token = create_access_token(
-        user.id,
+        user_id,
         settings.SECRET_KEY,
         settings.ALGORITHM,
-        settings.ACCESS_TOKEN_EXPIRE_MINUTES
+        settings.ACCESS_TOKEN_EXPIRE_MINUTES,
+        token_version
     )
-    return {"access_token": token, "token_type": "bearer"}
+    return {"access_token": token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.get("/hashing/stats")
+async def get_hashing_stats():
+    return hash_executor.stats()
+
+
+@router.get("/token-cache/stats")
+async def get_token_cache_stats():
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
 
 
 @router.get("/me", response_model=UserPublic)
 def get_me(current_user=Depends(get_current_user)):
     return current_user
+
+
+@router.post("/revoke")
+def revoke_tokens(current_user=Depends(get_token_user)):
+    """Отозвать все выданные пользователю access- и refresh-токены (выход на всех устройствах)"""
+    try:
+        crud.revoke_user_tokens(current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"message": "Токены отозваны"}
@@ -1,8 +1,21 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+from app.config import settings
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST_KIB,
+    argon2__parallelism=settings.ARGON2_PARALLELISM
+)
 
 
 def hash_password(password: str) -> str:
@@ -13,14 +26,82 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def create_access_token(user_id: int, secret_key: str, algorithm: str, expire_minutes: int):
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Проверить пароль; второй элемент — новый хэш, если параметры argon2 изменились"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def create_access_token(user_id: int, secret_key: str, algorithm: str, expire_minutes: int, token_version: int = 0):
     expire = datetime.utcnow() + timedelta(minutes=expire_minutes)
-    payload = {"sub": str(user_id), "exp": expire}
+    payload = {"sub": str(user_id), "ver": token_version, "exp": expire}
     return jwt.encode(payload, secret_key, algorithm=algorithm)
 
 
+def create_refresh_token() -> tuple[str, str]:
+    """Случайный refresh-токен и его sha256 — в БД хранится только хэш"""
+    token = secrets.token_urlsafe(48)
+    return token, hash_refresh_token(token)
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    LRU недавно проверенных access-токенов.
+
+    Ключ — сам токен (подпись покрывает все claims), поэтому повторный
+    запрос горячего клиента обходится без jwt.decode. Срок действия
+    проверяется при каждом чтении; невалидные токены не кэшируются.
+    """
+
+    def __init__(self, max_entries: int):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            if payload.get("exp") is not None and payload["exp"] <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def set(self, key, payload: dict):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)
+
+
 def decode_token(token: str, secret_key: str, algorithm: str):
+    key = (token, secret_key, algorithm)
+    payload = token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+
     try:
-        return jwt.decode(token, secret_key, algorithms=[algorithm])
+        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
     except JWTError:
         return None
+    token_cache.set(key, payload)
+    return dict(payload)
@@ -0,0 +1,58 @@
+"""
+Число SQL-запросов get_all_fields_with_plantings в зависимости от размера
+страницы: оно не должно расти с числом полей и посадок (проверка на N+1).
+
+Ручной замер против настроенной БД (только чтение); точное число запросов
+закреплено тестом tests/test_fields_query_count.py. owner — владелец с полями
+и посадками:
+
+    python -m benchmarks.fields_query_count --owner 1 --limits 1 10 100 0
+
+limit 0 — все поля владельца. Код выхода 1, если число запросов различается.
+"""
+import argparse
+import sys
+import time
+
+from db.migrations import prepare_database
+from db.models import db
+from fields.crud import get_all_fields_with_plantings
+
+
+def _measure(owner_id: int, limit: int | None) -> dict:
+    # Локальная статистика Pony сбрасывается, запросы вызова считаются по ней
+    db.merge_local_stats()
+    started_at = time.perf_counter()
+    fields = get_all_fields_with_plantings(owner_id, limit=limit)
+    elapsed = time.perf_counter() - started_at
+    stats = [stat for sql, stat in db.local_stats.items() if sql is not None]
+    return {
+        "limit": limit,
+        "fields": len(fields),
+        "plantings": sum(len(field["plantings"]) for field in fields),
+        "queries": sum(stat.db_count for stat in stats),
+        "db_ms": round(sum(stat.sum_time for stat in stats) * 1000, 2),
+        "total_ms": round(elapsed * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Число запросов списка полей с посадками")
+    parser.add_argument("--owner", type=int, required=True)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 10, 100, 0])
+    args = parser.parse_args()
+
+    prepare_database()
+    results = [_measure(args.owner, limit or None) for limit in args.limits]
+    for result in results:
+        print(result)
+
+    # Пустая страница отвечает одним запросом — в сравнении не участвует
+    counts = {result["queries"] for result in results if result["fields"]}
+    if len(counts) > 1:
+        print(f"Число запросов зависит от размера страницы: {sorted(counts)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Замер входа под нагрузкой: пропускная способность /auth/login и задержка
+постороннего эндпоинта во время «шторма» логинов.
+
+Запуск против работающего сервера (до и после изменения):
+
+    python -m benchmarks.login_storm --url http://localhost:8000 \
+        --logins 200 --login-concurrency 32 --probe-path /api/calculator/market-data/stats
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import aiohttp
+
+
+def _summary(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0, "errors": len(errors)}
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 2),
+    }
+
+
+async def _login_worker(session, url, credentials, queue, latencies, errors):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+
+        started_at = time.perf_counter()
+        try:
+            async with session.post(url, json=credentials) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started_at)
+
+
+async def _probe(session, url, stop, latencies, errors, interval):
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started_at)
+        await asyncio.sleep(interval)
+
+
+async def run(url: str, logins: int, login_concurrency: int, probe_path: str, probe_concurrency: int, interval: float):
+    credentials = {"email": f"storm-{uuid.uuid4().hex[:8]}@example.com", "password": "storm-password"}
+
+    connector = aiohttp.TCPConnector(limit=login_concurrency + probe_concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.post(url + "/api/auth/register", json=credentials) as response:
+            await response.read()
+
+        # Задержка постороннего эндпоинта без нагрузки
+        stop = asyncio.Event()
+        idle_latencies, idle_errors = [], []
+        probes = [
+            asyncio.create_task(_probe(session, url + probe_path, stop, idle_latencies, idle_errors, interval))
+            for _ in range(probe_concurrency)
+        ]
+        await asyncio.sleep(2)
+        stop.set()
+        await asyncio.gather(*probes)
+
+        queue = asyncio.Queue()
+        for _ in range(logins):
+            queue.put_nowait(None)
+
+        stop = asyncio.Event()
+        login_latencies, login_errors = [], []
+        probe_latencies, probe_errors = [], []
+        probes = [
+            asyncio.create_task(_probe(session, url + probe_path, stop, probe_latencies, probe_errors, interval))
+            for _ in range(probe_concurrency)
+        ]
+        started_at = time.perf_counter()
+        await asyncio.gather(*(
+            _login_worker(session, url + "/api/auth/login", credentials, queue, login_latencies, login_errors)
+            for _ in range(login_concurrency)
+        ))
+        elapsed = time.perf_counter() - started_at
+        stop.set()
+        await asyncio.gather(*probes)
+
+        async with session.get(url + "/api/auth/hashing/stats") as response:
+            hashing = await response.json() if response.status == 200 else None
+
+    return {
+        "login": _summary(login_latencies, login_errors, elapsed),
+        "probe_idle": _summary(idle_latencies, idle_errors, 2),
+        "probe_under_storm": _summary(probe_latencies, probe_errors, elapsed),
+        "hashing": hashing
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=32)
+    parser.add_argument("--probe-path", default="/api/calculator/market-data/stats")
+    parser.add_argument("--probe-concurrency", type=int, default=4)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(
+        args.url, args.logins, args.login_concurrency,
+        args.probe_path, args.probe_concurrency, args.probe_interval
+    ))
+    for name, value in result.items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Нагрузочный замер эндпоинтов рекомендаций при параллельных запросах.
+
+Запуск против работающего сервера (до и после изменения):
+
+    python -m benchmarks.recommendations_concurrency --url http://localhost:8000 \
+        --path /api/recommendations/field/1 --concurrency 32 --requests 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+
+async def _worker(session, url, queue, latencies, errors):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+
+        started_at = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started_at)
+
+
+async def run(url: str, concurrency: int, requests: int):
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    latencies = []
+    errors = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started_at = time.perf_counter()
+        await asyncio.gather(*(
+            _worker(session, url, queue, latencies, errors) for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", default=[])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    for path in args.path or ["/api/recommendations/field/1"]:
+        for concurrency in (1, args.concurrency):
+            result = asyncio.run(run(args.url + path, concurrency, args.requests))
+            print(f"{path} concurrency={concurrency}: {result}")
+
+
+if __name__ == "__main__":
+    main()
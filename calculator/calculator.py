@@ -1,40 +1,328 @@
+import asyncio
+import math
+from datetime import date
+
+import numpy as np
+
+from app.executor import db_executor
+from calculator import crud, price_history, sensitivity
+from calculator.economics_index import economics_index, CropEconomicsInfo
 from calculator.moex_parser import MoexParser
 
+PRICING_CATALOGUE = "catalogue"
+
 
 class EconomicCalculator:
+    """
+    Экономика посевов по справочнику CropEconomics (норма высева, базовая
+    урожайность, цены семян и тикер MOEX для каждой культуры).
+    """
+
+    async def get_price(
+            self,
+            info: CropEconomicsInfo,
+            pricing: str = price_history.PRICING_MARKET,
+            as_of: date | None = None,
+            window_days: int = 30
+    ) -> dict:
+        """
+        Цена культуры в выбранном режиме:
+        market — текущая биржевая (при недоступности ISS — последняя сохранённая),
+        latest — последняя сохранённая, as_of — сохранённая на дату,
+        moving_average — среднее за window_days дней до as_of.
+        Для культур без тикера MOEX используется цена из справочника.
+        """
+        prefix = info.moex_prefix
+        if not prefix:
+            if info.market_price is None:
+                raise ValueError("Для культуры не задана цена")
+            return {"mode": PRICING_CATALOGUE, "price": info.market_price}
+
+        if pricing == price_history.PRICING_MARKET:
+            try:
+                return {"mode": pricing, "price": await MoexParser.get_prefix_price(prefix)}
+            except Exception:
+                stored = await db_executor.run(price_history.quote_as_of, prefix)
+                if stored is None:
+                    raise
+                return {"mode": price_history.PRICING_LATEST, "fallback": True, **stored}
+
+        if pricing == price_history.PRICING_LATEST:
+            stored = await db_executor.run(price_history.quote_as_of, prefix)
+        elif pricing == price_history.PRICING_AS_OF:
+            if as_of is None:
+                raise ValueError("Для режима as_of нужна дата")
+            stored = await db_executor.run(price_history.quote_as_of, prefix, as_of)
+        elif pricing == price_history.PRICING_MOVING_AVERAGE:
+            stored = await db_executor.run(price_history.moving_average, prefix, window_days, as_of)
+        else:
+            raise ValueError("Неизвестный режим цены")
+
+        if stored is None:
+            raise ValueError("Нет сохранённых котировок культуры")
+        return {"mode": pricing, **stored}
+
+    async def calculate(
+            self,
+            culture: str,
+            area: float,
+            avg_yield_cq: float,
+            pricing: str = price_history.PRICING_MARKET,
+            as_of: date | None = None,
+            window_days: int = 30
+    ) -> dict:
+        info = await self._culture(culture)
+
+        # 1. Цена культуры (биржевая или из истории котировок)
+        price = await self.get_price(info, pricing, as_of, window_days)
+
+        return {**self._economics(info, area, avg_yield_cq, price["price"]), "price": price}
 
-    YIELD = {
-        "пшеница": 35,
-        "кукуруза": 60,
-        "соя": 25,
-    }
+    async def calculate_portfolio(
+            self,
+            user_id: int,
+            season_id: int | None = None,
+            group_id: int | None = None,
+            pricing: str = price_history.PRICING_MARKET,
+            as_of: date | None = None,
+            window_days: int = 30
+    ) -> dict:
+        """
+        Экономика всех посадок сезона и/или группы полей пользователя;
+        None — сезона или группы у пользователя нет.
 
-    SEEDING_RATE = {
-        "пшеница": 120,
-        "кукуруза": 25,
-        "соя": 80,
-    }
+        Посадки загружаются одним пакетом, цена каждой культуры запрашивается
+        один раз на весь расчёт. Урожайность берётся из Planting.yield_amount
+        (ц/га), а если она не указана — базовая из справочника. Посадки
+        культур без экономики или цены попадают в skipped.
+        """
+        if season_id is None and group_id is None:
+            raise ValueError("Нужно указать сезон или группу полей")
+
+        plantings = await db_executor.run(crud.get_portfolio_plantings, user_id, season_id, group_id)
+        if plantings is None:
+            return None
+        catalogue = await self._catalogue()
+
+        crop_ids = {p["crop_id"] for p in plantings}
+        entries = [info for info in catalogue.entries if info.crop_id in crop_ids]
+        quotes = await asyncio.gather(
+            *(self.get_price(info, pricing, as_of, window_days) for info in entries),
+            return_exceptions=True
+        )
+        prices = {info.crop_id: price for info, price in zip(entries, quotes)}
+
+        fields = {}
+        skipped = []
+        for planting in plantings:
+            info = catalogue.for_crop(planting["crop_id"])
+            price = prices.get(planting["crop_id"])
+            if price is None or isinstance(price, Exception):
+                skipped.append({
+                    "planting_id": planting["planting_id"],
+                    "field_id": planting["field_id"],
+                    "crop_name": planting["crop_name"],
+                    "reason": str(price) if price is not None else "Нет экономики для культуры"
+                })
+                continue
+
+            yield_cq = planting["yield_amount"] or info.default_yield
+            economics = self._economics(info, planting["area_ha"], yield_cq, price["price"])
+
+            field = fields.setdefault(planting["field_id"], {
+                "field_id": planting["field_id"],
+                "field_name": planting["field_name"],
+                "area_ha": planting["area_ha"],
+                "plantings": [],
+                **self._totals([])
+            })
+            field["plantings"].append({
+                "planting_id": planting["planting_id"],
+                "crop_id": planting["crop_id"],
+                "culture": info.culture,
+                "yield_cq": yield_cq,
+                "yield_source": "planting" if planting["yield_amount"] else "default",
+                **economics
+            })
+
+        for field in fields.values():
+            field.update(self._totals(field["plantings"]))
+
+        return {
+            "season_id": season_id,
+            "group_id": group_id,
+            "prices": {
+                info.culture: prices[info.crop_id] for info in entries
+                if not isinstance(prices[info.crop_id], Exception)
+            },
+            "fields": list(fields.values()),
+            "skipped": skipped,
+            "total": self._totals([p for field in fields.values() for p in field["plantings"]])
+        }
 
-    def calculate(self, culture: str, area: float, avg_yield_cq: float) -> dict:
-        culture = culture.lower()
+    async def sweep(
+            self,
+            culture: str,
+            areas,
+            price_range: tuple[float, float],
+            price_points: int,
+            yield_min: float,
+            yield_max: float,
+            yield_points: int,
+            pricing: str = price_history.PRICING_MARKET,
+            as_of: date | None = None,
+            window_days: int = 30,
+            include_grid: bool = True
+    ) -> dict:
+        """
+        Сетка прибыли цена × урожайность × площадь одним векторным расчётом.
 
-        if culture not in self.YIELD:
+        Цены берутся в диапазоне price_range относительно текущей цены
+        культуры; семена считаются купленными по цене из справочника (или по
+        текущей цене культуры), поэтому точка безубыточности зависит от цены
+        продажи и урожайности.
+        """
+        info = await self._culture(culture)
+        price = await self.get_price(info, pricing, as_of, window_days)
+        inputs = self._inputs(info, price["price"])
+
+        prices = np.linspace(price["price"] * price_range[0], price["price"] * price_range[1], price_points)
+        yields = np.linspace(yield_min, yield_max, yield_points)
+        areas = np.asarray(areas, dtype=float)
+        revenue, seeds_cost, profit = sensitivity.profit_grid(inputs, prices, yields, areas)
+
+        result = {
+            "culture": info.culture,
+            "price": price,
+            "prices": prices.round(4).tolist(),
+            "yields": yields.round(4).tolist(),
+            "areas": areas.tolist(),
+            "break_even": {
+                "price_by_yield": sensitivity.break_even_prices(inputs, yields).round(4).tolist(),
+                "yield_by_price": sensitivity.break_even_yields(inputs, prices).round(4).tolist()
+            },
+            "profit_distribution": sensitivity.distribution(profit)
+        }
+        if include_grid:
+            result["profit"] = profit.round(2).tolist()
+        return result
+
+    async def monte_carlo(
+            self,
+            culture: str,
+            area: float,
+            yield_mean: float | None = None,
+            yield_cv: float = 0.15,
+            horizon_days: int = 180,
+            simulations: int = 10000,
+            seed: int | None = None,
+            volatility: float | None = None,
+            volatility_window_days: int = 365,
+            pricing: str = price_history.PRICING_MARKET,
+            as_of: date | None = None,
+            window_days: int = 30
+    ) -> dict:
+        """
+        Распределение прибыли по Монте-Карло.
+
+        Если volatility (за горизонт) не задана, она оценивается по истории
+        котировок: дневная волатильность × sqrt(horizon_days).
+        """
+        info = await self._culture(culture)
+        price = await self.get_price(info, pricing, as_of, window_days)
+
+        historical = None
+        if volatility is None:
+            if not info.moex_prefix:
+                raise ValueError("Для культуры без тикера MOEX нужно задать volatility")
+            historical = await db_executor.run(
+                price_history.historical_volatility, info.moex_prefix, volatility_window_days, as_of
+            )
+            if historical is None:
+                raise ValueError("Недостаточно истории котировок для оценки волатильности")
+            volatility = historical["daily"] * math.sqrt(horizon_days)
+
+        yield_mean = yield_mean or info.default_yield
+        inputs = self._inputs(info, price["price"])
+        prices, yields, profit = sensitivity.simulate_profit(
+            inputs, price["price"], volatility, yield_mean, yield_cv, area, simulations, seed
+        )
+
+        return {
+            "culture": info.culture,
+            "area": area,
+            "price": price,
+            "volatility": {"horizon": volatility, "horizon_days": horizon_days, "historical": historical},
+            "yield_mean": yield_mean,
+            "yield_cv": yield_cv,
+            "simulations": simulations,
+            "seed": seed,
+            "price_distribution": sensitivity.distribution(prices),
+            "yield_distribution": sensitivity.distribution(yields),
+            "profit_distribution": sensitivity.distribution(profit)
+        }
+
+    def expected_profits(self) -> dict:
+        """
+        Ожидаемая прибыль с гектара при базовой урожайности по каждой культуре
+        справочника: {crop_id: прибыль}. Синхронно и без обращения к ISS —
+        по кэшу котировок, иначе по последней сохранённой; культуры без цены
+        пропускаются.
+        """
+        catalogue = economics_index.get()
+
+        prices = {}
+        for prefix in catalogue.prefixes:
+            price = MoexParser.market_data.cached_price(prefix)
+            if price is None:
+                stored = price_history.quote_as_of(prefix)
+                price = stored["price"] if stored is not None else None
+            prices[prefix] = price
+
+        profits = {}
+        for info in catalogue.entries:
+            price = prices.get(info.moex_prefix) if info.moex_prefix else info.market_price
+            if price is not None:
+                profits[info.crop_id] = self._economics(info, 1.0, info.default_yield, price)["profit"]
+        return profits
+
+    async def _catalogue(self):
+        return economics_index.current() or await db_executor.run(economics_index.get)
+
+    async def _culture(self, culture: str) -> CropEconomicsInfo:
+        info = (await self._catalogue()).for_culture(culture)
+        if info is None:
             raise ValueError("Неизвестная культура")
+        return info
 
-        # 1. Цена культуры (динамически)
-        culture_price = MoexParser.get_culture_price(culture)
+    @staticmethod
+    def _inputs(info: CropEconomicsInfo, culture_price: float) -> sensitivity.CropEconomicsInput:
+        # Без цены семян в справочнике семена оцениваются по цене культуры
+        seed_price = info.seed_price if info.seed_price is not None else culture_price
+        return sensitivity.CropEconomicsInput(seed_price=seed_price, seeding_rate=info.seeding_rate)
 
-        # 2. Цена семян
-        seed_price_per_kg = MoexParser.get_seed_price_from_market(culture)
+    def _economics(self, info: CropEconomicsInfo, area: float, yield_cq: float, culture_price: float) -> dict:
+        inputs = self._inputs(info, culture_price)
 
-        seeds_cost = seed_price_per_kg * self.SEEDING_RATE[culture] * area
+        # 2. Затраты на семена
+        seeds_cost = inputs.seed_price * inputs.seeding_rate * area
 
         # 4. Урожайность → доход
-        total_yield_kg = (avg_yield_cq * area) * 100  # центнеры → кг
+        total_yield_kg = (yield_cq * area) * 100  # центнеры → кг
         revenue = culture_price * total_yield_kg
 
         return {
             "seeds_cost": round(seeds_cost, 2),
             "revenue": round(revenue, 2),
-            "profit": round(revenue - seeds_cost, 2),
+            "profit": round(revenue - seeds_cost, 2)
+        }
+
+    @staticmethod
+    def _totals(items) -> dict:
+        seeds_cost = round(sum(item["seeds_cost"] for item in items), 2)
+        revenue = round(sum(item["revenue"] for item in items), 2)
+        return {
+            "seeds_cost": seeds_cost,
+            "revenue": revenue,
+            "profit": round(revenue - seeds_cost, 2)
         }
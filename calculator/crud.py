@@ -0,0 +1,39 @@
+from pony.orm import db_session
+
+from db.models import Planting, Season, FieldGroup
+
+
+@db_session
+def get_portfolio_plantings(user_id: int, season_id: int | None = None, group_id: int | None = None):
+    """
+    Посадки сезона и/или группы полей пользователя вместе с площадью поля
+    и культурой. None — сезона или группы нет либо они чужие.
+
+    Поля и культуры подгружаются пакетно (prefetch), число запросов не
+    зависит от количества посадок.
+    """
+    if season_id is not None and not Season.exists(lambda s: s.id == season_id and s.owner.id == user_id):
+        return None
+    if group_id is not None and not FieldGroup.exists(lambda g: g.id == group_id and g.owner.id == user_id):
+        return None
+
+    query = Planting.select(lambda p: p.field.owner.id == user_id)
+    if season_id is not None:
+        query = query.filter(lambda p: p.season.id == season_id)
+    if group_id is not None:
+        query = query.filter(lambda p: group_id in p.field.groups.id)
+
+    plantings = query.prefetch(Planting.field, Planting.crop).order_by(lambda p: (p.field.id, p.id))[:]
+
+    return [
+        {
+            "planting_id": p.id,
+            "field_id": p.field.id,
+            "field_name": p.field.name,
+            "area_ha": p.field.area_ha,
+            "crop_id": p.crop.id,
+            "crop_name": p.crop.name,
+            "yield_amount": p.yield_amount
+        }
+        for p in plantings
+    ]
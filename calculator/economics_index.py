@@ -0,0 +1,113 @@
+import threading
+from dataclasses import dataclass
+
+from pony.orm import db_session, select
+
+from db.models import CropEconomics
+from db.signals import subscribe
+
+
+@dataclass(frozen=True)
+class CropEconomicsInfo:
+    """Неизменяемый снимок экономических параметров культуры"""
+    crop_id: int
+    name: str
+    culture: str
+    seeding_rate: float
+    default_yield: float
+    seed_price: float | None
+    market_price: float | None
+    moex_prefix: str | None
+
+
+@dataclass(frozen=True)
+class EconomicsCatalogue:
+    """Справочник экономики культур: поиск по crop_id и по названию культуры"""
+    version: int
+    entries: tuple
+    by_crop_id: dict
+    by_culture: dict
+    prefixes: tuple
+
+    def for_culture(self, culture: str) -> CropEconomicsInfo | None:
+        return self.by_culture.get(culture.lower())
+
+    def for_crop(self, crop_id: int) -> CropEconomicsInfo | None:
+        return self.by_crop_id.get(crop_id)
+
+
+class EconomicsIndex:
+    """
+    Процессный индекс CropEconomics.
+
+    Строится один раз и перестраивается лениво после изменения CropEconomics
+    или Crop (хуки db.models сообщают об изменениях через db.signals).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._catalogue = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._version += 1
+
+    def current(self) -> EconomicsCatalogue | None:
+        """Актуальный справочник без обращения к БД (None — нужна перестройка)"""
+        catalogue = self._catalogue
+        if catalogue is not None and catalogue.version == self._version:
+            return catalogue
+        return None
+
+    def prefixes(self) -> tuple:
+        """Тикеры MOEX последнего построенного справочника, даже устаревшего"""
+        catalogue = self._catalogue
+        return catalogue.prefixes if catalogue is not None else ()
+
+    def get(self) -> EconomicsCatalogue:
+        catalogue = self.current()
+        if catalogue is not None:
+            return catalogue
+
+        with self._lock:
+            if self._catalogue is None or self._catalogue.version != self._version:
+                self._catalogue = self._build(self._version)
+            return self._catalogue
+
+    @staticmethod
+    @db_session
+    def _build(version: int) -> EconomicsCatalogue:
+        rows = select(e for e in CropEconomics).prefetch(CropEconomics.crop).order_by(CropEconomics.id)[:]
+
+        entries = tuple(
+            CropEconomicsInfo(
+                crop_id=e.crop.id,
+                name=e.crop.name,
+                culture=e.crop.name.lower(),
+                seeding_rate=e.seeding_rate,
+                default_yield=e.default_yield,
+                seed_price=e.seed_price,
+                market_price=e.market_price,
+                moex_prefix=e.moex_prefix or None
+            )
+            for e in rows
+        )
+
+        return EconomicsCatalogue(
+            version=version,
+            entries=entries,
+            by_crop_id={info.crop_id: info for info in entries},
+            by_culture={info.culture: info for info in entries},
+            prefixes=tuple(dict.fromkeys(info.moex_prefix for info in entries if info.moex_prefix))
+        )
+
+
+economics_index = EconomicsIndex()
+
+for _entity_name in ("CropEconomics", "Crop"):
+    subscribe(_entity_name, economics_index.invalidate)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для запросов к ISS.
+
+    После failure_threshold неудач подряд запросы отклоняются сразу на
+    reset_timeout секунд; затем пропускается пробный запрос (half-open),
+    успех замыкает цепь, неудача снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class AsyncMoexClient:
+    """
+    Асинхронный клиент ISS MOEX с общим пулом соединений.
+
+    Сессия aiohttp создаётся лениво в текущем event loop и переиспользуется
+    всеми запросами. Сетевые ошибки и 5xx повторяются retries раз с
+    экспоненциальной задержкой, серия неудач размыкает CircuitBreaker.
+    """
+
+    BASE_LIST_URL = "https://iss.moex.com/iss/engines/futures/markets/forts/securities.json"
+    BASE_MARKETDATA_URL = "https://iss.moex.com/iss/engines/futures/markets/forts/securities/{}/marketdata.json"
+    BASE_SERIES_URL = "https://iss.moex.com/iss/statistics/engines/futures/markets/forts/series.json"
+    BASE_HISTORY_URL = "https://iss.moex.com/iss/history/engines/futures/markets/forts/securities/{}.json"
+
+    def __init__(
+            self,
+            timeout: float,
+            retries: int,
+            pool_size: int,
+            breaker: CircuitBreaker,
+            backoff: float = 0.2
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self.breaker = breaker
+        self.backoff = backoff
+        self._session = None
+        self.requests = 0
+        self.failures = 0
+
+    async def fetch_securities(self) -> dict:
+        return await self._get_json(self.BASE_LIST_URL)
+
+    async def fetch_marketdata(self, ticker: str) -> dict:
+        return await self._get_json(self.BASE_MARKETDATA_URL.format(ticker))
+
+    async def fetch_series(self, asset_code: str) -> dict:
+        """Все серии фьючерсов базового актива, включая истёкшие"""
+        return await self._get_json(self.BASE_SERIES_URL, {"asset_code": asset_code, "show_expired": 1})
+
+    async def fetch_history(self, secid: str, date_from: str, date_till: str, start: int = 0) -> dict:
+        """Страница итогов торгов по контракту (постранично, см. блок history.cursor)"""
+        return await self._get_json(
+            self.BASE_HISTORY_URL.format(secid), {"from": date_from, "till": date_till, "start": start}
+        )
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit": self.breaker.state
+        }
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _get_json(self, url: str, params: dict | None = None) -> dict:
+        if not self.breaker.allow():
+            raise CircuitOpenError("ISS MOEX временно недоступен")
+
+        session = self._get_session()
+        for attempt in range(self.retries + 1):
+            self.requests += 1
+            try:
+                async with session.get(url, params=params) as resp:
+                    if resp.status < 500:
+                        resp.raise_for_status()
+                        data = await resp.json(content_type=None)
+                        self.breaker.record_success()
+                        return data
+                    error = aiohttp.ClientResponseError(
+                        resp.request_info, resp.history, status=resp.status, message=resp.reason or ""
+                    )
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500:
+                    # 4xx — ответ получен, ISS доступен; повторять бессмысленно
+                    self.breaker.record_success()
+                    raise
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            self.failures += 1
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+        self.breaker.record_failure()
+        logger.warning("ISS request failed after %s attempts: %s", self.retries + 1, url)
+        raise error
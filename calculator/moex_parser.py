@@ -1,139 +1,420 @@
-import requests
+import asyncio
+import json
+import logging
+import time
 from datetime import datetime
 
+from app.config import settings
+from calculator.economics_index import economics_index
+from calculator.moex_client import AsyncMoexClient, CircuitBreaker
 
-class MoexParser:
-    BASE_LIST_URL = "https://iss.moex.com/iss/engines/futures/markets/forts/securities.json"
-    BASE_PRICE_URL = "https://iss.moex.com/iss/engines/futures/markets/forts/securities/{}/securities.json"
+logger = logging.getLogger(__name__)
 
-    # Префиксы фьючерсов культур на MOEX
-    CULTURE_PREFIXES = {
-        "пшеница": "WHEAT",
-        "кукуруза": "CORN",
-        "соя": "SOYB",
-    }
 
-    # -----------------------------
-    # Получение всех фьючерсов FORTS
-    # -----------------------------
-    @classmethod
-    def get_all_futures(cls):
-        resp = requests.get(cls.BASE_LIST_URL, timeout=7)
-        resp.raise_for_status()
+class FixtureTransport:
+    """
+    Локальная подмена ISS MOEX для офлайн-запуска и тестов.
 
-        data = resp.json()
-        rows = data["securities"]["data"]
-        columns = data["securities"]["columns"]
+    Файл — JSON вида {"securities": <ответ securities.json>,
+    "marketdata": {SECID: <ответ marketdata.json>}, "series": {ASSETCODE: <ответ
+    series.json>}, "history": {SECID: <ответ history/.../SECID.json>}}.
+    """
 
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self._data = json.load(f)
 
-        secid_idx = columns.index("SECID")
-        short_name_ids = columns.index("SHORTNAME")
-        last_trade_idx = columns.index("LASTTRADEDATE")
+    async def fetch_securities(self) -> dict:
+        return self._data["securities"]
 
-        futures = []
-        for row in rows:
-            secid = row[secid_idx]
-            short_name = row[short_name_ids]
-            last_trade_date = row[last_trade_idx]
+    async def fetch_marketdata(self, ticker: str) -> dict:
+        marketdata = self._data.get("marketdata", {})
+        if ticker not in marketdata:
+            raise LookupError(f"Нет данных по тикеру {ticker}")
+        return marketdata[ticker]
 
+    async def fetch_series(self, asset_code: str) -> dict:
+        series = self._data.get("series", {})
+        if asset_code not in series:
+            raise LookupError(f"Нет серий по активу {asset_code}")
+        return series[asset_code]
 
+    async def fetch_history(self, secid: str, date_from: str, date_till: str, start: int = 0) -> dict:
+        # Фикстура отдаёт всю историю одной страницей, фильтр по датам — у вызывающего
+        history = self._data.get("history", {})
+        if secid not in history or start:
+            return {"history": {"columns": [], "data": []}}
+        return history[secid]
 
-            if last_trade_date:
-                try:
-                    last_trade_date = datetime.fromisoformat(last_trade_date)
-                except ValueError:
-                    last_trade_date = None
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+def parse_securities(data: dict):
+    rows = data["securities"]["data"]
+    columns = data["securities"]["columns"]
+
+    secid_idx = columns.index("SECID")
+    short_name_ids = columns.index("SHORTNAME")
+    last_trade_idx = columns.index("LASTTRADEDATE")
+
+    futures = []
+    for row in rows:
+        last_trade_date = row[last_trade_idx]
+
+        if last_trade_date:
+            try:
+                last_trade_date = datetime.fromisoformat(last_trade_date)
+            except ValueError:
+                last_trade_date = None
+
+        futures.append({
+            "secid": row[secid_idx],
+            "short_name": row[short_name_ids],
+            "last_trade_date": last_trade_date
+        })
+
+    return futures
+
+
+def parse_price(data: dict) -> float | None:
+    """Цена из ответа marketdata.json: LAST, если нет — SETTLEPRICE"""
+    marketdata = data.get("marketdata", {})
+    rows = marketdata.get("data", [])
+    columns = marketdata.get("columns", [])
+
+    if not rows or not columns:
+        return None
+
+    price = None
+
+    # LAST — цена последней сделки
+    if "LAST" in columns:
+        price = rows[0][columns.index("LAST")]
+
+    # Если LAST пустая, берем SETTLEPRICE
+    if (price is None or price == "") and "SETTLEPRICE" in columns:
+        price = rows[0][columns.index("SETTLEPRICE")]
+
+    if price is None or price == "":
+        return None
+
+    return float(price)
 
-            futures.append({
-                "secid": secid,
-                "short_name": short_name,
-                "last_trade_date": last_trade_date
-            })
 
-        return futures
+async def first_valid_price(fetch, tickers, timeout: float):
+    """
+    Запросить цены всех тикеров одновременно.
+
+    Побеждает первый по порядку тикер (ближайший по экспирации) с ценой:
+    ответ возвращается, как только он известен, а незавершённые запросы
+    отменяются. По истечении timeout выбирается лучший из уже полученных.
+    Возвращает (тикер, цена) или None.
+    """
+    tasks = [asyncio.create_task(fetch(ticker)) for ticker in tickers]
+    try:
+        try:
+            async with asyncio.timeout(timeout):
+                for ticker, task in zip(tickers, tasks):
+                    price = await task
+                    if price:
+                        return ticker, price
+        except TimeoutError:
+            for ticker, task in zip(tickers, tasks):
+                if task.done() and not task.cancelled() and task.exception() is None and task.result():
+                    return ticker, task.result()
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class MarketDataCache:
+    """
+    Кэш рыночных данных FORTS.
+
+    Хранит список фьючерсов, индекс префикс → контракты (по дате экспирации),
+    котировки по тикерам и итоговую цену для каждого префикса культуры.
+    Фоновая задача обновляет список раз в securities_ttl, котировки — раз в
+    quote_ttl; запросы читают последние известные значения без обращения к
+    ISS. Пока кэш пуст (задача ещё не отработала), цена загружается сразу,
+    но не дольше price_timeout. prefixes — функция, возвращающая актуальный
+    набор префиксов для фонового обновления.
+    """
+
+    def __init__(
+            self,
+            client,
+            prefixes,
+            securities_ttl: float,
+            quote_ttl: float,
+            refresh_interval: float,
+            price_timeout: float
+    ):
+        self.client = client
+        self._prefixes = prefixes
+        self.securities_ttl = securities_ttl
+        self.quote_ttl = quote_ttl
+        self.refresh_interval = refresh_interval
+        self.price_timeout = price_timeout
+
+        # Структуры заменяются целиком, поэтому читаются без блокировки;
+        # _refresh_lock не даёт двум обновлениям ходить в ISS одновременно
+        self._refresh_lock = asyncio.Lock()
+        self._futures = []
+        self._by_prefix = {}
+        self._securities_loaded_at = None
+        self._quotes = {}
+        self._prices = {}
+
+        self._task = None
+        self._price_listeners = []
+        self._listener_tasks = set()
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.fetches = 0
+
+    @property
+    def prefixes(self) -> tuple:
+        return tuple(self._prefixes())
 
     # -----------------------------
-    # Фильтр фьючерсов по префиксу
+    # Чтение (горячий путь)
     # -----------------------------
-    @classmethod
-    def get_futures_by_prefix(cls, prefix: str):
-        all_futures = cls.get_all_futures()
+    def cached_price(self, prefix: str) -> float | None:
+        """Последняя известная цена без обращения к ISS"""
+        cached = self._prices.get(prefix)
+        return cached["price"] if cached is not None else None
 
-        filtered = [
-            f for f in all_futures if f["short_name"].startswith(prefix)
-        ]
+    async def futures_by_prefix(self, prefix: str):
+        if self._securities_loaded_at is None:
+            async with self._refresh_lock:
+                if self._securities_loaded_at is None:
+                    await self._load_securities()
+        if prefix not in self._by_prefix:
+            self._by_prefix[prefix] = self._index(self._futures, prefix)
+        return list(self._by_prefix[prefix])
 
-        # сортировка по дате экспирации
-        filtered.sort(key=lambda x: x["last_trade_date"] or datetime.max)
+    async def culture_price(self, prefix: str) -> float:
+        cached = self._prices.get(prefix)
+        if cached is not None:
+            return cached["price"]
 
-        return filtered
+        async with self._refresh_lock:
+            cached = self._prices.get(prefix)
+            if cached is not None:
+                return cached["price"]
+            return (await self._resolve_price(prefix))["price"]
 
     # -----------------------------
-    # Получение цены фьючерса
+    # Обновление
     # -----------------------------
-    @classmethod
-    def get_price(cls, ticker: str) -> float | None:
+    async def refresh(self, force: bool = False):
+        """Обновить устаревший список фьючерсов и цены всех префиксов"""
+        async with self._refresh_lock:
+            loaded_at = self._securities_loaded_at
+            if force or loaded_at is None or time.monotonic() - loaded_at >= self.securities_ttl:
+                await self._load_securities()
+
+            for prefix in self.prefixes:
+                try:
+                    await self._resolve_price(prefix, force=force)
+                except Exception:
+                    self.refresh_errors += 1
+                    logger.exception("MOEX price refresh failed for %s", prefix)
+            self.refreshes += 1
+
+    def add_price_listener(self, listener):
         """
-        Получить цену фьючерса через marketdata.json
-        Берет LAST, если нет — SETTLEPRICE
+        Подписка на новые цены: listener(prefix, secid, price, expires_at) —
+        корутина, запускается отдельной задачей и не задерживает ответ.
         """
-        url = f"https://iss.moex.com/iss/engines/futures/markets/forts/securities/{ticker}/marketdata.json"
+        self._price_listeners.append(listener)
+
+    def start(self):
+        """Запустить фоновое обновление в текущем event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.client.close()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "client": type(self.client).__name__,
+            "futures": len(self._futures),
+            "securities_age_seconds": (
+                round(now - self._securities_loaded_at, 1) if self._securities_loaded_at is not None else None
+            ),
+            "prices": {
+                prefix: {
+                    "secid": cached["secid"],
+                    "price": cached["price"],
+                    "age_seconds": round(now - cached["fetched_at"], 1)
+                }
+                for prefix, cached in self._prices.items()
+            },
+            "quotes": len(self._quotes),
+            "fetches": self.fetches,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            **self.client.stats()
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                self.refresh_errors += 1
+                logger.exception("MOEX market data refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _load_securities(self):
+        self.fetches += 1
+        futures = parse_securities(await self.client.fetch_securities())
+        self._by_prefix = {prefix: self._index(futures, prefix) for prefix in self.prefixes}
+        self._futures = futures
+        self._securities_loaded_at = time.monotonic()
+
+    @staticmethod
+    def _index(futures, prefix: str):
+        filtered = [f for f in futures if f["short_name"].startswith(prefix)]
+        # сортировка по дате экспирации
+        filtered.sort(key=lambda x: x["last_trade_date"] or datetime.max)
+        return filtered
+
+    async def _quote(self, ticker: str, force: bool = False) -> float | None:
+        cached = self._quotes.get(ticker)
+        if cached is not None and not force and time.monotonic() - cached["fetched_at"] < self.quote_ttl:
+            return cached["price"]
+
+        self.fetches += 1
         try:
-            resp = requests.get(url, timeout=7)
-            resp.raise_for_status()
-        except:
-            return None
+            price = parse_price(await self.client.fetch_marketdata(ticker))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            price = None
+        self._quotes[ticker] = {"price": price, "fetched_at": time.monotonic()}
+        return price
 
-        data = resp.json()
-        marketdata = data.get("marketdata", {})
-        rows = marketdata.get("data", [])
-        columns = marketdata.get("columns", [])
+    async def _resolve_price(self, prefix: str, force: bool = False) -> dict:
+        """Цена ближайшего по экспирации контракта с котировкой; вызывается под _refresh_lock"""
+        if self._securities_loaded_at is None:
+            await self._load_securities()
 
-        if not rows or not columns:
-            return None
+        futures = self._by_prefix.get(prefix)
+        if futures is None:
+            futures = self._by_prefix[prefix] = self._index(self._futures, prefix)
+        if not futures:
+            raise ValueError("Не найдены фьючерсы культуры")
 
-        price = None
+        found = await first_valid_price(
+            lambda ticker: self._quote(ticker, force=force),
+            [f["secid"] for f in futures],
+            self.price_timeout
+        )
+        if found is None:
+            raise ValueError("Не удалось получить цену ни по одному тикеру")
 
-        # LAST — цена последней сделки
-        if "LAST" in columns:
-            idx = columns.index("LAST")
-            price = rows[0][idx]
+        secid, price = found
+        cached = {"price": price, "secid": secid, "fetched_at": time.monotonic()}
+        self._prices[prefix] = cached
 
-        # Если LAST пустая, берем SETTLEPRICE
-        if (price is None or price == "") and "SETTLEPRICE" in columns:
-            idx = columns.index("SETTLEPRICE")
-            price = rows[0][idx]
+        expires_at = next(f["last_trade_date"] for f in futures if f["secid"] == secid)
+        for listener in self._price_listeners:
+            task = asyncio.create_task(self._notify(listener, prefix, secid, price, expires_at))
+            self._listener_tasks.add(task)
+            task.add_done_callback(self._listener_tasks.discard)
+        return cached
 
-        if price is None or price == "":
-            return None
+    @staticmethod
+    async def _notify(listener, *args):
+        try:
+            await listener(*args)
+        except Exception:
+            logger.exception("MOEX price listener failed")
+
+
+def create_client():
+    if settings.MOEX_FIXTURE_PATH:
+        return FixtureTransport(settings.MOEX_FIXTURE_PATH)
+    return AsyncMoexClient(
+        timeout=settings.MOEX_REQUEST_TIMEOUT_SECONDS,
+        retries=settings.MOEX_RETRIES,
+        pool_size=settings.MOEX_POOL_SIZE,
+        breaker=CircuitBreaker(settings.MOEX_BREAKER_THRESHOLD, settings.MOEX_BREAKER_RESET_SECONDS)
+    )
 
-        return float(price)
+
+class MoexParser:
+    # Префиксы фьючерсов культур берутся из справочника CropEconomics
+    market_data = MarketDataCache(
+        create_client(),
+        prefixes=economics_index.prefixes,
+        securities_ttl=settings.MOEX_SECURITIES_TTL_SECONDS,
+        quote_ttl=settings.MOEX_QUOTE_TTL_SECONDS,
+        refresh_interval=settings.MOEX_REFRESH_INTERVAL_SECONDS,
+        price_timeout=settings.MOEX_PRICE_TIMEOUT_SECONDS
+    )
 
     # -----------------------------
-    # Основной метод: цена культуры
+    # Получение всех фьючерсов FORTS
     # -----------------------------
     @classmethod
-    def get_culture_price(cls, culture: str) -> float:
-        if culture not in cls.CULTURE_PREFIXES:
-            raise ValueError("Неизвестная культура")
+    async def get_all_futures(cls):
+        return parse_securities(await cls.market_data.client.fetch_securities())
 
-        prefix = cls.CULTURE_PREFIXES[culture]
+    # -----------------------------
+    # Фильтр фьючерсов по префиксу (из кэша)
+    # -----------------------------
+    @classmethod
+    async def get_futures_by_prefix(cls, prefix: str):
+        return await cls.market_data.futures_by_prefix(prefix)
 
-        futures = cls.get_futures_by_prefix(prefix)
-        if not futures:
-            raise ValueError("Не найдены фьючерсы культуры")
+    # -----------------------------
+    # Получение цены фьючерса
+    # -----------------------------
+    @classmethod
+    async def get_price(cls, ticker: str) -> float | None:
+        """
+        Получить цену фьючерса через marketdata.json
+        Берет LAST, если нет — SETTLEPRICE
+        """
+        try:
+            return parse_price(await cls.market_data.client.fetch_marketdata(ticker))
+        except Exception:
+            return None
 
-        # Перебор ближайших по экспирации
-        for f in futures:
-            price = cls.get_price(f["secid"])
-            if price:
-                return price
+    # -----------------------------
+    # Основной метод: цена культуры
+    # -----------------------------
+    @classmethod
+    async def get_culture_price(cls, culture: str) -> float:
+        catalogue = economics_index.current() or await asyncio.to_thread(economics_index.get)
+        info = catalogue.for_culture(culture)
+        if info is None:
+            raise ValueError("Неизвестная культура")
+        if not info.moex_prefix:
+            raise ValueError("Для культуры не задан тикер MOEX")
 
-        raise ValueError("Не удалось получить цену ни по одному тикеру")
+        return await cls.get_prefix_price(info.moex_prefix)
+
+    @classmethod
+    async def get_prefix_price(cls, prefix: str) -> float:
+        return await cls.market_data.culture_price(prefix)
 
     # -----------------------------
     # Цена семян (можно выделить в отдельную модель)
     # -----------------------------
     @classmethod
-    def get_seed_price_from_market(cls, culture: str) -> float:
-        return cls.get_culture_price(culture)
+    async def get_seed_price_from_market(cls, culture: str) -> float:
+        return await cls.get_culture_price(culture)
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import math
+from datetime import datetime, date, time, timedelta
+
+from pony.orm import db_session, select, max as max_
+
+from calculator.moex_parser import MoexParser
+from db.models import PriceQuote
+
+logger = logging.getLogger(__name__)
+
+PRICING_MARKET = "market"
+PRICING_LATEST = "latest"
+PRICING_AS_OF = "as_of"
+PRICING_MOVING_AVERAGE = "moving_average"
+
+SOURCE_MARKETDATA = "marketdata"
+SOURCE_HISTORY = "history"
+
+
+def _day(value) -> datetime:
+    if isinstance(value, datetime):
+        value = value.date()
+    return datetime.combine(value, time())
+
+
+@db_session
+def record_quotes(quotes) -> int:
+    """
+    Сохранить котировки (prefix, secid, trade_date, price, expires_at, source).
+
+    Котировка контракта за день одна: повторная запись обновляет цену.
+    Существующие записи загружаются одним запросом на всю пачку.
+    """
+    quotes = [{**quote, "trade_date": _day(quote["trade_date"])} for quote in quotes]
+    if not quotes:
+        return 0
+
+    secids = list({quote["secid"] for quote in quotes})
+    date_from = min(quote["trade_date"] for quote in quotes)
+    date_till = max(quote["trade_date"] for quote in quotes)
+    existing = {
+        (q.secid, q.trade_date): q
+        for q in select(
+            q for q in PriceQuote
+            if q.secid in secids and q.trade_date >= date_from and q.trade_date <= date_till
+        )
+    }
+
+    for quote in quotes:
+        stored = existing.get((quote["secid"], quote["trade_date"]))
+        if stored is None:
+            existing[(quote["secid"], quote["trade_date"])] = PriceQuote(
+                prefix=quote["prefix"],
+                secid=quote["secid"],
+                trade_date=quote["trade_date"],
+                price=quote["price"],
+                expires_at=quote.get("expires_at"),
+                source=quote["source"]
+            )
+        elif stored.price != quote["price"]:
+            stored.price = quote["price"]
+            stored.source = quote["source"]
+    return len(quotes)
+
+
+async def store_live_quote(prefix: str, secid: str, price: float, expires_at):
+    await asyncio.to_thread(record_quotes, [{
+        "prefix": prefix,
+        "secid": secid,
+        "trade_date": date.today(),
+        "price": price,
+        "expires_at": expires_at,
+        "source": SOURCE_MARKETDATA
+    }])
+
+
+def _front_quote(quotes):
+    """Котировка ближайшего по экспирации контракта, не истёкшего на дату торгов"""
+    return min(
+        quotes,
+        key=lambda q: (q.expires_at is not None and q.expires_at < q.trade_date, q.expires_at or datetime.max)
+    )
+
+
+def _quotes_between(prefix: str, date_from: datetime, date_till: datetime):
+    by_day = {}
+    for quote in select(
+            q for q in PriceQuote
+            if q.prefix == prefix and q.trade_date >= date_from and q.trade_date <= date_till
+    ):
+        by_day.setdefault(quote.trade_date, []).append(quote)
+    return {trade_date: _front_quote(quotes) for trade_date, quotes in sorted(by_day.items())}
+
+
+def _last_trade_date(prefix: str, as_of: date | None):
+    if as_of is None:
+        return max_(q.trade_date for q in PriceQuote if q.prefix == prefix)
+    as_of = _day(as_of)
+    return max_(q.trade_date for q in PriceQuote if q.prefix == prefix and q.trade_date <= as_of)
+
+
+@db_session
+def quote_as_of(prefix: str, as_of: date | None = None) -> dict | None:
+    """Последняя сохранённая цена на дату as_of (None — самая свежая)"""
+    last_date = _last_trade_date(prefix, as_of)
+    if last_date is None:
+        return None
+
+    quote = _quotes_between(prefix, last_date, last_date)[last_date]
+    return {
+        "price": quote.price,
+        "secid": quote.secid,
+        "trade_date": quote.trade_date.date(),
+        "source": quote.source
+    }
+
+
+@db_session
+def moving_average(prefix: str, window_days: int, as_of: date | None = None) -> dict | None:
+    """Среднее дневных цен ближайшего контракта за window_days дней до as_of"""
+    last_date = _last_trade_date(prefix, as_of)
+    if last_date is None:
+        return None
+
+    quotes = _quotes_between(prefix, last_date - timedelta(days=window_days - 1), last_date)
+    prices = [quote.price for quote in quotes.values()]
+    return {
+        "price": sum(prices) / len(prices),
+        "trade_date": last_date.date(),
+        "window_days": window_days,
+        "observations": len(prices)
+    }
+
+
+@db_session
+def historical_volatility(prefix: str, window_days: int = 365, as_of: date | None = None) -> dict | None:
+    """
+    Дневная волатильность — стандартное отклонение логарифмических
+    доходностей цены ближайшего контракта за window_days дней до as_of.
+    """
+    last_date = _last_trade_date(prefix, as_of)
+    if last_date is None:
+        return None
+
+    quotes = _quotes_between(prefix, last_date - timedelta(days=window_days - 1), last_date)
+    prices = [quote.price for quote in quotes.values()]
+    if len(prices) < 3:
+        return None
+
+    returns = [math.log(current / previous) for previous, current in zip(prices, prices[1:])]
+    mean = sum(returns) / len(returns)
+    variance = sum((r - mean) ** 2 for r in returns) / (len(returns) - 1)
+    return {
+        "daily": math.sqrt(variance),
+        "trade_date": last_date.date(),
+        "window_days": window_days,
+        "observations": len(returns)
+    }
+
+
+def _block(data: dict, name: str):
+    block = data.get(name, {})
+    columns = [column.lower() for column in block.get("columns", [])]
+    return [dict(zip(columns, row)) for row in block.get("data", [])]
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+async def _contract_history(client, prefix: str, secid: str, expires_at, date_from: date, date_till: date):
+    quotes = []
+    start = 0
+    while True:
+        data = await client.fetch_history(secid, date_from.isoformat(), date_till.isoformat(), start)
+        rows = _block(data, "history")
+        for row in rows:
+            trade_date = _parse_date(row.get("tradedate"))
+            price = row.get("settleprice") or row.get("close")
+            if trade_date is None or not price or not date_from <= trade_date.date() <= date_till:
+                continue
+            quotes.append({
+                "prefix": prefix,
+                "secid": secid,
+                "trade_date": trade_date,
+                "price": float(price),
+                "expires_at": expires_at,
+                "source": SOURCE_HISTORY
+            })
+
+        cursor = _block(data, "history.cursor")
+        if not rows or not cursor:
+            return quotes
+        start = cursor[0]["index"] + cursor[0]["pagesize"]
+        if start >= cursor[0]["total"]:
+            return quotes
+
+
+async def backfill(client, prefixes, date_from: date, date_till: date) -> dict:
+    """
+    Загрузить итоги торгов (SETTLEPRICE, иначе CLOSE) всех серий, в том
+    числе истёкших, за период [date_from, date_till] и сохранить в PriceQuote.
+    """
+    result = {}
+    for prefix in prefixes:
+        series = []
+        for row in _block(await client.fetch_series(prefix), "series"):
+            expires_at = _parse_date(row.get("expiration_date") or row.get("lasttradedate"))
+            if expires_at is None or expires_at.date() >= date_from:
+                series.append((row["secid"], expires_at))
+
+        histories = await asyncio.gather(*(
+            _contract_history(client, prefix, secid, expires_at, date_from, date_till)
+            for secid, expires_at in series
+        ))
+        quotes = [quote for history in histories for quote in history]
+        result[prefix] = await asyncio.to_thread(record_quotes, quotes)
+        logger.info("Backfilled %s quotes for %s", result[prefix], prefix)
+    return result
+
+
+MoexParser.market_data.add_price_listener(store_live_quote)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from calculator.economics_index import economics_index
+    from calculator.moex_parser import create_client
+    from db.migrations import prepare_database
+
+    parser = argparse.ArgumentParser(description="Загрузка истории цен фьючерсов MOEX")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, required=True)
+    parser.add_argument("--till", dest="date_till", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--prefix", action="append", help="Префикс актива (по умолчанию все тикеры справочника)")
+    args = parser.parse_args()
+
+    async def main():
+        client = create_client()
+        try:
+            return await backfill(
+                client, args.prefix or list(economics_index.prefixes()), args.date_from, args.date_till
+            )
+        finally:
+            await client.close()
+
+    prepare_database()
+    economics_index.get()
+    print(asyncio.run(main()))
@@ -1,20 +1,30 @@
-from fastapi import FastAPI, HTTPException, APIRouter, Query
+from datetime import date
+from typing import Literal
 
+from fastapi import FastAPI, HTTPException, APIRouter, Query, Depends
+
+from auth.deps import get_token_user
 from calculator.calculator import EconomicCalculator
-from calculator.schemas import CalculatorResponse, CalculatorRequest
+from calculator.moex_parser import MoexParser
+from calculator.schemas import CalculatorResponse, CalculatorRequest, SweepRequest, MonteCarloRequest
 
 router = APIRouter(prefix="/calculator", tags=["Calculator"])
 calculator = EconomicCalculator()
 
 
 @router.get("/calc")
-def calculate(
-    culture: str = Query(..., description="Название культуры: пшеница, кукуруза, соя"),
+async def calculate(
+    culture: str = Query(..., description="Название культуры из справочника CropEconomics"),
     area: float = Query(..., gt=0, description="Площадь в гектарах"),
-    avg_yield_cq: float = Query(..., gt=0, description="Средняя урожаеность")
+    avg_yield_cq: float = Query(..., gt=0, description="Средняя урожаеность"),
+    pricing: Literal["market", "latest", "as_of", "moving_average"] = Query(
+        "market", description="Источник цены: биржа или сохранённая история котировок"
+    ),
+    as_of: date | None = Query(None, description="Дата цены для режимов as_of и moving_average"),
+    window_days: int = Query(30, ge=1, le=365, description="Окно скользящего среднего, дней")
 ):
     try:
-        result = calculator.calculate(culture, area, avg_yield_cq)
+        result = await calculator.calculate(culture, area, avg_yield_cq, pricing, as_of, window_days)
         return {
             "culture": culture,
             "area": area,
@@ -22,3 +32,78 @@ def calculate(
         }
     except Exception as e:
         return {"error": str(e)}
+
+
+@router.get("/market-data/stats")
+def market_data_stats():
+    return MoexParser.market_data.stats()
+
+
+@router.get("/portfolio")
+async def calculate_portfolio(
+    season_id: int | None = Query(None, description="Сезон"),
+    group_id: int | None = Query(None, description="Группа полей"),
+    pricing: Literal["market", "latest", "as_of", "moving_average"] = Query("market"),
+    as_of: date | None = Query(None),
+    window_days: int = Query(30, ge=1, le=365),
+    current_user=Depends(get_token_user)
+):
+    """Экономика всех посадок сезона или группы полей: по полям и итого"""
+    try:
+        portfolio = await calculator.calculate_portfolio(
+            current_user.id, season_id, group_id, pricing, as_of, window_days
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if portfolio is None:
+        raise HTTPException(status_code=404, detail="Сезон или группа не найдены")
+    return portfolio
+
+
+@router.post("/sweep")
+async def sweep(request: SweepRequest):
+    """Сетка прибыли цена × урожайность × площадь, кривые безубыточности и перцентили"""
+    try:
+        return await calculator.sweep(
+            request.culture,
+            request.areas,
+            request.price_range,
+            request.price_points,
+            request.yield_min,
+            request.yield_max,
+            request.yield_points,
+            request.pricing,
+            request.as_of,
+            request.window_days,
+            request.include_grid
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/monte-carlo")
+async def monte_carlo(request: MonteCarloRequest):
+    """Распределение прибыли по Монте-Карло с волатильностью из истории котировок"""
+    try:
+        return await calculator.monte_carlo(
+            request.culture,
+            request.area,
+            request.yield_mean,
+            request.yield_cv,
+            request.horizon_days,
+            request.simulations,
+            request.seed,
+            request.volatility,
+            request.volatility_window_days,
+            request.pricing,
+            request.as_of,
+            request.window_days
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
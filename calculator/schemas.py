@@ -1,4 +1,10 @@
-from pydantic import BaseModel
+from datetime import date
+from typing import List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field, model_validator
+
+# Предел числа ячеек сетки в одном запросе
+MAX_SWEEP_CELLS = 250_000
 
 
 class CalculatorRequest(BaseModel):
@@ -11,3 +17,44 @@ class CalculatorResponse(BaseModel):
     fertilizers_cost: float
     revenue: float
     profit: float
+
+
+class SweepRequest(BaseModel):
+    culture: str
+    areas: List[float] = Field([1.0], min_length=1, max_length=50)
+    price_range: Tuple[float, float] = (0.5, 1.5)
+    price_points: int = Field(50, ge=2, le=500)
+    yield_min: float = Field(..., gt=0)
+    yield_max: float = Field(..., gt=0)
+    yield_points: int = Field(50, ge=2, le=500)
+    pricing: Literal["market", "latest", "as_of", "moving_average"] = "market"
+    as_of: Optional[date] = None
+    window_days: int = Field(30, ge=1, le=365)
+    include_grid: bool = True
+
+    @model_validator(mode="after")
+    def validate_grid(self):
+        if any(area <= 0 for area in self.areas):
+            raise ValueError("Площадь должна быть больше нуля")
+        if not 0 < self.price_range[0] < self.price_range[1]:
+            raise ValueError("Диапазон цен должен быть положительным и возрастающим")
+        if self.yield_min >= self.yield_max:
+            raise ValueError("yield_min должен быть меньше yield_max")
+        if self.price_points * self.yield_points * len(self.areas) > MAX_SWEEP_CELLS:
+            raise ValueError(f"Сетка больше {MAX_SWEEP_CELLS} ячеек")
+        return self
+
+
+class MonteCarloRequest(BaseModel):
+    culture: str
+    area: float = Field(..., gt=0)
+    yield_mean: Optional[float] = Field(None, gt=0)
+    yield_cv: float = Field(0.15, ge=0, le=2)
+    horizon_days: int = Field(180, ge=1, le=730)
+    simulations: int = Field(10000, ge=100, le=200000)
+    seed: Optional[int] = None
+    volatility: Optional[float] = Field(None, ge=0, le=5)
+    volatility_window_days: int = Field(365, ge=7, le=3650)
+    pricing: Literal["market", "latest", "as_of", "moving_average"] = "market"
+    as_of: Optional[date] = None
+    window_days: int = Field(30, ge=1, le=365)
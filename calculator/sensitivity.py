@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+PERCENTILES = (5, 25, 50, 75, 95)
+HISTOGRAM_BINS = 20
+
+
+@dataclass(frozen=True)
+class CropEconomicsInput:
+    """
+    Параметры культуры для расчёта: семена покупаются по seed_price за кг
+    при посеве, урожай продаётся по варьируемой цене за кг.
+    """
+    seed_price: float
+    seeding_rate: float
+
+
+def profit_grid(inputs: CropEconomicsInput, prices: np.ndarray, yields: np.ndarray, areas: np.ndarray):
+    """
+    Выручка, затраты на семена и прибыль на сетке цена × урожайность × площадь.
+
+    Формулы совпадают с EconomicCalculator: урожай (ц/га) переводится в кг,
+    затраты на семена — seed_price × норма высева × площадь.
+    Возвращает массивы формы (len(prices), len(yields), len(areas)).
+    """
+    yield_kg = yields[None, :, None] * areas[None, None, :] * 100
+    revenue = prices[:, None, None] * yield_kg
+    seeds_cost = np.broadcast_to(inputs.seed_price * inputs.seeding_rate * areas[None, None, :], revenue.shape)
+    return revenue, seeds_cost, revenue - seeds_cost
+
+
+def break_even_prices(inputs: CropEconomicsInput, yields: np.ndarray) -> np.ndarray:
+    """Цена продажи за кг, при которой прибыль нулевая, для каждой урожайности (от площади не зависит)"""
+    return inputs.seed_price * inputs.seeding_rate / (yields * 100)
+
+
+def break_even_yields(inputs: CropEconomicsInput, prices: np.ndarray) -> np.ndarray:
+    """Урожайность (ц/га), при которой прибыль нулевая, для каждой цены"""
+    return inputs.seed_price * inputs.seeding_rate / (prices * 100)
+
+
+def distribution(values: np.ndarray) -> dict:
+    values = values.ravel()
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    return {
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "percentiles": {
+            str(p): float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+        },
+        "loss_probability": float((values < 0).mean()),
+        "histogram": {"edges": edges.round(2).tolist(), "counts": counts.tolist()}
+    }
+
+
+def simulate_profit(
+        inputs: CropEconomicsInput,
+        base_price: float,
+        volatility: float,
+        yield_mean: float,
+        yield_cv: float,
+        area: float,
+        simulations: int,
+        seed: int | None = None
+):
+    """
+    Монте-Карло распределение прибыли.
+
+    Цена продажи — логнормальная с нулевым дрейфом вокруг base_price и
+    стандартным отклонением логарифма volatility (волатильность за горизонт),
+    урожайность — нормальная с коэффициентом вариации yield_cv, обрезанная
+    снизу нулём. Генератор инициализируется seed для воспроизводимости.
+    Возвращает (цены, урожайности, прибыль).
+    """
+    rng = np.random.default_rng(seed)
+    prices = base_price * np.exp(volatility * rng.standard_normal(simulations) - volatility ** 2 / 2)
+    yields = np.maximum(rng.normal(yield_mean, yield_mean * yield_cv, simulations), 0)
+
+    revenue = prices * yields * area * 100
+    seeds_cost = inputs.seed_price * inputs.seeding_rate * area
+    return prices, yields, revenue - seeds_cost
@@ -0,0 +1,89 @@
+"""
+Изменения схемы существующих таблиц.
+
+generate_mapping(create_tables=True) создаёт только отсутствующие таблицы:
+колонки, появившиеся в сущностях позже, в существующие таблицы не
+добавляются, и проверка таблиц при отображении падает на первой из них.
+Такие колонки добавляются здесь до generate_mapping; каждый шаг
+идемпотентен, поэтому prepare_database() безопасно вызывать при каждом
+запуске.
+"""
+import logging
+
+from pony.orm import db_session
+
+from db.models import db
+
+logger = logging.getLogger(__name__)
+
+# Типы колонок в диалектах провайдеров Pony
+COLUMN_TYPES = {
+    "PostgreSQL": {"int": "integer", "float": "double precision", "json": "jsonb"},
+    "SQLite": {"int": "INTEGER", "float": "REAL", "json": "JSON"},
+}
+
+# Колонки, добавленные в сущности после создания их таблиц:
+# (сущность, колонка, тип, ограничения, нужен ли индекс)
+ADDED_COLUMNS = (
+    ("User", "token_version", "int", "NOT NULL DEFAULT 0", False),
+    # Вычисленная геометрия поля; значения заполняет python -m fields.recompute
+    ("Field", "geo_area_ha", "float", "", False),
+    ("Field", "min_lat", "float", "", True),
+    ("Field", "min_lon", "float", "", True),
+    ("Field", "max_lat", "float", "", True),
+    ("Field", "max_lon", "float", "", True),
+    ("Field", "centroid_lat", "float", "", True),
+    ("Field", "centroid_lon", "float", "", True),
+    # Упрощённые полигоны; пустой JSON у старых полей — признак отсутствия
+    # пирамиды, вместе с geometry_version = NULL
+    ("Field", "simplified_2m", "json", "NOT NULL DEFAULT '{}'", False),
+    ("Field", "simplified_5m", "json", "NOT NULL DEFAULT '{}'", False),
+    ("Field", "simplified_25m", "json", "NOT NULL DEFAULT '{}'", False),
+    ("Field", "simplified_100m", "json", "NOT NULL DEFAULT '{}'", False),
+    ("Field", "simplified_500m", "json", "NOT NULL DEFAULT '{}'", False),
+    ("Field", "geometry_version", "int", "", False),
+)
+
+
+def _existing_columns(table: str) -> set | None:
+    """Колонки таблицы; None — таблицы ещё нет, её целиком создаст generate_mapping"""
+    if db.provider.dialect == "SQLite":
+        columns = {row[1] for row in db.execute(f'PRAGMA table_info("{table}")').fetchall()}
+    else:
+        columns = set(db.select(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = $table"
+        ))
+    return columns or None
+
+
+@db_session
+def migrate_schema() -> list[str]:
+    """Добавить недостающие колонки ADDED_COLUMNS; возвращает добавленные"""
+    types = COLUMN_TYPES[db.provider.dialect]
+    columns_by_table = {}
+    added = []
+    for entity_name, column, column_type, constraints, indexed in ADDED_COLUMNS:
+        table = db.provider.normalize_name(entity_name)
+        if table not in columns_by_table:
+            columns_by_table[table] = _existing_columns(table)
+        columns = columns_by_table[table]
+        if columns is None or column in columns:
+            continue
+
+        db.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {types[column_type]} {constraints}')
+        if indexed:
+            index = db.provider.get_default_index_name(table, [column])
+            db.execute(f'CREATE INDEX IF NOT EXISTS "{index}" ON "{table}" ("{column}")')
+        columns.add(column)
+        added.append(f"{table}.{column}")
+
+    if added:
+        logger.info("Added columns: %s", ", ".join(added))
+    return added
+
+
+def prepare_database():
+    """Миграции существующих таблиц и отображение сущностей на БД"""
+    migrate_schema()
+    db.generate_mapping(create_tables=True)
@@ -3,25 +3,35 @@ from datetime import datetime
 
 from dotenv import load_dotenv
 from pony.orm import Database
-from pony.orm import Required, Optional, PrimaryKey, Set, Json
+from pony.orm import Required, Optional, PrimaryKey, Set, Json, composite_key, composite_index
+
+from db.signals import attach, notify
 
 load_dotenv()
 
 db = Database()
-db.bind(
-    provider="postgres",
-    user=os.getenv("POSTGRES_USER", "postgres"),
-    password=os.getenv("POSTGRES_PASSWORD", "postgres"),
-    host=os.getenv("POSTGRES_HOST", "localhost"),
-    database=os.getenv("POSTGRES_DB", "farmdb"),
-    port=os.getenv("POSTGRES_PORT", "5432"),
-)
+if os.getenv("DB_PROVIDER") == "sqlite":
+    # Локальная БД для тестов
+    db.bind(provider="sqlite", filename=os.getenv("SQLITE_FILENAME", ":memory:"), create_db=True)
+else:
+    db.bind(
+        provider="postgres",
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", "postgres"),
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        database=os.getenv("POSTGRES_DB", "farmdb"),
+        port=os.getenv("POSTGRES_PORT", "5432"),
+    )
+# События хуков сущностей доставляются подписчикам db.signals после COMMIT
+attach(db)
 
 
 class User(db.Entity):
     id = PrimaryKey(int, auto=True)
     email = Required(str, unique=True, max_len=100)
     password_hash = Required(str, max_len=255)
+    # Версия токенов: увеличение отзывает все выданные ранее access-токены
+    token_version = Required(int, default=0)
     created_at = Required(datetime, default=datetime.utcnow)
     updated_at = Required(datetime, default=datetime.utcnow)
 
@@ -29,6 +39,13 @@ class User(db.Entity):
     field_groups = Set('FieldGroup')
     fields = Set('Field')
     irrigation_records = Set('IrrigationRecord')
+    refresh_tokens = Set('RefreshToken')
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
 
 
 class Season(db.Entity):
@@ -65,6 +82,25 @@ class Field(db.Entity):
     created_at = Required(datetime, default=datetime.utcnow)
     updated_at = Required(datetime, default=datetime.utcnow)
 
+    # Геометрия, вычисленная по coordinates (fields.geometry) при записи поля.
+    # Pony не допускает float в составных индексах, поэтому индексы отдельные
+    geo_area_ha = Optional(float)
+    min_lat = Optional(float, index=True)
+    min_lon = Optional(float, index=True)
+    max_lat = Optional(float, index=True)
+    max_lon = Optional(float, index=True)
+    centroid_lat = Optional(float, index=True)
+    centroid_lon = Optional(float, index=True)
+    # Пирамида детализации: полигон, упрощённый с допусками
+    # fields.geometry.SIMPLIFY_TOLERANCES_M. Ленивые колонки не загружаются
+    # вместе с сущностью, только явной выборкой
+    simplified_2m = Optional(Json, lazy=True)
+    simplified_5m = Optional(Json, lazy=True)
+    simplified_25m = Optional(Json, lazy=True)
+    simplified_100m = Optional(Json, lazy=True)
+    simplified_500m = Optional(Json, lazy=True)
+    geometry_version = Optional(int)
+
     groups = Set(FieldGroup)
     soil_profiles = Set('FieldSoilProfile')
     observations = Set('FieldObservation')
@@ -73,6 +109,15 @@ class Field(db.Entity):
     plantings = Set('Planting')
     rotation_recommendations = Set('RotationRecommendation')
 
+    def after_insert(self):
+        notify(self)
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
+
 
 class PlantFamily(db.Entity):
     id = PrimaryKey(int, auto=True)
@@ -82,6 +127,15 @@ class PlantFamily(db.Entity):
 
     crops = Set('Crop')
 
+    def after_insert(self):
+        notify(self)
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
+
 
 class AppetiteLevel(db.Entity):
     id = PrimaryKey(int, auto=True)
@@ -111,6 +165,43 @@ class Crop(db.Entity):
     rotation_rules_as_previous = Set('CropRotationRule', reverse='previous_crop')
     rotation_rules_as_next = Set('CropRotationRule', reverse='next_crop')
     rotation_recommendations = Set('RotationRecommendation')
+    economics = Optional('CropEconomics')
+
+    def after_insert(self):
+        notify(self)
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
+
+
+class CropEconomics(db.Entity):
+    """
+    Экономические параметры культуры для калькулятора.
+
+    Цены — в тех же единицах, что и котировки MOEX; если moex_prefix не
+    задан, цена продажи берётся из market_price. Пустая seed_price —
+    семена по цене продажи культуры.
+    """
+    id = PrimaryKey(int, auto=True)
+    crop = Required(Crop, unique=True)
+    seeding_rate = Required(float)
+    default_yield = Required(float)
+    seed_price = Optional(float)
+    market_price = Optional(float)
+    moex_prefix = Optional(str, max_len=20, nullable=True)
+    updated_at = Required(datetime, default=datetime.utcnow)
+
+    def after_insert(self):
+        notify(self)
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
 
 
 class CropRotationRule(db.Entity):
@@ -121,6 +212,15 @@ class CropRotationRule(db.Entity):
     rule_description = Optional(str)
     created_at = Required(datetime, default=datetime.utcnow)
 
+    def after_insert(self):
+        notify(self)
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
+
 
 class Planting(db.Entity):
     id = PrimaryKey(int, auto=True)
@@ -137,6 +237,15 @@ class Planting(db.Entity):
     created_at = Required(datetime, default=datetime.utcnow)
     updated_at = Required(datetime, default=datetime.utcnow)
 
+    def after_insert(self):
+        notify(self)
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
+
 
 class FieldSoilProfile(db.Entity):
     id = PrimaryKey(int, auto=True)
@@ -155,6 +264,15 @@ class FieldSoilProfile(db.Entity):
     sample_date = Required(datetime)
     created_at = Required(datetime, default=datetime.utcnow)
 
+    def after_insert(self):
+        notify(self)
+
+    def after_update(self):
+        notify(self)
+
+    def before_delete(self):
+        notify(self)
+
 
 class FieldObservation(db.Entity):
     id = PrimaryKey(int, auto=True)
@@ -214,3 +332,32 @@ class RotationRecommendation(db.Entity):
     generated_at = Required(datetime, default=datetime.utcnow)
     is_applied = Required(bool, default=False)
 
+
+class PriceQuote(db.Entity):
+    id = PrimaryKey(int, auto=True)
+    prefix = Required(str, max_len=20)
+    secid = Required(str, max_len=20)
+    trade_date = Required(datetime)
+    price = Required(float)
+    expires_at = Optional(datetime)
+    source = Required(str, max_len=20)
+
+    created_at = Required(datetime, default=datetime.utcnow)
+
+    composite_key(secid, trade_date)
+    composite_index(prefix, trade_date)
+
+
+class RefreshToken(db.Entity):
+    """
+    Refresh-токен пользователя. Хранится только sha256 от токена
+    (уникальный индекс для поиска); при обновлении токен отзывается и
+    заменяется новым.
+    """
+    id = PrimaryKey(int, auto=True)
+    user = Required(User)
+    token_hash = Required(str, unique=True, max_len=64)
+    expires_at = Required(datetime)
+    revoked_at = Optional(datetime)
+
+    created_at = Required(datetime, default=datetime.utcnow)
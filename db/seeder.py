@@ -1,6 +1,6 @@
 from pony.orm import db_session
 
-from db.models import CropRotationRule, AppetiteLevel, PlantFamily, Crop
+from db.models import CropRotationRule, AppetiteLevel, PlantFamily, Crop, CropEconomics
 
 
 @db_session
@@ -87,6 +87,10 @@ def create_detailed_seed_data():
          'crop_type': 'legume', 'nutrient_demand': 'low', 'water_demand': 'low', 'disease_risk': 'low',
          'preferred_ph': 'neutral', 'rotation_interval': 3},
 
+        {'name': 'Соя', 'latin_name': 'Glycine max', 'family': 'fabaceae', 'appetite': 'low',
+         'crop_type': 'legume', 'nutrient_demand': 'low', 'water_demand': 'medium', 'disease_risk': 'medium',
+         'preferred_ph': 'neutral', 'rotation_interval': 3},
+
         # Зонтичные (средний аппетит)
         {'name': 'Морковь', 'latin_name': 'Daucus carota', 'family': 'apiaceae', 'appetite': 'medium',
          'crop_type': 'root', 'nutrient_demand': 'medium', 'water_demand': 'medium', 'disease_risk': 'low',
@@ -186,3 +190,85 @@ def create_detailed_seed_data():
             compatibility=rule_data['comp'],
             rule_description=rule_data['desc']
         )
+
+
+@db_session
+def create_crop_economics_seed_data():
+    """
+    Экономика культур для калькулятора: норма высева (кг/га), базовая
+    урожайность (ц/га), цена семян и цена продажи в единицах котировок MOEX.
+    Для культур с тикером цена продажи берётся с биржи, а семена без
+    seed_price оцениваются по ней же.
+    """
+    if CropEconomics.select().first():
+        return
+
+    economics_data = [
+        # Культуры с фьючерсами на MOEX
+        {'name': 'Пшеница', 'seeding_rate': 120, 'default_yield': 35, 'moex_prefix': 'WHEAT'},
+        {'name': 'Кукуруза', 'seeding_rate': 25, 'default_yield': 60, 'moex_prefix': 'CORN'},
+        {'name': 'Соя', 'seeding_rate': 80, 'default_yield': 25, 'moex_prefix': 'SOYB'},
+
+        # Полевые культуры без биржевых котировок
+        {'name': 'Ячмень', 'seeding_rate': 180, 'default_yield': 30, 'seed_price': 25000, 'market_price': 13000},
+        {'name': 'Подсолнечник', 'seeding_rate': 6, 'default_yield': 22, 'seed_price': 500000,
+         'market_price': 35000},
+        {'name': 'Рапс', 'seeding_rate': 8, 'default_yield': 20, 'seed_price': 400000, 'market_price': 40000},
+        {'name': 'Горох', 'seeding_rate': 220, 'default_yield': 20, 'seed_price': 40000, 'market_price': 20000},
+        {'name': 'Фасоль', 'seeding_rate': 100, 'default_yield': 15, 'seed_price': 150000, 'market_price': 80000},
+        {'name': 'Люцерна', 'seeding_rate': 15, 'default_yield': 60, 'seed_price': 400000, 'market_price': 8000},
+        {'name': 'Картофель', 'seeding_rate': 3000, 'default_yield': 200, 'seed_price': 40000,
+         'market_price': 20000},
+        {'name': 'Свекла', 'seeding_rate': 6, 'default_yield': 400, 'seed_price': 1000000, 'market_price': 4000},
+
+        # Овощные культуры
+        {'name': 'Томат', 'seeding_rate': 0.3, 'default_yield': 300, 'seed_price': 20000000,
+         'market_price': 60000},
+        {'name': 'Перец', 'seeding_rate': 0.5, 'default_yield': 200, 'seed_price': 25000000,
+         'market_price': 90000},
+        {'name': 'Баклажан', 'seeding_rate': 0.5, 'default_yield': 200, 'seed_price': 20000000,
+         'market_price': 70000},
+        {'name': 'Огурец', 'seeding_rate': 4, 'default_yield': 250, 'seed_price': 15000000,
+         'market_price': 60000},
+        {'name': 'Кабачок', 'seeding_rate': 5, 'default_yield': 300, 'seed_price': 3000000, 'market_price': 30000},
+        {'name': 'Тыква', 'seeding_rate': 4, 'default_yield': 250, 'seed_price': 2000000, 'market_price': 20000},
+        {'name': 'Капуста белокочанная', 'seeding_rate': 0.6, 'default_yield': 400, 'seed_price': 10000000,
+         'market_price': 15000},
+        {'name': 'Редис', 'seeding_rate': 20, 'default_yield': 150, 'seed_price': 1000000, 'market_price': 50000},
+        {'name': 'Морковь', 'seeding_rate': 5, 'default_yield': 300, 'seed_price': 3000000, 'market_price': 25000},
+        {'name': 'Петрушка', 'seeding_rate': 4, 'default_yield': 100, 'seed_price': 1000000,
+         'market_price': 150000},
+        {'name': 'Лук репчатый', 'seeding_rate': 6, 'default_yield': 300, 'seed_price': 5000000,
+         'market_price': 20000},
+        {'name': 'Чеснок', 'seeding_rate': 800, 'default_yield': 80, 'seed_price': 300000, 'market_price': 150000},
+    ]
+
+    crops = {crop.name: crop for crop in Crop.select()}
+
+    # В базах, заполненных до появления сои в справочнике, культура добавляется здесь
+    if 'Соя' not in crops:
+        crops['Соя'] = Crop(
+            name='Соя',
+            latin_name='Glycine max',
+            family=PlantFamily.get(latin_name='Fabaceae'),
+            appetite_level=AppetiteLevel.get(level_name='low'),
+            crop_type='legume',
+            nutrient_demand='low',
+            water_demand='medium',
+            disease_risk='medium',
+            preferred_ph='neutral',
+            recommended_rotation_interval=3
+        )
+
+    for economics in economics_data:
+        crop = crops.get(economics['name'])
+        if crop is None:
+            continue
+        CropEconomics(
+            crop=crop,
+            seeding_rate=economics['seeding_rate'],
+            default_yield=economics['default_yield'],
+            seed_price=economics.get('seed_price'),
+            market_price=economics.get('market_price'),
+            moex_prefix=economics.get('moex_prefix')
+        )
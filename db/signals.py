@@ -0,0 +1,70 @@
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Подписчики на изменения сущностей: имя сущности -> [(обработчик, ключ)]
+_listeners = defaultdict(list)
+# Изменения незафиксированных транзакций: сессия Pony -> {(обработчик, аргумент): None}
+_pending = {}
+
+
+def subscribe(entity_name: str, listener, key=None):
+    """
+    Подписать обработчик на вставку, изменение и удаление сущности.
+
+    Обработчик вызывается после COMMIT транзакции, в которой сущность
+    изменилась, — один раз на каждое значение key(entity) (по умолчанию —
+    сама сущность). key вычисляется сразу при изменении, пока связи
+    сущности ещё доступны; при откате транзакции обработчик не вызывается.
+    """
+    if (listener, key) not in _listeners[entity_name]:
+        _listeners[entity_name].append((listener, key))
+
+
+def notify(entity):
+    """Вызывается из хуков сущностей db.models (во время flush, до COMMIT)"""
+    listeners = _listeners.get(type(entity).__name__)
+    if not listeners:
+        return
+    pending = _pending.setdefault(entity._session_cache_, {})
+    for listener, key in listeners:
+        pending[listener, key(entity) if key is not None else entity] = None
+
+
+def _deliver(cache):
+    for listener, argument in _pending.pop(cache, {}):
+        try:
+            listener(argument)
+        except Exception:
+            # Транзакция уже зафиксирована — ошибка кэша не должна превращать её в 500
+            logger.exception("Signal listener %r failed", listener)
+
+
+def attach(database):
+    """
+    Доставка событий после фиксации транзакций database.
+
+    У Pony нет хука после COMMIT, поэтому оборачиваются методы провайдера:
+    commit доставляет накопленные события сессии, release и drop (конец
+    сессии, в том числе после отката) отбрасывают недоставленные.
+    """
+    provider = database.provider
+    commit, release, drop = provider.commit, provider.release, provider.drop
+
+    def commit_and_deliver(connection, cache=None):
+        commit(connection, cache)
+        if cache is not None:
+            _deliver(cache)
+
+    def release_and_discard(connection, cache=None):
+        _pending.pop(cache, None)
+        release(connection, cache)
+
+    def drop_and_discard(connection, cache=None):
+        _pending.pop(cache, None)
+        drop(connection, cache)
+
+    provider.commit = commit_and_deliver
+    provider.release = release_and_discard
+    provider.drop = drop_and_discard
@@ -1,119 +1,244 @@
-import json
 from datetime import datetime, timezone
 
 from pony.orm import db_session, select
 
-from db.models import Field, User, Planting, Crop
+from db.models import Field, User, Planting
+from fields import geometry
+
+
+GEOMETRY_COLUMNS = (
+    "geo_area_ha", "min_lat", "min_lon", "max_lat", "max_lon", "centroid_lat", "centroid_lon",
+    *(geometry.simplified_column(t) for t in geometry.SIMPLIFY_TOLERANCES_M), "geometry_version"
+)
+
+# Колонки, доступные в проекции списка полей (параметр fields=)
+LIST_COLUMNS = ("id", "name", "area_ha", "soil_type", "geo_area_ha")
+BBOX_COLUMNS = ("min_lat", "min_lon", "max_lat", "max_lon", "centroid_lat", "centroid_lon")
+
+GEOMETRY_NONE = "none"
+GEOMETRY_BBOX = "bbox"
+GEOMETRY_SIMPLIFIED = "simplified"
+GEOMETRY_FULL = "full"
+
+
+def field_geometry(field: Field) -> dict:
+    """Площадь, bbox и центроид из колонок поля — без разбора полигона"""
+    if field.min_lat is None:
+        return {"geo_area_ha": None, "bbox": None, "centroid": None}
+    return {
+        "geo_area_ha": field.geo_area_ha,
+        "bbox": [field.min_lat, field.min_lon, field.max_lat, field.max_lon],
+        "centroid": [field.centroid_lat, field.centroid_lon]
+    }
+
+
+def _field_dict(field: Field) -> dict:
+    data = field.to_dict(exclude=GEOMETRY_COLUMNS)
+    data["coordinates"] = geometry.load_coordinates(data.get("coordinates"))
+    data.update(field_geometry(field))
+    return data
 
 
 @db_session
-def create_field(user_id: int, name: str, area_ha: float, coordinates: list[list], soil_type: str | None):
+def create_field(
+        user_id: int,
+        name: str,
+        area_ha: float | None,
+        coordinates: list[list],
+        soil_type: str | None
+):
     user = User.get(id=user_id)
     if not user:
         raise ValueError("Пользователь не найден")
 
+    shape = geometry.compute(coordinates)
+
     field = Field(
         name=name,
         owner=user,
-        area_ha=area_ha,
-        coordinates=json.dumps(coordinates),
+        area_ha=area_ha or shape.area_ha,
+        coordinates=coordinates,
         soil_type=soil_type,
         created_at=datetime.now(timezone.utc),
-        updated_at=datetime.now(timezone.utc)
+        updated_at=datetime.now(timezone.utc),
+        **shape.columns()
     )
 
-    result = field.to_dict()
+    return _field_dict(field)
 
-    if "coordinates" in result and isinstance(result["coordinates"], str):
-        result["coordinates"] = json.loads(result["coordinates"])
 
-    return result
+def _owner_fields(owner_id: int, after_id: int | None, limit: int | None):
+    # Keyset-пагинация: страница — поля с id больше after_id по возрастанию id
+    query = Field.select(lambda f: f.owner.id == owner_id)
+    if after_id is not None:
+        query = query.filter(lambda f: f.id > after_id)
+    query = query.order_by(Field.id)
+    return query[:limit] if limit is not None else query[:]
 
 
 @db_session
-def get_all_fields(owner_id: int):
-    fields = Field.select(lambda f: f.owner.id == owner_id)
+def get_fields_projection(
+        owner_id: int,
+        columns: tuple = LIST_COLUMNS,
+        geometry_mode: str = GEOMETRY_FULL,
+        tolerance_m: float = 25,
+        after_id: int | None = None,
+        limit: int | None = None,
+        field_ids: list[int] | None = None
+):
+    """
+    Список полей с выборкой только нужных колонок.
+
+    columns — подмножество LIST_COLUMNS (id добавляется всегда, он нужен
+    курсору). geometry_mode определяет, какие колонки геометрии попадут в
+    SELECT: none — никакие, bbox — bbox и центроид, simplified — они же и
+    полигон ближайшего предвычисленного допуска, full — они же и исходный
+    полигон. field_ids ограничивает выборку заданными полями.
+    """
+    unknown = set(columns) - set(LIST_COLUMNS)
+    if unknown:
+        raise ValueError(f"Неизвестные колонки: {', '.join(sorted(unknown))}")
+    if geometry_mode not in (GEOMETRY_NONE, GEOMETRY_BBOX, GEOMETRY_SIMPLIFIED, GEOMETRY_FULL):
+        raise ValueError("geometry: none, bbox, simplified или full")
+    columns = ("id", *(c for c in LIST_COLUMNS if c in columns and c != "id"))
+
+    selected = list(columns)
+    if geometry_mode != GEOMETRY_NONE:
+        selected += BBOX_COLUMNS
+    if geometry_mode == GEOMETRY_SIMPLIFIED:
+        selected.append(geometry.simplified_column(geometry.nearest_tolerance(tolerance_m)))
+    elif geometry_mode == GEOMETRY_FULL:
+        selected.append("coordinates")
+
+    # Имена колонок — только из белых списков выше; значения — параметры запроса
+    text = "(%s,) for f in Field if f.owner.id == owner_id" % ", ".join(f"f.{c}" for c in selected)
+    if after_id is not None:
+        text += " and f.id > after_id"
+    if field_ids is not None:
+        text += " and f.id in field_ids"
+    query = select(text).order_by(1)
+    rows = query[:limit] if limit is not None else query[:]
+
     result = []
-    for field in fields:
-        field_data = field.to_dict()
-        if "coordinates" in field_data and isinstance(field_data["coordinates"], str):
-            field_data["coordinates"] = json.loads(field_data["coordinates"])
-        result.append(field_data)
+    for row in rows:
+        item = dict(zip(columns, row))
+        if geometry_mode != GEOMETRY_NONE:
+            min_lat, min_lon, max_lat, max_lon, centroid_lat, centroid_lon = row[len(columns):len(columns) + 6]
+            has_geometry = min_lat is not None
+            item["bbox"] = [min_lat, min_lon, max_lat, max_lon] if has_geometry else None
+            item["centroid"] = [centroid_lat, centroid_lon] if has_geometry else None
+        if geometry_mode == GEOMETRY_SIMPLIFIED:
+            # У полей без пересчитанной геометрии упрощённого полигона нет
+            item["coordinates"] = row[-1] or None
+        elif geometry_mode == GEOMETRY_FULL:
+            item["coordinates"] = geometry.load_coordinates(row[-1])
+        result.append(item)
     return result
 
 
 @db_session
-def get_all_fields_with_plantings(owner_id: int):
-    # Сначала получаем все поля
-    fields = Field.select(lambda f: f.owner.id == owner_id)[:]
-
-    # Получаем все посадки для этих полей одним запросом
-    field_ids = [f.id for f in fields]
-    plantings = select(
-        p for p in Planting
-        if p.field.id in field_ids
-    )[:]
-
-    # Получаем все культуры и семейства для этих посадок
-    planting_ids = [p.id for p in plantings]
-    crop_ids = [p.crop.id for p in plantings if p.crop]
-
-    # Prefetch для культур и их семейств
-    crops = select(c for c in Crop if c.id in crop_ids).prefetch(Crop.family)[:]
-
-    # Создаем словари для быстрого доступа
-    crops_dict = {crop.id: crop for crop in crops}
-    plantings_by_field = {}
+def get_fields_by_ids(field_ids: list[int], owner_id: int):
+    """Поля владельца в порядке field_ids (результат запроса к пространственному индексу)"""
+    if not field_ids:
+        return []
+    fields = {f.id: f for f in Field.select(lambda f: f.id in field_ids and f.owner.id == owner_id)}
+    return [_field_dict(fields[field_id]) for field_id in field_ids if field_id in fields]
 
-    for planting in plantings:
-        field_id = planting.field.id
-        if field_id not in plantings_by_field:
-            plantings_by_field[field_id] = []
-        plantings_by_field[field_id].append(planting)
 
-    result = []
+@db_session
+def get_field_geometry(field_id: int, owner_id: int, zoom: float):
+    """Полигон поля с уровнем детализации для масштаба карты zoom"""
+    row = select(
+        (f.centroid_lat, f.geometry_version) for f in Field if f.id == field_id and f.owner.id == owner_id
+    ).first()
+    if row is None:
+        return None
+
+    centroid_lat, geometry_version = row
+    # Пирамида есть только у полей с актуальной геометрией
+    tolerance = None
+    if geometry_version == geometry.GEOMETRY_VERSION:
+        tolerance = geometry.tolerance_for_zoom(zoom, centroid_lat)
+
+    column = geometry.simplified_column(tolerance) if tolerance is not None else "coordinates"
+    coordinates = geometry.load_coordinates(
+        select("f.%s for f in Field if f.id == field_id" % column).first()
+    )
+    return {
+        "id": field_id,
+        "zoom": zoom,
+        "tolerance_m": tolerance,
+        "vertices": len(coordinates) if coordinates else 0,
+        "coordinates": coordinates
+    }
+
 
-    for field in fields:
-        field_plantings = []
-
-        for planting in plantings_by_field.get(field.id, []):
-            crop = crops_dict.get(planting.crop.id) if planting.crop else None
-            season = planting.season
-
-            planting_dict = {
-                'id': planting.id,
-                'crop_id': crop.id if crop else None,
-                'crop_name': crop.name if crop else None,
-                'crop_family': crop.family.name if crop and crop.family else None,
-                'year': season.date_start.year if season and season.date_start else None,
-                'season': season.name if season else None,
-                'planting_date': planting.planting_date,
-                'harvest_date': planting.harvest_date,
-                'yield_amount': planting.yield_amount,
-                'yield_quality': planting.yield_quality,
-                'notes': planting.notes,
-            }
-            field_plantings.append(planting_dict)
-
-        coordinates = field.coordinates
-        if coordinates and isinstance(coordinates, str):
-            try:
-                coordinates = json.loads(coordinates)
-            except json.JSONDecodeError:
-                coordinates = None
-
-        field_data = {
+@db_session
+def get_all_fields_with_plantings(owner_id: int, after_id: int | None = None, limit: int | None = None):
+    """
+    Поля страницы с историей посадок.
+
+    Число запросов не зависит от числа полей и посадок: поля страницы —
+    один запрос, посадки вместе с культурой, семейством и сезоном — второй,
+    с JOIN в БД. Страница keyset-пагинации — непрерывный диапазон id полей
+    владельца, поэтому посадки отбираются по этому диапазону, а не списком id.
+    """
+    fields = _owner_fields(owner_id, after_id, limit)
+    if not fields:
+        return []
+
+    first_id, last_id = fields[0].id, fields[-1].id
+    rows = select(
+        (
+            p.field.id, p.id, p.crop.id, p.crop.name, p.crop.family.name, p.season.name, p.season.date_start,
+            p.planting_date, p.harvest_date, p.yield_amount, p.yield_quality, p.notes
+        )
+        for p in Planting
+        if p.field.owner.id == owner_id and p.field.id >= first_id and p.field.id <= last_id
+    ).order_by(1, 2)[:]
+
+    plantings_by_field = {}
+    for (field_id, planting_id, crop_id, crop_name, crop_family, season_name, season_start,
+         planting_date, harvest_date, yield_amount, yield_quality, notes) in rows:
+        plantings_by_field.setdefault(field_id, []).append({
+            'id': planting_id,
+            'crop_id': crop_id,
+            'crop_name': crop_name,
+            'crop_family': crop_family,
+            'year': season_start.year if season_start else None,
+            'season': season_name,
+            'planting_date': planting_date,
+            'harvest_date': harvest_date,
+            'yield_amount': yield_amount,
+            'yield_quality': yield_quality,
+            'notes': notes,
+        })
+
+    return [
+        {
             'id': field.id,
             'name': field.name,
             'area_ha': field.area_ha,
             'soil_type': field.soil_type,
-            'coordinates': coordinates,
-            'plantings': field_plantings,
+            'coordinates': geometry.load_coordinates(field.coordinates),
+            **field_geometry(field),
+            'plantings': plantings_by_field.get(field.id, []),
         }
+        for field in fields
+    ]
 
-        result.append(field_data)
 
-    return result
+def iter_pages(page, owner_id: int, after_id: int | None, batch_size: int):
+    """
+    Генератор всех полей владельца пачками по batch_size: каждая пачка —
+    отдельный запрос и db_session, в памяти не больше одной пачки.
+    """
+    while True:
+        items = page(owner_id, after_id=after_id, limit=batch_size)
+        yield from items
+        if len(items) < batch_size:
+            return
+        after_id = items[-1]["id"]
 
 
 @db_session
@@ -121,10 +246,7 @@ def get_field(field_id: int, owner_id: int):
     field = Field.get(id=field_id, owner=owner_id)
     if not field:
         return None
-    data = field.to_dict()
-    if "coordinates" in data and isinstance(data["coordinates"], str):
-        data["coordinates"] = json.loads(data["coordinates"])
-    return data
+    return _field_dict(field)
 
 
 @db_session
@@ -141,15 +263,15 @@ def update_field(field_id: int, data: dict, owner_id: int):
         updates["area_ha"] = data["area_ha"]
     if "soil_type" in data:
         updates["soil_type"] = data["soil_type"]
+    if data.get("coordinates"):
+        updates["coordinates"] = data["coordinates"]
+        updates.update(geometry.compute(data["coordinates"]).columns())
 
     if updates:
         updates["updated_at"] = datetime.now(timezone.utc)
         field.set(**updates)
 
-    result = field.to_dict()
-    if "coordinates" in result and isinstance(result["coordinates"], str):
-        result["coordinates"] = json.loads(result["coordinates"])
-    return result
+    return _field_dict(field)
 
 
 @db_session
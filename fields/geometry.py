@@ -0,0 +1,203 @@
+import json
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+# Радиус сферы с той же площадью поверхности, что у эллипсоида WGS84
+AUTHALIC_RADIUS_M = 6371007.181
+M2_PER_HA = 10000
+METERS_PER_DEGREE = math.pi * AUTHALIC_RADIUS_M / 180
+
+# Пирамида детализации: допуски упрощения полигонов (м), для каждого —
+# своя колонка Field
+SIMPLIFY_TOLERANCES_M = (2, 5, 25, 100, 500)
+# Увеличивается при изменении вычисляемых колонок: поля с меньшей версией
+# пересчитывает fields.recompute
+GEOMETRY_VERSION = 3
+
+# Метров на пиксель тайла 256 px на экваторе при zoom 0 (Web Mercator)
+EQUATOR_METERS_PER_PIXEL = 2 * math.pi * 6378137 / 256
+
+
+@dataclass(frozen=True)
+class FieldGeometry:
+    """Вычисленная геометрия поля; точки — [широта, долгота] в градусах"""
+    area_ha: float
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    centroid_lat: float
+    centroid_lon: float
+    simplified: dict
+
+    @property
+    def bbox(self) -> list[float]:
+        return [self.min_lat, self.min_lon, self.max_lat, self.max_lon]
+
+    @property
+    def centroid(self) -> list[float]:
+        return [self.centroid_lat, self.centroid_lon]
+
+    def columns(self) -> dict:
+        """Значения колонок Field"""
+        return {
+            "geo_area_ha": self.area_ha,
+            "min_lat": self.min_lat,
+            "min_lon": self.min_lon,
+            "max_lat": self.max_lat,
+            "max_lon": self.max_lon,
+            "centroid_lat": self.centroid_lat,
+            "centroid_lon": self.centroid_lon,
+            **{simplified_column(tolerance): ring for tolerance, ring in self.simplified.items()},
+            "geometry_version": GEOMETRY_VERSION
+        }
+
+
+def simplified_column(tolerance_m: int) -> str:
+    return f"simplified_{tolerance_m}m"
+
+
+def meters_per_pixel(zoom: float, lat: float) -> float:
+    return EQUATOR_METERS_PER_PIXEL * math.cos(math.radians(lat)) / 2 ** zoom
+
+
+def tolerance_for_zoom(zoom: float, lat: float) -> int | None:
+    """
+    Уровень пирамиды для масштаба карты: наибольший допуск, не превышающий
+    пикселя на широте lat. None — нужен исходный полигон.
+    """
+    pixel = meters_per_pixel(zoom, lat)
+    fitting = [t for t in SIMPLIFY_TOLERANCES_M if t <= pixel]
+    return max(fitting) if fitting else None
+
+
+def nearest_tolerance(tolerance_m: float) -> int:
+    """Наибольший предвычисленный допуск, не превышающий запрошенный (иначе наименьший)"""
+    fitting = [t for t in SIMPLIFY_TOLERANCES_M if t <= tolerance_m]
+    return max(fitting) if fitting else min(SIMPLIFY_TOLERANCES_M)
+
+
+def load_coordinates(coordinates) -> list | None:
+    """Координаты из колонки Field.coordinates (старые записи хранят JSON-строку)"""
+    if isinstance(coordinates, str):
+        try:
+            return json.loads(coordinates)
+        except json.JSONDecodeError:
+            return None
+    return coordinates
+
+
+def ring_array(coordinates) -> np.ndarray:
+    """Незамкнутое кольцо полигона формы (n, 2) с проверкой диапазонов"""
+    ring = np.asarray(coordinates, dtype=float)
+    if ring.ndim != 2 or ring.shape[1] != 2:
+        raise ValueError("Координаты поля должны быть списком точек [широта, долгота]")
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    if len(ring) < 3:
+        raise ValueError("Поле должно содержать минимум 3 точки")
+    if np.any(np.abs(ring[:, 0]) > 90) or np.any(np.abs(ring[:, 1]) > 180):
+        raise ValueError("Широта должна быть в [-90, 90], долгота — в [-180, 180]")
+    return ring
+
+
+def geodesic_area_ha(ring: np.ndarray) -> float:
+    """
+    Площадь полигона на сфере (сферический избыток, формула
+    Chamberlain–Duquette) с авталическим радиусом WGS84. Для полей
+    расхождение с эллипсоидальной площадью — доли процента.
+    """
+    lat = np.radians(ring[:, 0])
+    lon = np.radians(ring[:, 1])
+    dlon = np.roll(lon, -1) - lon
+    # Переход через антимеридиан
+    dlon = (dlon + math.pi) % (2 * math.pi) - math.pi
+    excess = np.sum(dlon * (2 + np.sin(lat) + np.sin(np.roll(lat, -1))))
+    return abs(excess) * AUTHALIC_RADIUS_M ** 2 / 2 / M2_PER_HA
+
+
+def centroid(ring: np.ndarray) -> tuple[float, float]:
+    """
+    Центр масс полигона в локальной равнопромежуточной проекции
+    (долгота масштабируется cos средней широты); для вырожденных
+    полигонов — среднее вершин.
+    """
+    lat0 = ring[:, 0].mean()
+    y = ring[:, 0] - lat0
+    x = (ring[:, 1] - ring[0, 1]) * math.cos(math.radians(lat0))
+    x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+
+    cross = x * y_next - x_next * y
+    area = cross.sum() / 2
+    if abs(area) < 1e-15:
+        return float(ring[:, 0].mean()), float(ring[:, 1].mean())
+
+    cx = ((x + x_next) * cross).sum() / (6 * area)
+    cy = ((y + y_next) * cross).sum() / (6 * area)
+    return float(lat0 + cy), float(ring[0, 1] + cx / math.cos(math.radians(lat0)))
+
+
+def _douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Маска сохраняемых точек ломаной (points в метрах), итеративно"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+
+def simplify(ring: np.ndarray, tolerance_m: float) -> list[list[float]]:
+    """
+    Упрощённый замкнутый полигон (Douglas–Peucker в локальной проекции).
+    Кольцо делится в самой удалённой от первой вершины точке, чтобы обе
+    половины упрощались как обычные ломаные; если остаётся меньше трёх
+    вершин, возвращается исходный полигон.
+    """
+    lat0 = ring[:, 0].mean()
+    points = np.column_stack((
+        ring[:, 1] * METERS_PER_DEGREE * math.cos(math.radians(lat0)),
+        ring[:, 0] * METERS_PER_DEGREE
+    ))
+    split = int(np.argmax(np.hypot(*(points - points[0]).T)))
+
+    closed = np.vstack((points, points[:1]))
+    keep = np.concatenate((
+        _douglas_peucker(closed[:split + 1], tolerance_m)[:-1],
+        _douglas_peucker(closed[split:], tolerance_m)[:-1]
+    ))
+    simplified = ring[keep] if np.count_nonzero(keep) >= 3 else ring
+    result = np.round(simplified, 6).tolist()
+    return result + result[:1]
+
+
+def compute(coordinates) -> FieldGeometry:
+    ring = ring_array(coordinates)
+    centroid_lat, centroid_lon = centroid(ring)
+    return FieldGeometry(
+        area_ha=round(float(geodesic_area_ha(ring)), 4),
+        min_lat=float(ring[:, 0].min()),
+        min_lon=float(ring[:, 1].min()),
+        max_lat=float(ring[:, 0].max()),
+        max_lon=float(ring[:, 1].max()),
+        centroid_lat=centroid_lat,
+        centroid_lon=centroid_lon,
+        simplified={tolerance: simplify(ring, tolerance) for tolerance in SIMPLIFY_TOLERANCES_M}
+    )
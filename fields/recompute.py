@@ -0,0 +1,69 @@
+import logging
+from datetime import datetime, timezone
+
+from pony.orm import db_session, select
+
+from db.models import Field
+from fields import geometry
+
+logger = logging.getLogger(__name__)
+
+
+@db_session
+def _recompute_batch(last_id: int, batch_size: int, only_missing: bool, fix_area: bool, result: dict):
+    query = select(f for f in Field if f.id > last_id)
+    if only_missing:
+        version = geometry.GEOMETRY_VERSION
+        query = query.filter(lambda f: f.geometry_version is None or f.geometry_version < version)
+    fields = query.order_by(Field.id)[:batch_size]
+
+    for field in fields:
+        coordinates = geometry.load_coordinates(field.coordinates)
+        try:
+            shape = geometry.compute(coordinates)
+        except (TypeError, ValueError):
+            result["invalid"] += 1
+            logger.warning("Field %s has invalid coordinates", field.id)
+            continue
+
+        updates = shape.columns()
+        if coordinates is not field.coordinates:
+            updates["coordinates"] = coordinates
+        if fix_area:
+            updates["area_ha"] = shape.area_ha
+        # По updated_at другие процессы замечают изменение (fields.spatial_index)
+        updates["updated_at"] = datetime.now(timezone.utc)
+        field.set(**updates)
+        result["updated"] += 1
+
+    return fields[-1].id if fields else None
+
+
+def recompute_field_geometry(batch_size: int = 500, only_missing: bool = True, fix_area: bool = False) -> dict:
+    """
+    Пересчитать площадь, bbox, центроид и упрощённые полигоны полей без
+    геометрии или с устаревшей geometry_version пачками по
+    batch_size (каждая пачка — отдельная транзакция). Координаты,
+    сохранённые JSON-строкой, переписываются в обычный JSON. fix_area
+    заменяет area_ha вычисленной площадью.
+    """
+    result = {"updated": 0, "invalid": 0}
+    last_id = 0
+    while last_id is not None:
+        last_id = _recompute_batch(last_id, batch_size, only_missing, fix_area, result)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db.migrations import prepare_database
+
+    parser = argparse.ArgumentParser(description="Пересчёт геометрии полей")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="Пересчитать и поля с актуальной геометрией")
+    parser.add_argument("--fix-area", action="store_true", help="Заменить area_ha вычисленной площадью")
+    args = parser.parse_args()
+
+    prepare_database()
+    print(recompute_field_geometry(args.batch_size, not args.all, args.fix_area))
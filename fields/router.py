@@ -1,14 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
+import functools
+import json
+from typing import Literal
 
-from auth.deps import get_current_user
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from auth.deps import get_token_user
 from fields import crud
-from fields.schemas import FieldCreate, FieldUpdate, FieldOut
+from fields.geometry import tolerance_for_zoom
+from fields.schemas import FieldCreate, FieldUpdate, FieldOut, FieldListOut, FieldNearOut, FieldGeometryOut
+from fields.spatial_index import spatial_index
+from fields.tiles import tile_cache, build_tile
 
 router = APIRouter(prefix="/fields", tags=["Fields"])
 
 
 @router.post("", response_model=FieldOut)
-def create_field(field: FieldCreate, current_user=Depends(get_current_user)):
+def create_field(field: FieldCreate, current_user=Depends(get_token_user)):
     try:
         new_field = crud.create_field(
             user_id=current_user.id,
@@ -24,19 +34,165 @@ def create_field(field: FieldCreate, current_user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("", response_model=list[FieldOut])
-def get_fields(current_user=Depends(get_current_user)):
-    fields = crud.get_all_fields(owner_id=current_user.id)
-    return fields
+def _page(page, owner_id: int, after_id: int | None, limit: int, response: Response):
+    # Запрашивается на одну запись больше, чтобы понять, есть ли следующая страница
+    items = page(owner_id, after_id=after_id, limit=limit + 1)
+    if len(items) > limit:
+        items = items[:limit]
+        response.headers["X-Next-Cursor"] = str(items[-1]["id"])
+    return items
+
+
+def _ndjson(items, serialize):
+    return StreamingResponse(
+        (serialize(item) + "\n" for item in items),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.get("", response_model=list[FieldListOut], response_model_exclude_unset=True)
+def get_fields(
+        response: Response,
+        after_id: int | None = Query(None, description="Курсор: id последнего поля предыдущей страницы"),
+        limit: int = Query(settings.FIELDS_PAGE_SIZE, ge=1, le=settings.FIELDS_PAGE_MAX),
+        fields: str | None = Query(None, description="Колонки через запятую: id, name, area_ha, soil_type, geo_area_ha"),
+        geometry: Literal["none", "bbox", "simplified", "full"] = Query("full"),
+        tolerance_m: float = Query(25, gt=0, description="Допуск упрощённого полигона, м"),
+        stream: bool = Query(False, description="Все поля потоком NDJSON, начиная с after_id"),
+        current_user=Depends(get_token_user)
+):
+    """
+    Поля пользователя по страницам; курсор следующей страницы — в заголовке
+    X-Next-Cursor (нет заголовка — страница последняя). В выборку из БД
+    попадают только колонки из fields= и выбранного уровня геометрии.
+    """
+    columns = tuple(c.strip() for c in fields.split(",") if c.strip()) if fields else crud.LIST_COLUMNS
+    page = functools.partial(crud.get_fields_projection, columns=columns, geometry_mode=geometry, tolerance_m=tolerance_m)
+    try:
+        if stream:
+            # Ошибки проекции проверяются до начала потока
+            page(current_user.id, limit=0)
+            items = crud.iter_pages(page, current_user.id, after_id, limit)
+            return _ndjson(items, lambda item: FieldListOut(**item).model_dump_json(exclude_unset=True))
+        return _page(page, current_user.id, after_id, limit, response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
 @router.get("/with/plantings")
-def get_fields_with_plantings(current_user=Depends(get_current_user)):
-    fields = crud.get_all_fields_with_plantings(owner_id=current_user.id)
-    return fields
+def get_fields_with_plantings(
+        response: Response,
+        after_id: int | None = Query(None, description="Курсор: id последнего поля предыдущей страницы"),
+        limit: int = Query(settings.FIELDS_PAGE_SIZE, ge=1, le=settings.FIELDS_PAGE_MAX),
+        stream: bool = Query(False, description="Все поля потоком NDJSON, начиная с after_id"),
+        current_user=Depends(get_token_user)
+):
+    if stream:
+        items = crud.iter_pages(crud.get_all_fields_with_plantings, current_user.id, after_id, limit)
+        return _ndjson(items, lambda item: json.dumps(jsonable_encoder(item), ensure_ascii=False))
+    return _page(crud.get_all_fields_with_plantings, current_user.id, after_id, limit, response)
+
+
+@router.get("/bbox", response_model=list[FieldListOut], response_model_exclude_unset=True)
+def get_fields_in_bbox(
+        min_lat: float = Query(..., ge=-90, le=90),
+        min_lon: float = Query(..., ge=-180, le=180),
+        max_lat: float = Query(..., ge=-90, le=90),
+        max_lon: float = Query(..., ge=-180, le=180),
+        zoom: float | None = Query(None, ge=0, le=24, description="Масштаб карты: полигоны нужного уровня детализации"),
+        current_user=Depends(get_token_user)
+):
+    """Поля, пересекающие окно карты"""
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Некорректное окно: min больше max")
+    field_ids = spatial_index.get(current_user.id).in_bbox(min_lat, min_lon, max_lat, max_lon)
+    if zoom is None:
+        return crud.get_fields_by_ids(field_ids, owner_id=current_user.id)
+
+    # Уровень пирамиды общий для окна — по широте его центра
+    tolerance = tolerance_for_zoom(zoom, (min_lat + max_lat) / 2)
+    if not field_ids:
+        return []
+    return crud.get_fields_projection(
+        current_user.id,
+        geometry_mode=crud.GEOMETRY_FULL if tolerance is None else crud.GEOMETRY_SIMPLIFIED,
+        tolerance_m=tolerance or 0,
+        field_ids=field_ids
+    )
+
+
+@router.get("/at", response_model=list[FieldOut])
+def get_fields_at_point(
+        lat: float = Query(..., ge=-90, le=90),
+        lon: float = Query(..., ge=-180, le=180),
+        current_user=Depends(get_token_user)
+):
+    """Поля, содержащие точку"""
+    field_ids = spatial_index.get(current_user.id).at_point(lat, lon)
+    return crud.get_fields_by_ids(field_ids, owner_id=current_user.id)
+
+
+@router.get("/nearest", response_model=list[FieldNearOut])
+def get_nearest_fields(
+        lat: float = Query(..., ge=-90, le=90),
+        lon: float = Query(..., ge=-180, le=180),
+        limit: int = Query(5, ge=1, le=100),
+        max_distance_m: float | None = Query(None, gt=0),
+        current_user=Depends(get_token_user)
+):
+    """Ближайшие к точке поля с расстоянием до границы в метрах"""
+    nearest = spatial_index.get(current_user.id).nearest(lat, lon, limit, max_distance_m)
+    distances = dict(nearest)
+    fields = crud.get_fields_by_ids([field_id for field_id, _ in nearest], owner_id=current_user.id)
+    return [{**field, "distance_m": distances[field["id"]]} for field in fields]
+
+
+@router.get("/tiles/stats", dependencies=[Depends(get_token_user)])
+def get_tile_cache_stats():
+    return tile_cache.stats()
+
+
+@router.get("/tiles/{z}/{x}/{y}")
+def get_field_tile(
+        z: int = Path(..., ge=0, le=22),
+        x: int = Path(..., ge=0),
+        y: int = Path(..., ge=0),
+        current_user=Depends(get_token_user)
+):
+    """Векторный тайл Mapbox Vector Tile (слой fields: id, name, crop) по схеме XYZ"""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail="Тайл вне сетки масштаба")
+    tile, cached = tile_cache.get_or_build(
+        current_user.id, z, x, y,
+        lambda: build_tile(current_user.id, z, x, y, settings.FIELD_TILE_EXTENT, settings.FIELD_TILE_BUFFER)
+    )
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"X-Tile-Cache": "hit" if cached else "miss"}
+    )
+
+
+@router.get("/index/stats", dependencies=[Depends(get_token_user)])
+def get_spatial_index_stats():
+    return spatial_index.stats()
+
+
+@router.get("/{field_id}/geometry", response_model=FieldGeometryOut)
+def get_field_geometry(
+        field_id: int,
+        zoom: float = Query(..., ge=0, le=24, description="Масштаб карты (тайлы 256 px, Web Mercator)"),
+        current_user=Depends(get_token_user)
+):
+    """Полигон поля, упрощённый до точности пикселя на заданном масштабе"""
+    result = crud.get_field_geometry(field_id, current_user.id, zoom)
+    if not result:
+        raise HTTPException(status_code=404, detail="Поле не найдено")
+    return result
 
 
 @router.get("/{field_id}", response_model=FieldOut)
-def get_field(field_id: int, current_user=Depends(get_current_user)):
+def get_field(field_id: int, current_user=Depends(get_token_user)):
     field = crud.get_field(field_id, owner_id=current_user.id)
     if not field:
         raise HTTPException(status_code=404, detail="Поле не найдено")
@@ -44,7 +200,7 @@ def get_field(field_id: int, current_user=Depends(get_current_user)):
 
 
 @router.put("/{field_id}", response_model=FieldOut)
-def update_field(field_id: int, field_update: FieldUpdate, current_user=Depends(get_current_user)):
+def update_field(field_id: int, field_update: FieldUpdate, current_user=Depends(get_token_user)):
     updated = crud.update_field(field_id, field_update.model_dump(exclude_unset=True), owner_id=current_user.id)
     if not updated:
         raise HTTPException(status_code=404, detail="Поле не найдено")
@@ -52,7 +208,7 @@ def update_field(field_id: int, field_update: FieldUpdate, current_user=Depends(
 
 
 @router.delete("/{field_id}")
-def delete_field(field_id: int, current_user=Depends(get_current_user)):
+def delete_field(field_id: int, current_user=Depends(get_token_user)):
     ok = crud.delete_field(field_id, owner_id=current_user.id)
     if not ok:
         raise HTTPException(status_code=404, detail="Поле не найдено")
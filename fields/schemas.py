@@ -2,34 +2,50 @@ from typing import List, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
+from fields import geometry
+
+
+def _validate_polygon(v: List[List[float]]) -> List[List[float]]:
+    if len(v) < 3:
+        raise ValueError("Поле должно содержать минимум 3 точки")
+
+    for i, point in enumerate(v):
+        if len(point) != 2:
+            raise ValueError(f"Точка {i} должна содержать ровно 2 координаты")
+
+    geometry.ring_array(v)
+
+    if v[0] != v[-1]:
+        v.append(v[0])
+
+    return v
+
 
 class FieldCreate(BaseModel):
     name: str
-    area_ha: float = Field(..., gt=0)
+    # Не указана — берётся площадь, вычисленная по координатам
+    area_ha: Optional[float] = Field(None, gt=0)
+    # Точки полигона [широта, долгота]
     coordinates: List[List[float]] = Field(..., min_items=3)
     soil_type: Optional[str] = None
 
     @field_validator("coordinates")
     @classmethod
     def validate_coordinates(cls, v: List[List[float]]) -> List[List[float]]:
-        if len(v) < 3:
-            raise ValueError("Поле должно содержать минимум 3 точки")
-
-        for i, point in enumerate(v):
-            if len(point) != 2:
-                raise ValueError(f"Точка {i} должна содержать ровно 2 координаты")
-
-        if v[0] != v[-1]:
-            v.append(v[0])
-
-        return v
+        return _validate_polygon(v)
 
 
 class FieldUpdate(BaseModel):
     name: Optional[str] = None
     area_ha: Optional[float] = Field(None, gt=0)
+    coordinates: Optional[List[List[float]]] = None
     soil_type: Optional[str] = None
 
+    @field_validator("coordinates")
+    @classmethod
+    def validate_coordinates(cls, v: Optional[List[List[float]]]) -> Optional[List[List[float]]]:
+        return _validate_polygon(v) if v is not None else v
+
 
 class FieldOut(BaseModel):
     id: int
@@ -37,6 +53,37 @@ class FieldOut(BaseModel):
     area_ha: float
     soil_type: Optional[str]
     coordinates: List[List[float]]
+    geo_area_ha: Optional[float] = None
+    # [min_lat, min_lon, max_lat, max_lon]
+    bbox: Optional[List[float]] = None
+    # [широта, долгота]
+    centroid: Optional[List[float]] = None
 
     class Config:
         from_attributes = True
+
+
+class FieldListOut(BaseModel):
+    """Элемент списка полей: присутствуют только запрошенные колонки и геометрия"""
+    id: int
+    name: Optional[str] = None
+    area_ha: Optional[float] = None
+    soil_type: Optional[str] = None
+    geo_area_ha: Optional[float] = None
+    coordinates: Optional[List[List[float]]] = None
+    bbox: Optional[List[float]] = None
+    centroid: Optional[List[float]] = None
+
+
+class FieldNearOut(FieldOut):
+    # Расстояние до границы поля (0 — точка внутри)
+    distance_m: float
+
+
+class FieldGeometryOut(BaseModel):
+    id: int
+    zoom: float
+    # Допуск уровня пирамиды, м; None — исходный полигон
+    tolerance_m: Optional[float]
+    vertices: int
+    coordinates: Optional[List[List[float]]]
@@ -0,0 +1,309 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from pony.orm import db_session, select, count, max as max_
+
+from app.config import settings
+from db.models import Field
+from db.signals import subscribe
+from fields import geometry
+
+METERS_PER_DEGREE = geometry.METERS_PER_DEGREE
+# Поле, накрывающее больше ячеек, проверяется при каждом запросе, а не через сетку
+MAX_CELLS_PER_FIELD = 1024
+
+
+def _to_plane(lat, lon, lat0: float):
+    """Локальная равнопромежуточная проекция в метрах вокруг широты lat0"""
+    return (
+        np.asarray(lon) * METERS_PER_DEGREE * math.cos(math.radians(lat0)),
+        np.asarray(lat) * METERS_PER_DEGREE
+    )
+
+
+def point_in_ring(ring: np.ndarray, lat: float, lon: float) -> bool:
+    """Чётно-нечётное правило (ray casting); ring — незамкнутое кольцо [широта, долгота]"""
+    y, x = ring[:, 0], ring[:, 1]
+    y_next, x_next = np.roll(y, -1), np.roll(x, -1)
+    crosses = (y > lat) != (y_next > lat)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at = x + (lat - y) * (x_next - x) / (y_next - y)
+    return bool(np.count_nonzero(crosses & (lon < x_at)) % 2)
+
+
+def _segments_cross(ax, ay, bx, by, cx, cy, dx, dy):
+    # Пересечение отрезков AB и CD (векторно по AB) через знаки ориентаций
+    def orient(px, py, qx, qy, rx, ry):
+        return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+
+    return (
+        (orient(ax, ay, bx, by, cx, cy) != orient(ax, ay, bx, by, dx, dy))
+        & (orient(cx, cy, dx, dy, ax, ay) != orient(cx, cy, dx, dy, bx, by))
+    )
+
+
+def ring_intersects_bbox(ring: np.ndarray, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> bool:
+    """Пересекает ли полигон прямоугольник (вершина внутри, угол внутри или пересечение рёбер)"""
+    lat, lon = ring[:, 0], ring[:, 1]
+    if np.any((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)):
+        return True
+    if point_in_ring(ring, min_lat, min_lon):
+        return True
+
+    lat_next, lon_next = np.roll(lat, -1), np.roll(lon, -1)
+    corners = ((min_lat, min_lon), (min_lat, max_lon), (max_lat, max_lon), (max_lat, min_lon))
+    for (c_lat, c_lon), (d_lat, d_lon) in zip(corners, corners[1:] + corners[:1]):
+        if np.any(_segments_cross(lon, lat, lon_next, lat_next, c_lon, c_lat, d_lon, d_lat)):
+            return True
+    return False
+
+
+def distance_to_ring_m(ring: np.ndarray, lat: float, lon: float) -> float:
+    """Расстояние от точки до полигона в метрах (0 — точка внутри)"""
+    if point_in_ring(ring, lat, lon):
+        return 0.0
+
+    x, y = _to_plane(ring[:, 0], ring[:, 1], lat)
+    px, py = _to_plane(lat, lon, lat)
+    x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+    dx, dy = x_next - x, y_next - y
+    length2 = dx * dx + dy * dy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.clip(np.where(length2 > 0, ((px - x) * dx + (py - y) * dy) / length2, 0), 0, 1)
+    return float(np.sqrt(((x + t * dx - px) ** 2 + (y + t * dy - py) ** 2).min()))
+
+
+@db_session
+def _owner_stamp(owner_id: int) -> tuple:
+    """Число полей владельца и их последний updated_at — дешёвая проверка актуальности сетки"""
+    return tuple(select((count(f), max_(f.updated_at)) for f in Field if f.owner.id == owner_id).first())
+
+
+@dataclass(frozen=True)
+class OwnerGrid:
+    """
+    Равномерная сетка по bbox полей одного владельца.
+
+    bboxes — массив (n, 4) [min_lat, min_lon, max_lat, max_lon], rings —
+    полигоны в том же порядке, cells — ячейка → индексы полей. stamp —
+    (число полей, последний updated_at) владельца на момент построения.
+    """
+    version: int
+    stamp: tuple
+    cell_deg: float
+    field_ids: np.ndarray
+    bboxes: np.ndarray
+    rings: tuple
+    cells: dict
+    large: np.ndarray
+
+    def _cell_range(self, min_lat, min_lon, max_lat, max_lon):
+        return (
+            range(math.floor(min_lat / self.cell_deg), math.floor(max_lat / self.cell_deg) + 1),
+            range(math.floor(min_lon / self.cell_deg), math.floor(max_lon / self.cell_deg) + 1)
+        )
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon) -> np.ndarray:
+        lat_cells, lon_cells = self._cell_range(min_lat, min_lon, max_lat, max_lon)
+        if len(lat_cells) * len(lon_cells) > len(self.field_ids):
+            # Окно больше числа полей — дешевле проверить все bbox векторно
+            indices = np.arange(len(self.field_ids))
+        else:
+            found = [self.large]
+            for i in lat_cells:
+                for j in lon_cells:
+                    cell = self.cells.get((i, j))
+                    if cell is not None:
+                        found.append(cell)
+            indices = np.unique(np.concatenate(found))
+
+        boxes = self.bboxes[indices]
+        hits = (
+            (boxes[:, 0] <= max_lat) & (boxes[:, 2] >= min_lat)
+            & (boxes[:, 1] <= max_lon) & (boxes[:, 3] >= min_lon)
+        )
+        return indices[hits]
+
+    def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> list[int]:
+        """Поля, полигоны которых пересекают окно"""
+        result = []
+        for index in self._candidates(min_lat, min_lon, max_lat, max_lon):
+            box = self.bboxes[index]
+            inside = box[0] >= min_lat and box[2] <= max_lat and box[1] >= min_lon and box[3] <= max_lon
+            if inside or ring_intersects_bbox(self.rings[index], min_lat, min_lon, max_lat, max_lon):
+                result.append(int(self.field_ids[index]))
+        return result
+
+    def at_point(self, lat: float, lon: float) -> list[int]:
+        """Поля, содержащие точку"""
+        return [
+            int(self.field_ids[index])
+            for index in self._candidates(lat, lon, lat, lon)
+            if point_in_ring(self.rings[index], lat, lon)
+        ]
+
+    def nearest(self, lat: float, lon: float, limit: int, max_distance_m: float | None = None) -> list[tuple]:
+        """
+        Ближайшие поля: [(field_id, расстояние в метрах)].
+
+        Нижняя граница расстояния — до bbox поля; точные расстояния до
+        полигонов считаются в порядке этой границы, пока она не превысит
+        limit-е найденное.
+        """
+        if not len(self.field_ids):
+            return []
+
+        lat_gap = np.maximum(np.maximum(self.bboxes[:, 0] - lat, lat - self.bboxes[:, 2]), 0)
+        lon_gap = np.maximum(np.maximum(self.bboxes[:, 1] - lon, lon - self.bboxes[:, 3]), 0)
+        lower_bound = np.hypot(lat_gap, lon_gap * math.cos(math.radians(lat))) * METERS_PER_DEGREE
+        # Запас на кривизну: граница не должна превышать точное расстояние
+        lower_bound *= 0.99
+
+        best = []
+        for index in np.argsort(lower_bound, kind="stable"):
+            bound = lower_bound[index]
+            if max_distance_m is not None and bound > max_distance_m:
+                break
+            if len(best) >= limit and bound > best[-1][1]:
+                break
+            distance = distance_to_ring_m(self.rings[index], lat, lon)
+            if max_distance_m is not None and distance > max_distance_m:
+                continue
+            best.append((int(self.field_ids[index]), round(distance, 2)))
+            best.sort(key=lambda item: item[1])
+            del best[limit:]
+        return best
+
+
+class SpatialIndex:
+    """
+    Процессный пространственный индекс полей по владельцам.
+
+    Сетка владельца строится лениво из колонок геометрии Field и
+    перестраивается после зафиксированного изменения его полей в этом
+    процессе (хуки db.models сообщают о них через db.signals). Изменения
+    из других воркеров и процессов обнаруживаются сверкой stamp сетки с БД
+    не чаще раза в check_seconds. В памяти держатся сетки max_owners
+    последних владельцев.
+    """
+
+    def __init__(self, cell_deg: float, max_owners: int | None = None, check_seconds: float | None = None):
+        self.cell_deg = cell_deg
+        self.max_owners = max_owners or None
+        self.check_seconds = check_seconds or None
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._grids = OrderedDict()
+        self._checked_at = {}
+        self.builds = 0
+        self.stale_checks = 0
+
+    def invalidate_owner(self, owner_id: int):
+        with self._lock:
+            self._versions[owner_id] = self._versions.get(owner_id, 0) + 1
+            self._grids.pop(owner_id, None)
+
+    def _check_due(self, owner_id: int) -> bool:
+        if not self.check_seconds:
+            return False
+        return time.monotonic() - self._checked_at.get(owner_id, 0.0) >= self.check_seconds
+
+    def get(self, owner_id: int) -> OwnerGrid:
+        with self._lock:
+            version = self._versions.get(owner_id, 0)
+            grid = self._grids.get(owner_id)
+            if grid is not None and grid.version != version:
+                grid = None
+            check = grid is not None and self._check_due(owner_id)
+            if grid is not None:
+                self._grids.move_to_end(owner_id)
+                if not check:
+                    return grid
+                # Параллельные запросы не сверяют ту же сетку повторно
+                self._checked_at[owner_id] = time.monotonic()
+
+        if check:
+            if _owner_stamp(owner_id) == grid.stamp:
+                return grid
+            with self._lock:
+                self.stale_checks += 1
+                self._versions[owner_id] = self._versions.get(owner_id, 0) + 1
+                self._grids.pop(owner_id, None)
+                version = self._versions[owner_id]
+
+        grid = self._build(owner_id, version)
+        with self._lock:
+            # Сетка, построенная до параллельной инвалидации, не сохраняется
+            if self._versions.get(owner_id, 0) == version:
+                self._grids[owner_id] = grid
+                self._grids.move_to_end(owner_id)
+                self._checked_at[owner_id] = time.monotonic()
+                while self.max_owners and len(self._grids) > self.max_owners:
+                    evicted, _ = self._grids.popitem(last=False)
+                    self._checked_at.pop(evicted, None)
+            self.builds += 1
+        return grid
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "owners": len(self._grids),
+                "fields": sum(len(grid.field_ids) for grid in self._grids.values()),
+                "builds": self.builds,
+                "stale_checks": self.stale_checks,
+                "cell_deg": self.cell_deg
+            }
+
+    @db_session
+    def _build(self, owner_id: int, version: int) -> OwnerGrid:
+        # stamp читается до полей: изменение между запросами даст расхождение при следующей сверке
+        stamp = _owner_stamp(owner_id)
+        rows = select(
+            (f.id, f.min_lat, f.min_lon, f.max_lat, f.max_lon, f.coordinates)
+            for f in Field
+            if f.owner.id == owner_id and f.min_lat is not None
+        ).order_by(1)[:]
+
+        field_ids, bboxes, rings = [], [], []
+        for field_id, min_lat, min_lon, max_lat, max_lon, coordinates in rows:
+            try:
+                ring = geometry.ring_array(geometry.load_coordinates(coordinates))
+            except (TypeError, ValueError):
+                continue
+            field_ids.append(field_id)
+            bboxes.append((min_lat, min_lon, max_lat, max_lon))
+            rings.append(ring)
+
+        cells = {}
+        large = []
+        for index, (min_lat, min_lon, max_lat, max_lon) in enumerate(bboxes):
+            lat_cells = range(math.floor(min_lat / self.cell_deg), math.floor(max_lat / self.cell_deg) + 1)
+            lon_cells = range(math.floor(min_lon / self.cell_deg), math.floor(max_lon / self.cell_deg) + 1)
+            if len(lat_cells) * len(lon_cells) > MAX_CELLS_PER_FIELD:
+                large.append(index)
+                continue
+            for i in lat_cells:
+                for j in lon_cells:
+                    cells.setdefault((i, j), []).append(index)
+
+        return OwnerGrid(
+            version=version,
+            stamp=stamp,
+            cell_deg=self.cell_deg,
+            field_ids=np.asarray(field_ids, dtype=np.int64),
+            bboxes=np.asarray(bboxes, dtype=float).reshape(-1, 4),
+            rings=tuple(rings),
+            cells={key: np.asarray(value, dtype=np.int64) for key, value in cells.items()},
+            large=np.asarray(large, dtype=np.int64)
+        )
+
+
+spatial_index = SpatialIndex(
+    settings.FIELD_INDEX_CELL_DEG, settings.FIELD_INDEX_MAX_OWNERS, settings.FIELD_INDEX_CHECK_SECONDS
+)
+
+subscribe("Field", spatial_index.invalidate_owner, key=lambda field: field.owner.id)
@@ -0,0 +1,336 @@
+import contextlib
+import math
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pony.orm import db_session, select
+
+from app.config import settings
+from db.models import Planting
+from db.signals import subscribe
+from fields import crud
+from fields.geometry import tolerance_for_zoom
+from fields.spatial_index import spatial_index
+
+MVT_VERSION = 2
+LAYER_NAME = "fields"
+GEOM_POLYGON = 3
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_CLOSE_PATH = 7
+
+
+# --- Кодирование Mapbox Vector Tile 2.1 (protobuf) ---
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _key(field_number: int, wire_type: int) -> bytes:
+    return _varint((field_number << 3) | wire_type)
+
+
+def _bytes_field(field_number: int, payload: bytes) -> bytes:
+    return _key(field_number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field_number: int, values) -> bytes:
+    return _bytes_field(field_number, b"".join(_varint(v) for v in values))
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _command(command: int, count: int) -> int:
+    return (command & 0x7) | (count << 3)
+
+
+def encode_polygon(rings) -> list[int]:
+    """Команды геометрии полигона из колец целых координат тайла (без замыкающей точки)"""
+    commands = []
+    cursor_x = cursor_y = 0
+    for ring in rings:
+        commands.append(_command(CMD_MOVE_TO, 1))
+        for index, (x, y) in enumerate(ring):
+            if index == 1:
+                commands.append(_command(CMD_LINE_TO, len(ring) - 1))
+            commands += (_zigzag(x - cursor_x), _zigzag(y - cursor_y))
+            cursor_x, cursor_y = x, y
+        commands.append(_command(CMD_CLOSE_PATH, 1))
+    return commands
+
+
+def encode_tile(features, extent: int) -> bytes:
+    """
+    Тайл с одним слоем fields. features — [(id, {атрибут: строка}, кольца)];
+    ключи и значения атрибутов общие для слоя.
+    """
+    keys, values = {}, {}
+    encoded_features = []
+    for feature_id, attributes, rings in features:
+        tags = []
+        for key, value in attributes.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(str(value), len(values)))
+
+        feature = _key(1, 0) + _varint(feature_id)
+        if tags:
+            feature += _packed(2, tags)
+        feature += _key(3, 0) + _varint(GEOM_POLYGON)
+        feature += _packed(4, encode_polygon(rings))
+        encoded_features.append(_bytes_field(2, feature))
+
+    if not encoded_features:
+        return b""
+
+    layer = _key(15, 0) + _varint(MVT_VERSION) + _bytes_field(1, LAYER_NAME.encode())
+    layer += b"".join(encoded_features)
+    layer += b"".join(_bytes_field(3, key.encode()) for key in keys)
+    layer += b"".join(_bytes_field(4, _bytes_field(1, value.encode())) for value in values)
+    layer += _key(5, 0) + _varint(extent)
+    return _bytes_field(3, layer)
+
+
+# --- Геометрия тайлов (Web Mercator, схема XYZ) ---
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Границы тайла [min_lat, min_lon, max_lat, max_lon]"""
+    n = 2 ** z
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
+
+
+def project(coordinates: np.ndarray, z: int, x: int, y: int, extent: int) -> np.ndarray:
+    """[широта, долгота] → координаты тайла (y вниз), ещё не округлённые"""
+    n = 2 ** z
+    lat = np.radians(np.clip(coordinates[:, 0], -85.0511, 85.0511))
+    px = ((coordinates[:, 1] + 180) / 360 * n - x) * extent
+    py = ((1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * n - y) * extent
+    return np.column_stack((px, py))
+
+
+def clip_ring(points: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Отсечение кольца квадратом [low, high]² (Сазерленд — Ходжмен)"""
+    for axis, bound, keep_less in ((0, low, False), (0, high, True), (1, low, False), (1, high, True)):
+        if not len(points):
+            return points
+        inside = points[:, axis] <= bound if keep_less else points[:, axis] >= bound
+        if inside.all():
+            continue
+        previous = np.roll(points, 1, axis=0)
+        previous_inside = np.roll(inside, 1)
+        result = []
+        for point, prev, point_in, prev_in in zip(points, previous, inside, previous_inside):
+            if point_in != prev_in:
+                t = (bound - prev[axis]) / (point[axis] - prev[axis])
+                result.append(prev + t * (point - prev))
+            if point_in:
+                result.append(point)
+        points = np.asarray(result).reshape(-1, 2)
+    return points
+
+
+def tile_ring(coordinates, z: int, x: int, y: int, extent: int, buffer: int) -> list | None:
+    """
+    Кольцо поля в целых координатах тайла: отсечено с буфером, без
+    повторяющихся точек, по часовой стрелке (внешнее кольцо MVT при y вниз).
+    None — поле не попало в тайл или выродилось.
+    """
+    ring = np.asarray(coordinates, dtype=float)
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    points = clip_ring(project(ring, z, x, y, extent), -buffer, extent + buffer)
+    if len(points) < 3:
+        return None
+
+    points = np.rint(points).astype(np.int64)
+    distinct = np.any(points != np.roll(points, 1, axis=0), axis=1)
+    points = points[distinct]
+    if len(points) < 3:
+        return None
+
+    doubled_area = np.sum(points[:, 0] * np.roll(points[:, 1], -1) - np.roll(points[:, 0], -1) * points[:, 1])
+    if doubled_area == 0:
+        return None
+    if doubled_area < 0:
+        points = points[::-1]
+    return points.tolist()
+
+
+@db_session
+def _latest_crops(field_ids: list[int]) -> dict:
+    latest = {}
+    for field_id, crop_name, planting_date in select(
+            (p.field.id, p.crop.name, p.planting_date) for p in Planting if p.field.id in field_ids
+    ):
+        if field_id not in latest or planting_date > latest[field_id][1]:
+            latest[field_id] = (crop_name, planting_date)
+    return {field_id: crop_name for field_id, (crop_name, _) in latest.items()}
+
+
+def build_tile(owner_id: int, z: int, x: int, y: int, extent: int, buffer: int) -> bytes:
+    """
+    Векторный тайл с полями владельца: поля выбираются пространственным
+    индексом, полигоны берутся из пирамиды детализации для масштаба z.
+    """
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    pad_lon = (max_lon - min_lon) * buffer / extent
+    pad_lat = (max_lat - min_lat) * buffer / extent
+    field_ids = spatial_index.get(owner_id).in_bbox(
+        min_lat - pad_lat, min_lon - pad_lon, max_lat + pad_lat, max_lon + pad_lon
+    )
+    if not field_ids:
+        return b""
+
+    tolerance = tolerance_for_zoom(z, (min_lat + max_lat) / 2)
+    fields = crud.get_fields_projection(
+        owner_id,
+        columns=("id", "name"),
+        geometry_mode=crud.GEOMETRY_FULL if tolerance is None else crud.GEOMETRY_SIMPLIFIED,
+        tolerance_m=tolerance or 0,
+        field_ids=field_ids
+    )
+    if tolerance is not None:
+        # Поля без пирамиды (геометрия ещё не пересчитана) — исходным полигоном
+        missing = [field["id"] for field in fields if not field["coordinates"]]
+        if missing:
+            full = crud.get_fields_projection(
+                owner_id, columns=("id", "name"), geometry_mode=crud.GEOMETRY_FULL, field_ids=missing
+            )
+            fields = [field for field in fields if field["coordinates"]] + full
+    crops = _latest_crops(field_ids)
+
+    features = []
+    for field in fields:
+        if not field["coordinates"]:
+            continue
+        ring = tile_ring(field["coordinates"], z, x, y, extent, buffer)
+        if ring is not None:
+            features.append((field["id"], {"name": field["name"], "crop": crops.get(field["id"])}, [ring]))
+    return encode_tile(features, extent)
+
+
+# --- Дисковый кэш ---
+
+class TileCache:
+    """
+    Кэш тайлов на диске: {root}/{owner}/{epoch}/{z}/{x}/{y}.mvt.
+
+    Эпоха владельца хранится в файле {root}/{owner}/EPOCH. Зафиксированное
+    изменение его полей или посадок записывает новую эпоху, поэтому кэш
+    согласован между воркерами без общей памяти: тайл, достроенный в
+    устаревшую эпоху, больше не будет прочитан. Каталоги старых эпох
+    удаляются в фоновом потоке.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._cleanup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tile-cache-cleanup")
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.write_failures = 0
+
+    def _epoch(self, owner_id: int) -> str:
+        try:
+            with open(os.path.join(self.root, str(owner_id), "EPOCH")) as file:
+                return file.read().strip() or "0"
+        except FileNotFoundError:
+            return "0"
+
+    def _path(self, owner_id: int, epoch: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.root, str(owner_id), epoch, str(z), str(x), f"{y}.mvt")
+
+    def get_or_build(self, owner_id: int, z: int, x: int, y: int, build) -> tuple[bytes, bool]:
+        """Тайл и признак попадания в кэш"""
+        epoch = self._epoch(owner_id)
+        path = self._path(owner_id, epoch, z, x, y)
+        try:
+            with open(path, "rb") as file:
+                self.hits += 1
+                return file.read(), True
+        except FileNotFoundError:
+            pass
+
+        self.misses += 1
+        tile = build()
+        try:
+            self._write(path, tile)
+        except OSError:
+            # Каталог эпохи удалён параллельной очисткой — тайл отдаётся без кэширования
+            self.write_failures += 1
+        return tile, False
+
+    @staticmethod
+    def _write(path: str, tile: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл: параллельный читатель не увидит половину тайла
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(tile)
+            os.replace(tmp_path, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def invalidate_owner(self, owner_id: int):
+        owner_dir = os.path.join(self.root, str(owner_id))
+        # Эпоха пишется, даже если тайлов ещё нет: сборка первого тайла могла
+        # начаться до коммита и прочитать эпоху по умолчанию
+        os.makedirs(owner_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=owner_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            file.write(uuid.uuid4().hex)
+        os.replace(tmp_path, os.path.join(owner_dir, "EPOCH"))
+        self.invalidations += 1
+        self._cleanup.submit(self._remove_stale_epochs, owner_id)
+
+    def _remove_stale_epochs(self, owner_id: int):
+        owner_dir = os.path.join(self.root, str(owner_id))
+        # Эпоха читается заново: другой воркер мог успеть записать более новую
+        epoch = self._epoch(owner_id)
+        try:
+            names = os.listdir(owner_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(owner_dir, name)
+            if name != epoch and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "write_failures": self.write_failures
+        }
+
+    def shutdown(self):
+        self._cleanup.shutdown(wait=False, cancel_futures=True)
+
+
+tile_cache = TileCache(settings.FIELD_TILE_CACHE_DIR)
+
+subscribe("Field", tile_cache.invalidate_owner, key=lambda field: field.owner.id)
+subscribe("Planting", tile_cache.invalidate_owner, key=lambda planting: planting.field.owner.id)
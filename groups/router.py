@@ -1,12 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from groups import crud
 from groups.schemas import GroupCreate, GroupUpdate, GroupOut
-from auth.deps import get_current_user  # функция, которая достаёт пользователя из токена
+from auth.deps import get_token_user  # функция, которая достаёт пользователя из токена
 
 router = APIRouter(prefix="/groups", tags=["Groups"])
 
 @router.post("/", response_model=GroupOut)
-def create_group(group: GroupCreate, current_user=Depends(get_current_user)):
+def create_group(group: GroupCreate, current_user=Depends(get_token_user)):
     """Создать группу, доступную во всех сезонах пользователя"""
     try:
         g = crud.create_group(
@@ -26,7 +26,7 @@ def create_group(group: GroupCreate, current_user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/", response_model=list[GroupOut])
-def list_groups(current_user=Depends(get_current_user)):
+def list_groups(current_user=Depends(get_token_user)):
     groups = crud.get_all_groups_for_user(current_user.id)
     return [
         {
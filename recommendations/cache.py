@@ -0,0 +1,188 @@
+import json
+import threading
+from collections import OrderedDict
+
+from app.config import settings
+from db.signals import subscribe
+
+
+class InMemoryCacheBackend:
+    """
+    LRU-хранилище в памяти процесса.
+
+    Поколения полей растут при каждой инвалидации и входят в ключ записи,
+    поэтому результат, посчитанный до изменения данных, уже не будет прочитан.
+    """
+
+    def __init__(self, max_entries: int | None = None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_field = {}
+        self._generations = {}
+        self._global_generation = 0
+        self.max_entries = max_entries or None
+        self.evictions = 0
+
+    def generation(self, field_id: int):
+        with self._lock:
+            return self._global_generation, self._generations.get(field_id, 0)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        field_id = key[0]
+        with self._lock:
+            if key[1] != (self._global_generation, self._generations.get(field_id, 0)):
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._keys_by_field.setdefault(field_id, set()).add(key)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget(evicted)
+                self.evictions += 1
+
+    def invalidate_field(self, field_id: int):
+        with self._lock:
+            self._generations[field_id] = self._generations.get(field_id, 0) + 1
+            for key in self._keys_by_field.pop(field_id, ()):
+                self._entries.pop(key, None)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._global_generation += 1
+            self._entries.clear()
+            self._keys_by_field.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def _forget(self, key):
+        keys = self._keys_by_field.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_field[key[0]]
+
+
+class RedisCacheBackend:
+    """
+    Общее для всех воркеров uvicorn хранилище в Redis (нужен пакет redis).
+
+    Поколения хранятся счётчиками в Redis, записи — с TTL; размер кэша
+    ограничивается политикой maxmemory самого Redis.
+    """
+
+    PREFIX = "recommendations"
+
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Для RedisCacheBackend требуется пакет redis") from e
+
+        self._redis = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+
+    def generation(self, field_id: int):
+        global_generation, field_generation = self._redis.mget(
+            f"{self.PREFIX}:generation", f"{self.PREFIX}:generation:{field_id}"
+        )
+        return int(global_generation or 0), int(field_generation or 0)
+
+    def get(self, key):
+        value = self._redis.get(self._entry_key(key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self._redis.set(self._entry_key(key), json.dumps(value, ensure_ascii=False), ex=self.ttl_seconds)
+
+    def invalidate_field(self, field_id: int):
+        self._redis.incr(f"{self.PREFIX}:generation:{field_id}")
+
+    def invalidate_all(self):
+        self._redis.incr(f"{self.PREFIX}:generation")
+
+    def size(self) -> int:
+        return sum(1 for _ in self._redis.scan_iter(f"{self.PREFIX}:entry:*"))
+
+    def _entry_key(self, key) -> str:
+        field_id, (global_generation, field_generation), target_year, limit = key
+        return (
+            f"{self.PREFIX}:entry:{field_id}:{global_generation}:{field_generation}"
+            f":{target_year}:{limit}"
+        )
+
+
+class RecommendationCache:
+    """
+    Кэш рекомендаций по ключу (field_id, target_year, limit).
+
+    Записи поля сбрасываются при изменении его посадок или анализов почвы,
+    весь кэш — при изменении справочника культур и правил севооборота.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, field_id: int, target_year: int, limit: int, compute):
+        key = (field_id, self.backend.generation(field_id), target_year, limit)
+
+        value = self.backend.get(key)
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is not None:
+            return value
+
+        value = compute()
+        self.backend.set(key, value)
+        return value
+
+    def invalidate_field(self, field_id: int):
+        with self._lock:
+            self.invalidations += 1
+        self.backend.invalidate_field(field_id)
+
+    def invalidate_all(self, *args):
+        with self._lock:
+            self.invalidations += 1
+        self.backend.invalidate_all()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+            "size": self.backend.size()
+        }
+
+
+def create_backend():
+    url = settings.RECOMMENDATION_CACHE_URL
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisCacheBackend(url, settings.RECOMMENDATION_CACHE_TTL_SECONDS)
+    return InMemoryCacheBackend(settings.RECOMMENDATION_CACHE_MAX_ENTRIES)
+
+
+recommendation_cache = RecommendationCache(create_backend())
+
+for _entity_name in ("Planting", "FieldSoilProfile"):
+    subscribe(_entity_name, recommendation_cache.invalidate_field, key=lambda entity: entity.field.id)
+
+for _entity_name in ("Crop", "PlantFamily", "CropRotationRule"):
+    subscribe(_entity_name, recommendation_cache.invalidate_all)
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from pony.orm import db_session, select, count
+
+from app.config import settings
+from db.models import RotationRecommendation
+
+
+@db_session
+def compact_recommendations(
+        retention_days: int = settings.RECOMMENDATION_RETENTION_DAYS,
+        keep_latest: int = settings.RECOMMENDATION_KEEP_LATEST
+):
+    """
+    Очистка таблицы RotationRecommendation.
+
+    Применённые рекомендации не трогаются. Из неприменённых удаляются записи
+    старше retention_days, а для каждой пары (поле, целевой год) остаются
+    только keep_latest самых свежих.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    expired = select(
+        r for r in RotationRecommendation
+        if not r.is_applied and r.generated_at < cutoff
+    ).delete(bulk=True)
+
+    overflowing = select(
+        (r.field, r.target_year)
+        for r in RotationRecommendation
+        if not r.is_applied and count(r) > keep_latest
+    )[:]
+
+    trimmed = 0
+    for field, target_year in overflowing:
+        stale_ids = select(
+            r.id for r in RotationRecommendation
+            if r.field == field and r.target_year == target_year and not r.is_applied
+        ).order_by(-1)[keep_latest:]
+
+        trimmed += select(
+            r for r in RotationRecommendation if r.id in stale_ids
+        ).delete(bulk=True)
+
+    return {"expired": expired, "trimmed": trimmed}
+
+
+if __name__ == "__main__":
+    from db.migrations import prepare_database
+
+    prepare_database()
+    print(compact_recommendations())
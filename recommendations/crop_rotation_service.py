@@ -1,60 +1,256 @@
 import json
 
-from pony.orm import db_session, select, desc, max
+import numpy as np
+from pony.orm import db_session, select, desc
 
-from db.models import CropRotationRule, Planting, FieldSoilProfile, Crop, Field
+from calculator.calculator import EconomicCalculator
+from db.models import Planting, FieldSoilProfile, Field, FieldGroup, RotationRecommendation
+from recommendations import vector_scoring, rotation_planner, group_balancer
+from recommendations.cache import recommendation_cache
+from recommendations.rule_index import rule_index
+from recommendations.vector_scoring import HISTORY_DEPTH
+
+RANK_AGRO = "agro"
+RANK_PROFIT = "profit"
 
 
 class CropRotationService:
     @db_session
-    def get_rotation_recommendations(self, field_id: int, target_year: int, limit: int = 5):
+    def get_rotation_recommendations(
+            self,
+            field_id: int,
+            target_year: int,
+            limit: int = 5,
+            persist: bool = False,
+            rank_by: str = RANK_AGRO
+    ):
         field = Field[field_id]
 
-        planting_history = select(
-            p for p in Planting
-            if p.field == field
-        ).order_by(desc(Planting.planting_date))[:10]
+        planting_history, soil_profile = self._load_field_data(field)
 
-        soil_profile = select(
-            fsp for fsp in FieldSoilProfile
-            if fsp.field == field
-        ).order_by(desc(FieldSoilProfile.sample_date)).first()
+        recommendations = self._rank_crops(
+            self._matrix_for(planting_history), planting_history, soil_profile, target_year, limit,
+            self._profits(rank_by)
+        )
 
-        all_crops = select(c for c in Crop)[:]
+        if persist:
+            self._persist(field, target_year, recommendations)
 
-        recommendations = []
+        return recommendations
+
+    def get_cached_recommendations(self, field_id: int, target_year: int, limit: int = 5):
+        """
+        Рекомендации только для чтения: без записи в RotationRecommendation,
+        повторный запрос при неизменных данных поля обслуживается из кэша.
+        """
+        return recommendation_cache.get_or_compute(
+            field_id,
+            target_year,
+            limit,
+            lambda: self.get_rotation_recommendations(field_id, target_year, limit)
+        )
 
-        for crop in all_crops:
-            score, reasons = self._calculate_crop_score(
-                crop, planting_history, soil_profile, target_year
+    @db_session
+    def get_rotation_plan(self, field_id: int, start_year: int, years: int, plans: int = 3):
+        """Многолетние планы севооборота для поля (см. rotation_planner.plan_rotation)"""
+        field = Field[field_id]
+
+        planting_history, soil_profile = self._load_field_data(field)
+
+        matrix = self._matrix_for(planting_history)
+        found, truncated = rotation_planner.plan_rotation(
+            vector_scoring.crop_arrays(matrix),
+            vector_scoring.field_state(matrix, planting_history, soil_profile),
+            start_year,
+            years,
+            plans
+        )
+
+        result = []
+        for plan in found:
+            steps = []
+            for step in plan.steps:
+                crop = matrix.crops_list[step.crop_index]
+                steps.append({
+                    'year': step.year,
+                    'crop_id': crop.id,
+                    'crop_name': crop.name,
+                    'family_name': crop.family_name,
+                    'score': step.score,
+                    'compatibility': self._compatibility_label(step.score),
+                    'reasons': vector_scoring.reason_texts(matrix, step.state, step.result, step.crop_index)
+                })
+
+            result.append({
+                'total_score': plan.total_score,
+                'average_score': round(plan.total_score / len(plan.steps), 1) if plan.steps else 0,
+                'steps': steps
+            })
+
+        return {
+            'plans': result,
+            'truncated': truncated
+        }
+
+    @db_session
+    def get_batch_recommendations(self, fields, target_year: int, limit: int = 5, rank_by: str = RANK_AGRO):
+        """
+        Рекомендации сразу для набора полей.
+
+        Посадки, последние анализы почвы, культуры и правила севооборота
+        загружаются фиксированным числом запросов независимо от количества
+        полей. Для каждого поля возвращается тот же ранжированный список,
+        что и у get_rotation_recommendations, но без сохранения записей
+        RotationRecommendation.
+        """
+        fields = list(fields)
+        field_ids = [f.id for f in fields]
+        if not field_ids:
+            return []
+
+        history_by_field, soil_by_field = self._load_batch_data(field_ids)
+        matrix = self._matrix_for(*history_by_field.values())
+        profits = self._profits(rank_by)
+
+        result = []
+        for field in fields:
+            recommendations = self._rank_crops(
+                matrix,
+                history_by_field[field.id],
+                soil_by_field.get(field.id),
+                target_year,
+                limit,
+                profits
             )
+            result.append({
+                'field_id': field.id,
+                'field_name': field.name,
+                'recommendations': recommendations
+            })
+
+        return result
+
+    @db_session
+    def generate_for_fields(self, field_ids, target_year: int, limit: int = 5):
+        """
+        Пересоздать сохранённые рекомендации на target_year для набора полей.
+
+        Данные загружаются пакетно, как в get_batch_recommendations; старые
+        записи полей на этот год удаляются одним запросом.
+        """
+        fields = select(f for f in Field if f.id in field_ids)[:]
+        if not fields:
+            return 0
+
+        select(
+            r for r in RotationRecommendation
+            if r.field.id in field_ids and r.target_year == target_year
+        ).delete(bulk=True)
+
+        generated = 0
+        for field, entry in zip(fields, self.get_batch_recommendations(fields, target_year, limit)):
+            self._persist(field, target_year, entry['recommendations'])
+            generated += len(entry['recommendations'])
 
-            if score >= 90:
-                compatibility = "excellent"
-            elif score >= 70:
-                compatibility = "good"
-            elif score >= 50:
-                compatibility = "fair"
-            else:
-                compatibility = "poor"
+        return generated
+
+    @db_session
+    def get_user_recommendations(self, owner_id: int, target_year: int, limit: int = 5, rank_by: str = RANK_AGRO):
+        fields = select(f for f in Field if f.owner.id == owner_id).order_by(Field.id)[:]
+        return self.get_batch_recommendations(fields, target_year, limit, rank_by)
+
+    @db_session
+    def get_group_recommendations(self, group_id: int, target_year: int, limit: int = 5, rank_by: str = RANK_AGRO):
+        group = FieldGroup[group_id]
+        fields = group.fields.select().order_by(Field.id)[:]
+        return self.get_batch_recommendations(fields, target_year, limit, rank_by)
+
+    @db_session
+    def get_group_balance(self, group_id: int, target_year: int, share_limits: dict):
+        """
+        Распределение культур по полям группы севооборота на сезон.
+
+        В расчёт берутся все поля групп владельца с тем же rotation_group
+        (или только поля самой группы, если rotation_group не задан).
+        share_limits: {crop_id: (min_share, max_share)} — доли площади.
+        """
+        group = FieldGroup[group_id]
+
+        if group.rotation_group:
+            fields = select(
+                f for f in Field for g in f.groups
+                if g.owner == group.owner and g.rotation_group == group.rotation_group
+            ).order_by(Field.id)[:]
+        else:
+            fields = group.fields.select().order_by(Field.id)[:]
 
-            recommendations.append({
+        history_by_field, soil_by_field = self._load_batch_data([f.id for f in fields]) if fields else ({}, {})
+        matrix = self._matrix_for(*history_by_field.values())
+        arrays = vector_scoring.crop_arrays(matrix)
+        crops_count = len(matrix.crops_list)
+
+        min_share = np.zeros(crops_count)
+        max_share = np.ones(crops_count)
+        for crop_id, (crop_min, crop_max) in share_limits.items():
+            crop = matrix.crops.get(crop_id)
+            if crop is None:
+                raise ValueError(f"Культура {crop_id} не найдена")
+            min_share[crop.index] = crop_min
+            max_share[crop.index] = crop_max
+
+        if not fields:
+            return {'fields': [], 'crops': [], 'total_score': 0, 'feasible': True}
+
+        scores = np.empty((len(fields), crops_count), dtype=np.int64)
+        allowed = np.empty((len(fields), crops_count), dtype=bool)
+        for row, field in enumerate(fields):
+            state = vector_scoring.field_state(matrix, history_by_field[field.id], soil_by_field.get(field.id))
+            result = vector_scoring.score_all(arrays, state, target_year)
+            scores[row] = result.scores
+            allowed[row] = (result.reasons & rotation_planner.FORBIDDEN_REASONS) == 0
+
+        areas = np.array([f.area_ha for f in fields], dtype=float)
+        balance = group_balancer.balance_group(scores, allowed, areas, max_share, min_share)
+
+        total_area = float(areas.sum())
+        assignments = []
+        for row, field in enumerate(fields):
+            crop = matrix.crops_list[int(balance.assignment[row])]
+            score = int(scores[row, crop.index])
+            assignments.append({
+                'field_id': field.id,
+                'field_name': field.name,
+                'area_ha': field.area_ha,
                 'crop_id': crop.id,
                 'crop_name': crop.name,
-                'family_name': crop.family.name if crop.family else "Не указано",
                 'score': score,
-                'compatibility': compatibility,
-                'reasons': reasons,
-                'rotation_interval': crop.recommended_rotation_interval
+                'compatibility': self._compatibility_label(score)
             })
 
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
+        crops = [
+            {
+                'crop_id': crop.id,
+                'crop_name': crop.name,
+                'area_ha': round(float(balance.loads[crop.index]), 2),
+                'share': round(float(balance.loads[crop.index]) / total_area, 4) if total_area else 0
+            }
+            for crop in matrix.crops_list
+            if balance.loads[crop.index] > 0
+        ]
 
-        for rec in recommendations[:limit]:
-            from db.models import RotationRecommendation
+        return {
+            'fields': assignments,
+            'crops': crops,
+            'total_score': balance.total_score,
+            'feasible': balance.feasible
+        }
+
+    @staticmethod
+    def _persist(field, target_year: int, recommendations):
+        for rec in recommendations:
             RotationRecommendation(
                 field=field,
-                crop=Crop[rec['crop_id']],
+                crop=rec['crop_id'],
                 target_year=target_year,
                 agro_score=rec['score'],
                 compatibility=rec['compatibility'],
@@ -63,76 +259,107 @@ class CropRotationService:
                 rotation_compliance=rec['score'] >= 70
             )
 
-        return recommendations[:limit]
-
-    def _calculate_crop_score(self, candidate_crop, planting_history, soil_profile, target_year):
-        score = 100
-        reasons = []
-
-        last_planting_year = None
-        for planting in planting_history:
-            if planting.crop.id == candidate_crop.id:
-                last_planting_year = planting.planting_date.year
-                break
-
-        if last_planting_year:
-            years_since_last = target_year - last_planting_year
-            min_interval = candidate_crop.recommended_rotation_interval
-
-            if years_since_last < min_interval:
-                penalty = (min_interval - years_since_last) * 15
-                score -= penalty
-                reasons.append(
-                    f"Нарушен интервал севооборота: {years_since_last} лет вместо {min_interval}"
-                )
-            else:
-                reasons.append(f"Интервал севооборота соблюден: {years_since_last} лет")
-
-        if planting_history:
-            last_crop = planting_history[0].crop
-
-            rotation_rule = CropRotationRule.get(
-                previous_crop=last_crop,
-                next_crop=candidate_crop
-            )
+    @staticmethod
+    def _matrix_for(*histories):
+        """Снимок правил, в котором есть культуры всех переданных историй посадок"""
+        return rule_index.get_for_crops({p.crop.id for history in histories for p in history})
+
+    @staticmethod
+    def _load_field_data(field):
+        planting_history = select(
+            p for p in Planting
+            if p.field == field
+        ).order_by(desc(Planting.planting_date))[:HISTORY_DEPTH]
+
+        soil_profile = select(
+            fsp for fsp in FieldSoilProfile
+            if fsp.field == field
+        ).order_by(desc(FieldSoilProfile.sample_date)).first()
 
-            if rotation_rule:
-                if rotation_rule.compatibility == 'good':
-                    score += 20
-                    reasons.append(f"Хороший предшественник: {last_crop.name}")
-                elif rotation_rule.compatibility == 'bad':
-                    score -= 30
-                    reasons.append(f"Плохой предшественник: {last_crop.name}")
-
-            if last_crop.family == candidate_crop.family:
-                score -= 25
-                reasons.append(f"Одинаковое семейство с предшественником: {candidate_crop.family.name}")
-
-        if soil_profile:
-            if (hasattr(candidate_crop, 'preferred_ph') and
-                    hasattr(soil_profile, 'pH') and soil_profile.pH is not None):
-
-                if (candidate_crop.preferred_ph == 'acidic' and soil_profile.pH >= 6.5):
-                    score -= 20
-                    reasons.append("Культура предпочитает кислые почвы")
-                elif (candidate_crop.preferred_ph == 'alkaline' and soil_profile.pH <= 6.5):
-                    score -= 20
-                    reasons.append("Культура предпочитает щелочные почвы")
-
-            if (hasattr(candidate_crop, 'nutrient_demand') and
-                    hasattr(soil_profile, 'organic_matter') and soil_profile.organic_matter is not None):
-
-                if (candidate_crop.nutrient_demand == 'high' and soil_profile.organic_matter < 2.5):
-                    score -= 15
-                    reasons.append("Высокая потребность в питательных веществах при бедной почве")
+        return planting_history, soil_profile
+
+    @staticmethod
+    def _load_batch_data(field_ids):
+        plantings = select(
+            p for p in Planting
+            if p.field.id in field_ids
+        ).order_by(desc(Planting.planting_date))[:]
+
+        history_by_field = {field_id: [] for field_id in field_ids}
+        for planting in plantings:
+            history = history_by_field[planting.field.id]
+            if len(history) < HISTORY_DEPTH:
+                history.append(planting)
+
+        soil_profiles = select(
+            fsp for fsp in FieldSoilProfile
+            if fsp.field.id in field_ids
+        ).order_by(desc(FieldSoilProfile.sample_date))[:]
+
+        soil_by_field = {}
+        for soil_profile in soil_profiles:
+            soil_by_field.setdefault(soil_profile.field.id, soil_profile)
+
+        return history_by_field, soil_by_field
+
+    @staticmethod
+    def _compatibility_label(score: int) -> str:
+        if score >= 90:
+            return "excellent"
+        elif score >= 70:
+            return "good"
+        elif score >= 50:
+            return "fair"
+        return "poor"
+
+    @staticmethod
+    def _profits(rank_by: str):
+        """Ожидаемая прибыль с гектара по культурам, если ранжирование по прибыли"""
+        if rank_by == RANK_PROFIT:
+            return EconomicCalculator().expected_profits()
+        if rank_by != RANK_AGRO:
+            raise ValueError(f"Неизвестный способ ранжирования: {rank_by}")
+        return None
+
+    @staticmethod
+    def _profit_order(matrix, result, profits, limit):
+        """
+        Допустимые по севообороту культуры с известной прибылью — по убыванию
+        прибыли, затем остальные по агро-оценке.
+        """
+        profit = np.array([profits.get(crop.id, np.nan) for crop in matrix.crops_list])
+        ranked = ((result.reasons & rotation_planner.FORBIDDEN_REASONS) == 0) & ~np.isnan(profit)
+        profit = np.where(ranked, profit, -np.inf)
+        order = np.lexsort((-result.scores, -profit, ~ranked))
+        return order if limit is None else order[:max(limit, 0)]
+
+    def _rank_crops(self, matrix, planting_history, soil_profile, target_year, limit=None, profits=None):
+        state = vector_scoring.field_state(matrix, planting_history, soil_profile)
+        result = vector_scoring.score_all(vector_scoring.crop_arrays(matrix), state, target_year)
+
+        if profits is None:
+            order = vector_scoring.top_indices(result.scores, limit)
         else:
-            reasons.append("Данные анализа почвы отсутствуют")
+            order = self._profit_order(matrix, result, profits, limit)
+
+        recommendations = []
+
+        # Тексты причин строятся только для попавших в выдачу культур
+        for index in order:
+            crop = matrix.crops_list[index]
+            score = int(result.scores[index])
 
-        recent_crop_types = [p.crop.crop_type for p in planting_history[:3] if p.crop.crop_type]
-        if (hasattr(candidate_crop, 'crop_type') and
-                candidate_crop.crop_type and
-                candidate_crop.crop_type in recent_crop_types):
-            score -= 10
-            reasons.append("Частое повторение типа культуры в истории поля")
+            recommendation = {
+                'crop_id': crop.id,
+                'crop_name': crop.name,
+                'family_name': crop.family_name,
+                'score': score,
+                'compatibility': self._compatibility_label(score),
+                'reasons': vector_scoring.reason_texts(matrix, state, result, index),
+                'rotation_interval': crop.recommended_rotation_interval
+            }
+            if profits is not None:
+                recommendation['expected_profit_per_ha'] = profits.get(crop.id)
+            recommendations.append(recommendation)
 
-        return max(score, 0), reasons
+        return recommendations
@@ -0,0 +1,194 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+DEFAULT_TIME_BUDGET = 1.0
+_EPS = 1e-9
+
+
+@dataclass(frozen=True)
+class BalanceResult:
+    assignment: np.ndarray
+    total_score: int
+    loads: np.ndarray
+    feasible: bool
+    iterations: int
+
+
+class _State:
+    """Текущее назначение культур с инкрементально поддерживаемыми площадями"""
+
+    def __init__(self, scores, allowed, areas, max_area, min_area, assignment):
+        self.scores = scores
+        self.allowed = allowed
+        self.areas = areas
+        self.max_area = max_area
+        self.min_area = min_area
+        self.assignment = assignment
+        self.fields = np.arange(len(areas))
+        self.loads = np.bincount(assignment, weights=areas, minlength=scores.shape[1])
+
+    def move(self, field: int, crop: int):
+        current = self.assignment[field]
+        self.loads[current] -= self.areas[field]
+        self.loads[crop] += self.areas[field]
+        self.assignment[field] = crop
+
+    def current_scores(self):
+        return self.scores[self.fields, self.assignment]
+
+    def over(self):
+        return np.maximum(self.loads - self.max_area, 0)
+
+    def under(self):
+        return np.maximum(self.min_area - self.loads, 0)
+
+    def violation(self) -> float:
+        return float(self.over().sum() + self.under().sum())
+
+
+def _move_gains(state: _State):
+    """Выигрыш и допустимость перевода каждого поля на каждую культуру"""
+    current = state.assignment
+    areas = state.areas[:, None]
+    gains = state.scores - state.current_scores()[:, None]
+
+    fits = state.loads[None, :] + areas <= state.max_area[None, :] + _EPS
+    keeps_min = (state.loads[current] - state.areas >= state.min_area[current] - _EPS)[:, None]
+    feasible = state.allowed & fits & keeps_min
+    feasible[state.fields, current] = False
+    return gains, feasible
+
+
+def _repair(state: _State, deadline: float) -> int:
+    """Устранить нарушения долей, теряя как можно меньше оценки на гектар"""
+    steps = 0
+    while state.violation() > _EPS and time.perf_counter() < deadline:
+        over = state.over()
+        under = state.under()
+        gains = state.scores - state.current_scores()[:, None]
+        areas = state.areas[:, None]
+        current = state.assignment
+
+        # Перевод поля уменьшает нарушение, если уводит его с переполненной
+        # культуры или приводит на недобранную, не создавая новых перекосов
+        leaving_over = (over[current] > _EPS)[:, None]
+        target_under = (under > _EPS)[None, :]
+        target_fits = state.loads[None, :] + areas <= state.max_area[None, :] + _EPS
+        source_keeps_min = (state.loads[current] - state.areas >= state.min_area[current] - _EPS)[:, None]
+
+        useful = state.allowed & target_fits & (
+            leaving_over | (target_under & source_keeps_min)
+        )
+        useful[state.fields, current] = False
+        if not useful.any():
+            break
+
+        cost = np.where(useful, -gains / np.maximum(areas, _EPS), np.inf)
+        field, crop = np.unravel_index(np.argmin(cost), cost.shape)
+        state.move(int(field), int(crop))
+        steps += 1
+    return steps
+
+
+def _improve_moves(state: _State, deadline: float) -> int:
+    steps = 0
+    while time.perf_counter() < deadline:
+        gains, feasible = _move_gains(state)
+        gains = np.where(feasible, gains, 0)
+        field, crop = np.unravel_index(np.argmax(gains), gains.shape)
+        if gains[field, crop] <= 0:
+            break
+        state.move(int(field), int(crop))
+        steps += 1
+    return steps
+
+
+def _improve_swaps(state: _State, deadline: float) -> int:
+    """Обмен культурами между парами полей: оценка растёт, доли остаются в рамках"""
+    steps = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for first in range(len(state.areas)):
+            if time.perf_counter() >= deadline:
+                break
+            first_crop = state.assignment[first]
+            other_crops = state.assignment
+            gains = (
+                state.scores[first, other_crops] + state.scores[state.fields, first_crop]
+                - state.scores[first, first_crop] - state.current_scores()
+            )
+
+            delta = state.areas - state.areas[first]
+            first_load = state.loads[first_crop] + delta
+            other_load = state.loads[other_crops] - delta
+            feasible = (
+                (other_crops != first_crop)
+                & state.allowed[first, other_crops]
+                & state.allowed[state.fields, first_crop]
+                & (first_load <= state.max_area[first_crop] + _EPS)
+                & (first_load >= state.min_area[first_crop] - _EPS)
+                & (other_load <= state.max_area[other_crops] + _EPS)
+                & (other_load >= state.min_area[other_crops] - _EPS)
+            )
+            gains = np.where(feasible, gains, 0)
+            second = int(np.argmax(gains))
+            if gains[second] > 0:
+                second_crop = state.assignment[second]
+                state.move(first, second_crop)
+                state.move(second, first_crop)
+                steps += 1
+                improved = True
+    return steps
+
+
+def balance_group(
+        scores: np.ndarray,
+        allowed: np.ndarray,
+        areas: np.ndarray,
+        max_share: np.ndarray,
+        min_share: np.ndarray,
+        time_budget: float = DEFAULT_TIME_BUDGET
+) -> BalanceResult:
+    """
+    Назначить культуру каждому полю группы севооборота.
+
+    scores[f, c] — агро-оценка культуры c на поле f, allowed[f, c] — можно ли
+    её сеять (без нарушения интервала и плохого предшественника). max_share
+    и min_share — допустимые доли площади группы по каждой культуре.
+
+    Старт — лучшая культура на каждом поле, затем ремонт нарушенных долей и
+    локальный поиск (переводы одного поля и обмены между парами полей). Все
+    ходы оцениваются по приращениям оценки и площадей без пересчёта полей.
+    """
+    deadline = time.perf_counter() + time_budget
+    total_area = float(areas.sum())
+
+    allowed = allowed.copy()
+    no_choice = ~allowed.any(axis=1)
+    allowed[no_choice] = True
+
+    masked = np.where(allowed, scores, -1)
+    state = _State(
+        scores=scores,
+        allowed=allowed,
+        areas=areas,
+        max_area=max_share * total_area,
+        min_area=min_share * total_area,
+        assignment=np.argmax(masked, axis=1)
+    )
+
+    iterations = _repair(state, deadline)
+    iterations += _improve_moves(state, deadline)
+    iterations += _improve_swaps(state, deadline)
+    iterations += _improve_moves(state, deadline)
+
+    return BalanceResult(
+        assignment=state.assignment,
+        total_score=int(state.current_scores().sum()),
+        loads=state.loads,
+        feasible=state.violation() <= _EPS,
+        iterations=iterations
+    )
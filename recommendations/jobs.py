@@ -0,0 +1,151 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field as dataclass_field
+from datetime import datetime
+
+from pony.orm import db_session, select
+
+from app.config import settings
+from db.models import Field
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+SCOPE_FIELD = "field"
+SCOPE_GROUP = "group"
+SCOPE_USER = "user"
+
+# Сколько полей генерируется за один пакетный проход (и одну транзакцию)
+CHUNK_SIZE = 50
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class GenerationJob:
+    scope: str
+    target_id: int
+    target_year: int
+    limit: int
+    id: str = dataclass_field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = JOB_QUEUED
+    total_fields: int = 0
+    processed_fields: int = 0
+    generated_count: int = 0
+    error: str | None = None
+    created_at: datetime = dataclass_field(default_factory=datetime.utcnow)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "scope": self.scope,
+            "target_id": self.target_id,
+            "target_year": self.target_year,
+            "status": self.status,
+            "total_fields": self.total_fields,
+            "processed_fields": self.processed_fields,
+            "progress": round(self.processed_fields / self.total_fields, 3) if self.total_fields else 0,
+            "generated_count": self.generated_count,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+@db_session
+def resolve_field_ids(scope: str, target_id: int):
+    if scope == SCOPE_FIELD:
+        return [target_id] if Field.exists(id=target_id) else []
+    if scope == SCOPE_GROUP:
+        return select(f.id for f in Field for g in f.groups if g.id == target_id).order_by(1)[:]
+    if scope == SCOPE_USER:
+        return select(f.id for f in Field if f.owner.id == target_id).order_by(1)[:]
+    raise ValueError(f"Неизвестная область генерации: {scope}")
+
+
+class GenerationJobManager:
+    """
+    Фоновая генерация рекомендаций для поля, группы или всех полей пользователя.
+
+    Задачи выполняются ограниченным пулом потоков; очередь ограничена
+    max_pending, а история последних max_finished задач хранится в памяти.
+    """
+
+    def __init__(self, service, max_workers: int, max_pending: int, max_finished: int = 1000):
+        self._service = service
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recommendation-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+
+    def submit(self, scope: str, target_id: int, target_year: int, limit: int = 5) -> GenerationJob:
+        job = GenerationJob(scope=scope, target_id=target_id, target_year=target_year, limit=limit)
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull("Очередь генерации переполнена")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._trim()
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> GenerationJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: GenerationJob):
+        job.status = JOB_RUNNING
+        job.started_at = datetime.utcnow()
+        try:
+            field_ids = resolve_field_ids(job.scope, job.target_id)
+            job.total_fields = len(field_ids)
+
+            for start in range(0, len(field_ids), CHUNK_SIZE):
+                chunk = field_ids[start:start + CHUNK_SIZE]
+                job.generated_count += self._service.generate_for_fields(chunk, job.target_year, job.limit)
+                job.processed_fields += len(chunk)
+
+            job.status = JOB_DONE
+        except Exception as e:
+            logger.exception("Recommendation generation job %s failed", job.id)
+            job.status = JOB_FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                self._pending -= 1
+
+    def _trim(self):
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in (JOB_DONE, JOB_FAILED)
+        ]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+
+def create_job_manager(service) -> GenerationJobManager:
+    return GenerationJobManager(
+        service,
+        max_workers=settings.RECOMMENDATION_JOB_WORKERS,
+        max_pending=settings.RECOMMENDATION_JOB_MAX_PENDING
+    )
@@ -0,0 +1,128 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from recommendations import vector_scoring
+from recommendations.vector_scoring import (
+    CropArrays, FieldState, HISTORY_DEPTH, REASON_INTERVAL_VIOLATED, REASON_BAD_PREDECESSOR
+)
+
+DEFAULT_BEAM_WIDTH = 48
+DEFAULT_TIME_BUDGET = 0.5
+
+# Культуры с такими кодами причин в план не попадают
+FORBIDDEN_REASONS = REASON_INTERVAL_VIOLATED | REASON_BAD_PREDECESSOR
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    year: int
+    crop_index: int
+    score: int
+    state: FieldState
+    result: vector_scoring.ScoreResult
+
+
+@dataclass(frozen=True)
+class Plan:
+    total_score: int
+    steps: tuple
+
+
+@dataclass(frozen=True)
+class _Beam:
+    total_score: int
+    steps: tuple
+    state: FieldState
+
+
+def _extend_state(state: FieldState, crop_index: int, year: int) -> FieldState:
+    return FieldState(
+        history=np.concatenate(([crop_index], state.history[:HISTORY_DEPTH - 1])),
+        years=np.concatenate(([year], state.years[:HISTORY_DEPTH - 1])),
+        has_soil=state.has_soil,
+        ph=state.ph,
+        organic_matter=state.organic_matter
+    )
+
+
+def _allowed_scores(arrays: CropArrays, state: FieldState, year: int):
+    result = vector_scoring.score_all(arrays, state, year)
+    allowed = (result.reasons & FORBIDDEN_REASONS) == 0
+    return result, np.where(allowed, result.scores, -1)
+
+
+def _expand(arrays: CropArrays, beam: _Beam, year: int, branching: int):
+    result, scores = _allowed_scores(arrays, beam.state, year)
+    candidates = np.flatnonzero(scores >= 0)
+    if candidates.size > branching:
+        best = np.argpartition(-scores[candidates], branching - 1)[:branching]
+        candidates = candidates[best]
+
+    for crop_index in candidates:
+        score = int(scores[crop_index])
+        yield _Beam(
+            total_score=beam.total_score + score,
+            steps=beam.steps + (PlanStep(year, int(crop_index), score, beam.state, result),),
+            state=_extend_state(beam.state, int(crop_index), year)
+        )
+
+
+def _complete_greedily(arrays: CropArrays, beam: _Beam, years):
+    """Достроить план лучшей допустимой культурой на каждый оставшийся год"""
+    for year in years:
+        expanded = next(_expand(arrays, beam, year, 1), None)
+        if expanded is None:
+            return None
+        beam = expanded
+    return beam
+
+
+def plan_rotation(
+        arrays: CropArrays,
+        state: FieldState,
+        start_year: int,
+        years: int,
+        plans: int = 3,
+        beam_width: int = DEFAULT_BEAM_WIDTH,
+        time_budget: float = DEFAULT_TIME_BUDGET
+):
+    """
+    Лучевой поиск последовательностей культур на years лет вперёд.
+
+    Максимизирует суммарную агро-оценку, при этом культуры с нарушенным
+    интервалом севооборота или плохим предшественником отбрасываются.
+    На каждом шаге сохраняется beam_width лучших частичных планов; при
+    превышении time_budget (секунды) оставшиеся годы достраиваются жадно.
+
+    Возвращает (список Plan по убыванию суммарной оценки, флаг досрочного
+    завершения по бюджету времени).
+    """
+    deadline = time.perf_counter() + time_budget
+    plan_years = list(range(start_year, start_year + years))
+    beams = [_Beam(total_score=0, steps=(), state=state)]
+    truncated = False
+
+    for position, year in enumerate(plan_years):
+        if time.perf_counter() > deadline:
+            truncated = True
+            beams = [
+                completed for completed in (
+                    _complete_greedily(arrays, beam, plan_years[position:]) for beam in beams
+                )
+                if completed is not None
+            ]
+            break
+
+        candidates = [
+            expanded
+            for beam in beams
+            for expanded in _expand(arrays, beam, year, beam_width)
+        ]
+        beams = sorted(candidates, key=lambda b: b.total_score, reverse=True)[:beam_width]
+        if not beams:
+            break
+
+    beams.sort(key=lambda b: b.total_score, reverse=True)
+    return [Plan(total_score=b.total_score, steps=b.steps) for b in beams[:plans]], truncated
@@ -1,25 +1,41 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pony.orm import db_session, select, desc
 
+from app.executor import db_executor, in_db_executor
+from app.timing import TimedRoute
 from db.models import (
     Field, Crop, RotationRecommendation, Planting,
-    FieldSoilProfile, CropRotationRule, User, Season
+    FieldSoilProfile, User, Season, FieldGroup
 )
+from recommendations.cache import recommendation_cache
 from recommendations.crop_rotation_service import CropRotationService
+from recommendations.rule_index import rule_index
+from recommendations.jobs import create_job_manager, JobQueueFull, SCOPE_FIELD
+from recommendations.schemas import GroupBalanceRequest, GenerationJobRequest
 
-router = APIRouter(prefix="/recommendations", tags=["Recommendations"])
+router = APIRouter(prefix="/recommendations", tags=["Recommendations"], route_class=TimedRoute)
 
 rotation_service = CropRotationService()
+job_manager = create_job_manager(rotation_service)
+
+
+def _accepted(job, request: Request, response: Response) -> dict:
+    """Ответ на поставленную в очередь задачу: 202 и адрес ресурса задачи в Location"""
+    response.status_code = 202
+    response.headers["Location"] = str(request.url_for("get_generation_job", job_id=job.id))
+    return job.to_dict()
 
 
 @router.get("/field/{field_id}")
-async def get_recommendations_for_field(
+@in_db_executor
+def get_recommendations_for_field(
         field_id: int,
         target_year: Optional[int] = None,
-        limit: int = 5
+        limit: int = 5,
+        rank_by: Literal["agro", "profit"] = "agro"
 ):
     try:
         with db_session:
@@ -30,9 +46,15 @@ async def get_recommendations_for_field(
             if target_year is None:
                 target_year = datetime.now().year + 1
 
-            recommendations = rotation_service.get_rotation_recommendations(
-                field_id, target_year, limit
-            )
+            if rank_by == "agro":
+                recommendations = rotation_service.get_cached_recommendations(
+                    field_id, target_year, limit
+                )
+            else:
+                # Прибыль зависит от текущих цен, поэтому такой рейтинг не кэшируется
+                recommendations = rotation_service.get_rotation_recommendations(
+                    field_id, target_year, limit, rank_by=rank_by
+                )
 
             return {
                 "field_id": field_id,
@@ -40,12 +62,158 @@ async def get_recommendations_for_field(
                 "target_year": target_year,
                 "recommendations": recommendations
             }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/field/{field_id}/plan")
+@in_db_executor
+def get_rotation_plan_for_field(
+        field_id: int,
+        start_year: Optional[int] = None,
+        years: int = Query(4, ge=1, le=10),
+        plans: int = Query(3, ge=1, le=20)
+):
+    try:
+        with db_session:
+            field = Field.get(id=field_id)
+            if not field:
+                raise HTTPException(status_code=404, detail="Поле не найдено")
+
+            if start_year is None:
+                start_year = datetime.now().year + 1
+
+            plan = rotation_service.get_rotation_plan(
+                field_id, start_year, years, plans
+            )
+
+            return {
+                "field_id": field_id,
+                "field_name": field.name,
+                "start_year": start_year,
+                "years": years,
+                **plan
+            }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/user/{user_id}/fields")
+@in_db_executor
+def get_recommendations_for_user_fields(
+        user_id: int,
+        target_year: Optional[int] = None,
+        limit: int = 5,
+        rank_by: Literal["agro", "profit"] = "agro"
+):
+    try:
+        with db_session:
+            user = User.get(id=user_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+            if target_year is None:
+                target_year = datetime.now().year + 1
+
+            fields = rotation_service.get_user_recommendations(
+                user_id, target_year, limit, rank_by
+            )
+
+            return {
+                "user_id": user_id,
+                "target_year": target_year,
+                "fields": fields
+            }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/group/{group_id}")
+@in_db_executor
+def get_recommendations_for_group(
+        group_id: int,
+        target_year: Optional[int] = None,
+        limit: int = 5,
+        rank_by: Literal["agro", "profit"] = "agro"
+):
+    try:
+        with db_session:
+            group = FieldGroup.get(id=group_id)
+            if not group:
+                raise HTTPException(status_code=404, detail="Группа не найдена")
+
+            if target_year is None:
+                target_year = datetime.now().year + 1
+
+            fields = rotation_service.get_group_recommendations(
+                group_id, target_year, limit, rank_by
+            )
+
+            return {
+                "group_id": group_id,
+                "group_name": group.name,
+                "target_year": target_year,
+                "fields": fields
+            }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/group/{group_id}/balance")
+@in_db_executor
+def balance_group_rotation(group_id: int, data: GroupBalanceRequest):
+    try:
+        with db_session:
+            group = FieldGroup.get(id=group_id)
+            if not group:
+                raise HTTPException(status_code=404, detail="Группа не найдена")
+
+            target_year = data.target_year
+            if target_year is None:
+                target_year = datetime.now().year + 1
+
+            balance = rotation_service.get_group_balance(
+                group_id,
+                target_year,
+                {limit.crop_id: (limit.min_share, limit.max_share) for limit in data.share_limits}
+            )
+
+            return {
+                "group_id": group_id,
+                "group_name": group.name,
+                "rotation_group": group.rotation_group,
+                "target_year": target_year,
+                **balance
+            }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_recommendation_cache_stats():
+    return recommendation_cache.stats()
+
+
+@router.get("/executor/stats")
+async def get_executor_stats():
+    return db_executor.stats()
+
+
 @router.post("/field/{field_id}/apply/{recommendation_id}")
-async def apply_recommendation(
+@in_db_executor
+def apply_recommendation(
         field_id: int,
         recommendation_id: int
 ):
@@ -77,12 +245,15 @@ async def apply_recommendation(
                 "planting_id": planting.id,
                 "recommendation_id": recommendation_id
             }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/field/{field_id}/history")
-async def get_field_rotation_history(
+@in_db_executor
+def get_field_rotation_history(
         field_id: int,
         years_back: int = 5
 ):
@@ -118,67 +289,38 @@ async def get_field_rotation_history(
                 "history_years": years_back,
                 "rotation_history": history
             }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/crops/compatibility/{crop_id}")
-async def get_crop_compatibility(crop_id: int):
+@in_db_executor
+def get_crop_compatibility(crop_id: int):
     try:
-        with db_session:
-            crop = Crop.get(id=crop_id)
-            if not crop:
-                raise HTTPException(status_code=404, detail="Культура не найдена")
-
-            good_followers = select(
-                r for r in CropRotationRule
-                if r.previous_crop == crop and r.compatibility == 'good'
-            )
-
-            bad_followers = select(
-                r for r in CropRotationRule
-                if r.previous_crop == crop and r.compatibility == 'bad'
-            )
-
-            good_predecessors = select(
-                r for r in CropRotationRule
-                if r.next_crop == crop and r.compatibility == 'good'
-            )
-
-            return {
-                "crop_id": crop.id,
-                "crop_name": crop.name,
-                "good_followers": [
-                    {
-                        "crop_id": rule.next_crop.id,
-                        "crop_name": rule.next_crop.name,
-                        "reason": rule.rule_description
-                    }
-                    for rule in good_followers
-                ],
-                "bad_followers": [
-                    {
-                        "crop_id": rule.next_crop.id,
-                        "crop_name": rule.next_crop.name,
-                        "reason": rule.rule_description
-                    }
-                    for rule in bad_followers
-                ],
-                "good_predecessors": [
-                    {
-                        "crop_id": rule.previous_crop.id,
-                        "crop_name": rule.previous_crop.name,
-                        "reason": rule.rule_description
-                    }
-                    for rule in good_predecessors
-                ]
-            }
+        matrix = rule_index.get()
+
+        crop = matrix.crops.get(crop_id)
+        if not crop:
+            raise HTTPException(status_code=404, detail="Культура не найдена")
+
+        return {
+            "crop_id": crop.id,
+            "crop_name": crop.name,
+            "good_followers": matrix.followers(crop.id, 'good'),
+            "bad_followers": matrix.followers(crop.id, 'bad'),
+            "good_predecessors": matrix.predecessors(crop.id, 'good')
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/soil-analysis/field/{field_id}")
-async def get_soil_analysis(field_id: int):
+@in_db_executor
+def get_soil_analysis(field_id: int):
     try:
         with db_session:
             field = Field.get(id=field_id)
@@ -234,12 +376,15 @@ async def get_soil_analysis(field_id: int):
                 },
                 "soil_analysis": soil_analysis
             }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/user/{user_id}/applied-recommendations")
-async def get_user_applied_recommendations(user_id: int):
+@in_db_executor
+def get_user_applied_recommendations(user_id: int):
     try:
         with db_session:
             user = User.get(id=user_id)
@@ -267,14 +412,20 @@ async def get_user_applied_recommendations(user_id: int):
                 "user_id": user_id,
                 "applied_recommendations": result
             }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/field/{field_id}/generate")
-async def generate_recommendations(
+@in_db_executor
+def generate_recommendations(
         field_id: int,
-        target_year: Optional[int] = None
+        request: Request,
+        response: Response,
+        target_year: Optional[int] = None,
+        background: bool = False
 ):
     try:
         with db_session:
@@ -285,6 +436,10 @@ async def generate_recommendations(
             if target_year is None:
                 target_year = datetime.now().year + 1
 
+            if background:
+                job = job_manager.submit(SCOPE_FIELD, field_id, target_year)
+                return _accepted(job, request, response)
+
             old_recommendations = select(
                 r for r in RotationRecommendation
                 if r.field == field and r.target_year == target_year
@@ -292,7 +447,7 @@ async def generate_recommendations(
             old_recommendations.delete(bulk=True)
 
             recommendations = rotation_service.get_rotation_recommendations(
-                field_id, target_year, limit=5
+                field_id, target_year, limit=5, persist=True
             )
 
             return {
@@ -302,12 +457,48 @@ async def generate_recommendations(
                 "generated_count": len(recommendations),
                 "message": "Новые рекомендации успешно сгенерированы"
             }
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/jobs", status_code=202)
+@in_db_executor
+def submit_generation_job(data: GenerationJobRequest, request: Request, response: Response):
+    try:
+        with db_session:
+            target_model = {"field": Field, "group": FieldGroup, "user": User}[data.scope]
+            if not target_model.exists(id=data.target_id):
+                raise HTTPException(status_code=404, detail="Объект генерации не найден")
+
+        target_year = data.target_year
+        if target_year is None:
+            target_year = datetime.now().year + 1
+
+        job = job_manager.submit(data.scope, data.target_id, target_year, data.limit)
+        return _accepted(job, request, response)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.to_dict()
+
+
 @router.get("/crops/suitable-for-soil")
-async def get_crops_suitable_for_soil(
+@in_db_executor
+def get_crops_suitable_for_soil(
         ph_min: Optional[float] = None,
         ph_max: Optional[float] = None,
         organic_matter_min: Optional[float] = None
@@ -348,5 +539,7 @@ async def get_crops_suitable_for_soil(
                 },
                 "suitable_crops": crops_data
             }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,197 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from pony.orm import db_session, select
+
+from app.config import settings
+from db.models import Crop, CropRotationRule, PlantFamily
+from db.signals import subscribe
+
+COMPAT_NONE = 0
+COMPAT_GOOD = 1
+COMPAT_BAD = -1
+
+COMPAT_CODES = {'good': COMPAT_GOOD, 'bad': COMPAT_BAD}
+COMPAT_NAMES = {COMPAT_GOOD: 'good', COMPAT_BAD: 'bad'}
+
+
+@dataclass(frozen=True)
+class CropInfo:
+    """Неизменяемый снимок культуры для расчётов без обращения к БД"""
+    id: int
+    index: int
+    name: str
+    family_id: int
+    family_name: str
+    crop_type: str
+    nutrient_demand: str
+    preferred_ph: str
+    recommended_rotation_interval: int
+
+
+@dataclass(frozen=True)
+class RuleMatrix:
+    """
+    Снимок справочника культур и правил севооборота.
+
+    compatibility[i][j] — код совместимости культуры crops_list[j]
+    после культуры crops_list[i] (COMPAT_GOOD / COMPAT_BAD / COMPAT_NONE).
+    """
+    version: int
+    built_at: float
+    crops_list: tuple
+    crops: dict
+    compatibility: tuple
+    rule_descriptions: dict
+    families: dict
+    crops_by_family: dict
+    crops_by_type: dict
+
+    def compatibility_of(self, previous_crop_id: int, next_crop_id: int):
+        previous_crop = self.crops.get(previous_crop_id)
+        next_crop = self.crops.get(next_crop_id)
+        if previous_crop is None or next_crop is None:
+            return None
+        code = self.compatibility[previous_crop.index][next_crop.index]
+        return COMPAT_NAMES.get(code)
+
+    def followers(self, crop_id: int, compatibility: str):
+        crop = self.crops[crop_id]
+        code = COMPAT_CODES[compatibility]
+        row = self.compatibility[crop.index]
+        return [
+            self._rule_entry(crop_id, other.id, other)
+            for other in self.crops_list
+            if row[other.index] == code
+        ]
+
+    def predecessors(self, crop_id: int, compatibility: str):
+        crop = self.crops[crop_id]
+        code = COMPAT_CODES[compatibility]
+        return [
+            self._rule_entry(other.id, crop_id, other)
+            for other in self.crops_list
+            if self.compatibility[other.index][crop.index] == code
+        ]
+
+    def _rule_entry(self, previous_crop_id: int, next_crop_id: int, other: CropInfo):
+        return {
+            "crop_id": other.id,
+            "crop_name": other.name,
+            "reason": self.rule_descriptions.get((previous_crop_id, next_crop_id))
+        }
+
+
+class RuleIndex:
+    """
+    Процессный индекс правил севооборота.
+
+    Строится из Crop, PlantFamily и CropRotationRule и перестраивается
+    лениво после зафиксированного изменения этих сущностей в этом процессе
+    (хуки db.models сообщают о них через db.signals). Изменения из других
+    воркеров подхватываются перестройкой снимка старше ttl_seconds.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._matrix = None
+        self.ttl_seconds = ttl_seconds or None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._version += 1
+
+    def _is_fresh(self, matrix: RuleMatrix | None) -> bool:
+        if matrix is None or matrix.version != self._version:
+            return False
+        return not self.ttl_seconds or time.monotonic() - matrix.built_at < self.ttl_seconds
+
+    def get(self) -> RuleMatrix:
+        matrix = self._matrix
+        if self._is_fresh(matrix):
+            return matrix
+
+        with self._lock:
+            if not self._is_fresh(self._matrix):
+                self._matrix = self._build(self._version)
+            return self._matrix
+
+    def get_for_crops(self, crop_ids) -> RuleMatrix:
+        """
+        Снимок, в котором есть все культуры crop_ids. Культура, которой нет в
+        снимке, создана после его построения (возможно, в другом воркере) —
+        снимок один раз перестраивается вне очереди.
+        """
+        matrix = self.get()
+        if all(crop_id in matrix.crops for crop_id in crop_ids):
+            return matrix
+        self.invalidate()
+        return self.get()
+
+    @staticmethod
+    @db_session
+    def _build(version: int) -> RuleMatrix:
+        built_at = time.monotonic()
+        families = {f.id: f.name for f in select(f for f in PlantFamily)}
+        crop_rows = select(c for c in Crop).order_by(Crop.id)[:]
+
+        crops_list = []
+        crops_by_family = {}
+        crops_by_type = {}
+        for index, crop in enumerate(crop_rows):
+            family_id = crop.family.id
+            info = CropInfo(
+                id=crop.id,
+                index=index,
+                name=crop.name,
+                family_id=family_id,
+                family_name=families.get(family_id, "Не указано"),
+                crop_type=crop.crop_type,
+                nutrient_demand=crop.nutrient_demand,
+                preferred_ph=crop.preferred_ph,
+                recommended_rotation_interval=crop.recommended_rotation_interval
+            )
+            crops_list.append(info)
+            crops_by_family.setdefault(family_id, []).append(crop.id)
+            if crop.crop_type:
+                crops_by_type.setdefault(crop.crop_type, []).append(crop.id)
+
+        crops = {info.id: info for info in crops_list}
+        size = len(crops_list)
+        compatibility = [[COMPAT_NONE] * size for _ in range(size)]
+        rule_descriptions = {}
+
+        rules = select(
+            (r.previous_crop.id, r.next_crop.id, r.compatibility, r.rule_description)
+            for r in CropRotationRule
+        )[:]
+        for previous_id, next_id, rule_compatibility, description in rules:
+            if previous_id not in crops or next_id not in crops:
+                continue
+            code = COMPAT_CODES.get(rule_compatibility, COMPAT_NONE)
+            compatibility[crops[previous_id].index][crops[next_id].index] = code
+            rule_descriptions[(previous_id, next_id)] = description
+
+        return RuleMatrix(
+            version=version,
+            built_at=built_at,
+            crops_list=tuple(crops_list),
+            crops=crops,
+            compatibility=tuple(tuple(row) for row in compatibility),
+            rule_descriptions=rule_descriptions,
+            families=families,
+            crops_by_family={k: tuple(v) for k, v in crops_by_family.items()},
+            crops_by_type={k: tuple(v) for k, v in crops_by_type.items()}
+        )
+
+
+rule_index = RuleIndex(settings.RULE_INDEX_TTL_SECONDS)
+
+for _entity_name in ("Crop", "PlantFamily", "CropRotationRule"):
+    subscribe(_entity_name, rule_index.invalidate)
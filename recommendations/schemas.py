@@ -0,0 +1,27 @@
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class CropShareLimit(BaseModel):
+    crop_id: int
+    min_share: float = Field(0.0, ge=0, le=1)
+    max_share: float = Field(1.0, ge=0, le=1)
+
+    @model_validator(mode="after")
+    def validate_range(self):
+        if self.min_share > self.max_share:
+            raise ValueError("min_share не может быть больше max_share")
+        return self
+
+
+class GroupBalanceRequest(BaseModel):
+    target_year: Optional[int] = None
+    share_limits: List[CropShareLimit] = []
+
+
+class GenerationJobRequest(BaseModel):
+    scope: Literal["field", "group", "user"]
+    target_id: int
+    target_year: Optional[int] = None
+    limit: int = Field(5, ge=1, le=50)
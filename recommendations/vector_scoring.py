@@ -0,0 +1,232 @@
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from recommendations.rule_index import RuleMatrix, COMPAT_GOOD, COMPAT_BAD
+
+# Коды причин — битовые флаги, по одному на каждую ветку расчёта оценки
+REASON_INTERVAL_VIOLATED = 1 << 0
+REASON_INTERVAL_OK = 1 << 1
+REASON_GOOD_PREDECESSOR = 1 << 2
+REASON_BAD_PREDECESSOR = 1 << 3
+REASON_SAME_FAMILY = 1 << 4
+REASON_PREFERS_ACIDIC = 1 << 5
+REASON_PREFERS_ALKALINE = 1 << 6
+REASON_POOR_SOIL = 1 << 7
+REASON_NO_SOIL_DATA = 1 << 8
+REASON_TYPE_REPEAT = 1 << 9
+
+# Сколько последних посадок поля учитывается при оценке
+HISTORY_DEPTH = 10
+
+PH_NONE = 0
+PH_ACIDIC = 1
+PH_ALKALINE = 2
+
+BASE_SCORE = 100
+INTERVAL_PENALTY_PER_YEAR = 15
+GOOD_PREDECESSOR_BONUS = 20
+BAD_PREDECESSOR_PENALTY = 30
+SAME_FAMILY_PENALTY = 25
+PH_PENALTY = 20
+POOR_SOIL_PENALTY = 15
+TYPE_REPEAT_PENALTY = 10
+
+
+@dataclass(frozen=True)
+class CropArrays:
+    """Атрибуты всех культур справочника в виде массивов (порядок crops_list)"""
+    version: int
+    ids: np.ndarray
+    rotation_interval: np.ndarray
+    family: np.ndarray
+    crop_type: np.ndarray
+    ph: np.ndarray
+    high_demand: np.ndarray
+    compatibility: np.ndarray
+
+
+@dataclass(frozen=True)
+class FieldState:
+    """
+    История и почва одного поля.
+
+    history — индексы культур (в порядке crops_list) от последней посадки
+    к более ранним, years — годы этих посадок.
+    """
+    history: np.ndarray
+    years: np.ndarray
+    has_soil: bool = False
+    ph: float | None = None
+    organic_matter: float | None = None
+
+
+@dataclass(frozen=True)
+class ScoreResult:
+    scores: np.ndarray
+    reasons: np.ndarray
+    years_since: np.ndarray
+
+
+_arrays_lock = threading.Lock()
+_arrays_cache = {}
+
+
+def crop_arrays(matrix: RuleMatrix) -> CropArrays:
+    """Массивы атрибутов культур; кэшируются на версию индекса правил"""
+    arrays = _arrays_cache.get(matrix.version)
+    if arrays is not None:
+        return arrays
+
+    with _arrays_lock:
+        arrays = _arrays_cache.get(matrix.version)
+        if arrays is None:
+            arrays = _build_arrays(matrix)
+            _arrays_cache.clear()
+            _arrays_cache[matrix.version] = arrays
+        return arrays
+
+
+def _build_arrays(matrix: RuleMatrix) -> CropArrays:
+    crops = matrix.crops_list
+    type_codes = {}
+    ph_codes = {'acidic': PH_ACIDIC, 'alkaline': PH_ALKALINE}
+
+    compatibility = np.array(matrix.compatibility, dtype=np.int8)
+    if compatibility.size == 0:
+        compatibility = compatibility.reshape(len(crops), len(crops))
+
+    return CropArrays(
+        version=matrix.version,
+        ids=np.array([c.id for c in crops], dtype=np.int64),
+        rotation_interval=np.array([c.recommended_rotation_interval for c in crops], dtype=np.int64),
+        family=np.array([c.family_id for c in crops], dtype=np.int64),
+        crop_type=np.array(
+            [type_codes.setdefault(c.crop_type, len(type_codes)) if c.crop_type else -1 for c in crops],
+            dtype=np.int64
+        ),
+        ph=np.array([ph_codes.get(c.preferred_ph, PH_NONE) for c in crops], dtype=np.int8),
+        high_demand=np.array([c.nutrient_demand == 'high' for c in crops], dtype=bool),
+        compatibility=compatibility
+    )
+
+
+def field_state(matrix: RuleMatrix, planting_history, soil_profile) -> FieldState:
+    """
+    Собрать FieldState из посадок (от последней к ранним) и анализа почвы.
+    Посадки культур, которых нет в снимке matrix, не учитываются.
+    """
+    known = [p for p in planting_history if p.crop.id in matrix.crops]
+    history = np.array([matrix.crops[p.crop.id].index for p in known], dtype=np.int64)
+    years = np.array([p.planting_date.year for p in known], dtype=np.int64)
+
+    if not soil_profile:
+        return FieldState(history=history, years=years)
+
+    return FieldState(
+        history=history,
+        years=years,
+        has_soil=True,
+        ph=soil_profile.pH,
+        organic_matter=soil_profile.organic_matter
+    )
+
+
+def score_all(arrays: CropArrays, state: FieldState, target_year: int) -> ScoreResult:
+    """Оценки и коды причин сразу для всех культур справочника"""
+    size = arrays.ids.shape[0]
+    scores = np.full(size, BASE_SCORE, dtype=np.int64)
+    reasons = np.zeros(size, dtype=np.int32)
+
+    last_year = np.zeros(size, dtype=np.int64)
+    if state.history.size:
+        planted, first_seen = np.unique(state.history, return_index=True)
+        last_year[planted] = state.years[first_seen]
+
+    has_last = last_year != 0
+    years_since = target_year - last_year
+    violated = has_last & (years_since < arrays.rotation_interval)
+    scores -= np.where(violated, (arrays.rotation_interval - years_since) * INTERVAL_PENALTY_PER_YEAR, 0)
+    reasons |= np.where(violated, REASON_INTERVAL_VIOLATED, 0).astype(np.int32)
+    reasons |= np.where(has_last & ~violated, REASON_INTERVAL_OK, 0).astype(np.int32)
+
+    if state.history.size:
+        last = state.history[0]
+        row = arrays.compatibility[last]
+        good = row == COMPAT_GOOD
+        bad = row == COMPAT_BAD
+        scores += np.where(good, GOOD_PREDECESSOR_BONUS, 0)
+        scores -= np.where(bad, BAD_PREDECESSOR_PENALTY, 0)
+        reasons |= np.where(good, REASON_GOOD_PREDECESSOR, 0).astype(np.int32)
+        reasons |= np.where(bad, REASON_BAD_PREDECESSOR, 0).astype(np.int32)
+
+        same_family = arrays.family == arrays.family[last]
+        scores -= np.where(same_family, SAME_FAMILY_PENALTY, 0)
+        reasons |= np.where(same_family, REASON_SAME_FAMILY, 0).astype(np.int32)
+
+    if state.has_soil:
+        if state.ph is not None:
+            acidic = (arrays.ph == PH_ACIDIC) & (state.ph >= 6.5)
+            alkaline = (arrays.ph == PH_ALKALINE) & (state.ph <= 6.5)
+            scores -= np.where(acidic | alkaline, PH_PENALTY, 0)
+            reasons |= np.where(acidic, REASON_PREFERS_ACIDIC, 0).astype(np.int32)
+            reasons |= np.where(alkaline, REASON_PREFERS_ALKALINE, 0).astype(np.int32)
+
+        if state.organic_matter is not None and state.organic_matter < 2.5:
+            scores -= np.where(arrays.high_demand, POOR_SOIL_PENALTY, 0)
+            reasons |= np.where(arrays.high_demand, REASON_POOR_SOIL, 0).astype(np.int32)
+    else:
+        reasons |= REASON_NO_SOIL_DATA
+
+    recent_types = arrays.crop_type[state.history[:3]]
+    recent_types = recent_types[recent_types >= 0]
+    if recent_types.size:
+        repeat = (arrays.crop_type >= 0) & np.isin(arrays.crop_type, recent_types)
+        scores -= np.where(repeat, TYPE_REPEAT_PENALTY, 0)
+        reasons |= np.where(repeat, REASON_TYPE_REPEAT, 0).astype(np.int32)
+
+    return ScoreResult(scores=np.maximum(scores, 0), reasons=reasons, years_since=years_since)
+
+
+def top_indices(scores: np.ndarray, limit: int | None) -> np.ndarray:
+    """Индексы культур по убыванию оценки; при равенстве — в порядке справочника"""
+    order = np.argsort(-scores, kind='stable')
+    return order if limit is None else order[:max(limit, 0)]
+
+
+def reason_texts(matrix: RuleMatrix, state: FieldState, result: ScoreResult, index: int) -> list:
+    """Текстовые причины для одной культуры по её кодам"""
+    crop = matrix.crops_list[index]
+    code = int(result.reasons[index])
+    texts = []
+
+    if code & REASON_INTERVAL_VIOLATED:
+        texts.append(
+            f"Нарушен интервал севооборота: {int(result.years_since[index])} лет "
+            f"вместо {crop.recommended_rotation_interval}"
+        )
+    if code & REASON_INTERVAL_OK:
+        texts.append(f"Интервал севооборота соблюден: {int(result.years_since[index])} лет")
+
+    if code & (REASON_GOOD_PREDECESSOR | REASON_BAD_PREDECESSOR):
+        last_crop = matrix.crops_list[int(state.history[0])]
+        if code & REASON_GOOD_PREDECESSOR:
+            texts.append(f"Хороший предшественник: {last_crop.name}")
+        else:
+            texts.append(f"Плохой предшественник: {last_crop.name}")
+
+    if code & REASON_SAME_FAMILY:
+        texts.append(f"Одинаковое семейство с предшественником: {crop.family_name}")
+    if code & REASON_PREFERS_ACIDIC:
+        texts.append("Культура предпочитает кислые почвы")
+    if code & REASON_PREFERS_ALKALINE:
+        texts.append("Культура предпочитает щелочные почвы")
+    if code & REASON_POOR_SOIL:
+        texts.append("Высокая потребность в питательных веществах при бедной почве")
+    if code & REASON_NO_SOIL_DATA:
+        texts.append("Данные анализа почвы отсутствуют")
+    if code & REASON_TYPE_REPEAT:
+        texts.append("Частое повторение типа культуры в истории поля")
+
+    return texts
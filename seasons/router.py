@@ -1,4 +1,4 @@
-from auth.deps import get_current_user
+from auth.deps import get_token_user
 from fastapi import APIRouter, HTTPException, Depends
 
 from seasons import crud
@@ -8,7 +8,7 @@ router = APIRouter(prefix="/seasons", tags=["Seasons"])
 
 
 @router.post("", response_model=SeasonOut)
-def create_season(season: SeasonCreate, current_user=Depends(get_current_user)):
+def create_season(season: SeasonCreate, current_user=Depends(get_token_user)):
     try:
         new_season = crud.create_season(
             user_id=current_user.id,
@@ -27,7 +27,7 @@ def create_season(season: SeasonCreate, current_user=Depends(get_current_user)):
 
 
 @router.get("", response_model=list[SeasonOut])
-def get_seasons(current_user=Depends(get_current_user)):
+def get_seasons(current_user=Depends(get_token_user)):
     Seasons = crud.get_all_seasons(current_user.id)
     return [
         {
@@ -40,7 +40,7 @@ def get_seasons(current_user=Depends(get_current_user)):
 
 
 @router.get("/{season_id}", response_model=SeasonOut)
-def get_season(season_id: int, current_user=Depends(get_current_user)):
+def get_season(season_id: int, current_user=Depends(get_token_user)):
     f = crud.get_season(season_id, current_user.id)
     if not f:
         raise HTTPException(status_code=404, detail="Сезон не найден")
@@ -48,7 +48,7 @@ def get_season(season_id: int, current_user=Depends(get_current_user)):
 
 
 @router.put("/{season_id}", response_model=SeasonOut)
-def update_season(season_id: int, season_update: SeasonUpdate, current_user=Depends(get_current_user)):
+def update_season(season_id: int, season_update: SeasonUpdate, current_user=Depends(get_token_user)):
     updated = crud.update_season(season_id, season_update.model_dump(exclude_unset=True), current_user.id)
     if not updated:
         raise HTTPException(status_code=404, detail="Сезон не найден")
@@ -56,7 +56,7 @@ def update_season(season_id: int, season_update: SeasonUpdate, current_user=Depe
 
 
 @router.delete("/{season_id}")
-def delete_season(season_id: int, current_user=Depends(get_current_user)):
+def delete_season(season_id: int, current_user=Depends(get_token_user)):
     ok = crud.delete_season(season_id, current_user.id)
     if not ok:
         raise HTTPException(status_code=404, detail="Сезон не найден")
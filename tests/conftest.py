@@ -0,0 +1,69 @@
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# БД и каталоги тестов задаются до импорта db.models и app.config
+_tmp_dir = tempfile.mkdtemp(prefix="agro-tests-")
+os.environ["DB_PROVIDER"] = "sqlite"
+os.environ["SQLITE_FILENAME"] = os.path.join(_tmp_dir, "test.sqlite")
+os.environ["FIELD_TILE_CACHE_DIR"] = os.path.join(_tmp_dir, "tiles")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from pony.orm import db_session, select  # noqa: E402
+
+from db.migrations import prepare_database  # noqa: E402
+from db.models import User, Crop, Season, Field, FieldGroup  # noqa: E402
+from db.seeder import create_detailed_seed_data, create_crop_economics_seed_data  # noqa: E402
+from fields.crud import create_field  # noqa: E402
+
+prepare_database()
+create_detailed_seed_data()
+create_crop_economics_seed_data()
+
+_counter = iter(range(1, 10 ** 9))
+
+
+@pytest.fixture
+def owner_id() -> int:
+    with db_session:
+        user = User(email=f"user{next(_counter)}@example.com", password_hash="x")
+    return user.id
+
+
+@pytest.fixture
+def season_id(owner_id) -> int:
+    with db_session:
+        season = Season(
+            owner=owner_id, name="2024", date_start=datetime(2024, 3, 1), date_end=datetime(2024, 10, 1)
+        )
+    return season.id
+
+
+@pytest.fixture
+def crop_ids() -> list[int]:
+    with db_session:
+        return select(c.id for c in Crop).order_by(1)[:]
+
+
+@pytest.fixture
+def make_field(owner_id):
+    """Фабрика полей владельца owner_id: квадраты 0.01° друг над другом"""
+    def make(index: int = 0) -> int:
+        lat, lon = 47 + index * 0.02, 39.0
+        coordinates = [[lat, lon], [lat + 0.01, lon], [lat + 0.01, lon + 0.01], [lat, lon + 0.01], [lat, lon]]
+        return create_field(owner_id, f"Поле {index}", None, coordinates, "чернозём")["id"]
+
+    return make
+
+
+@pytest.fixture
+def make_group(owner_id):
+    """Фабрика групп владельца owner_id из переданных полей"""
+    def make(*field_ids: int) -> int:
+        with db_session:
+            group = FieldGroup(owner=owner_id, name="Группа", fields=[Field[field_id] for field_id in field_ids])
+        return group.id
+
+    return make
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from pony.orm import db_session
+
+from app.config import settings
+from auth import crud
+from auth.deps import TokenUser, get_token_user, user_cache
+from auth.security import create_access_token
+from db.models import RefreshToken, User
+
+
+def _credentials(user_id: int, token_version: int) -> HTTPAuthorizationCredentials:
+    token = create_access_token(
+        user_id, settings.SECRET_KEY, settings.ALGORITHM, settings.ACCESS_TOKEN_EXPIRE_MINUTES, token_version
+    )
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def _rejection(credentials: HTTPAuthorizationCredentials) -> str:
+    with pytest.raises(HTTPException) as error:
+        get_token_user(credentials)
+    assert error.value.status_code == 401
+    return error.value.detail
+
+
+def test_token_user_comes_from_claims_and_cached_version(owner_id):
+    credentials = _credentials(owner_id, 0)
+
+    assert get_token_user(credentials) == TokenUser(id=owner_id, token_version=0)
+    hits = user_cache.hits
+    # Повторная проверка — без обращения к БД
+    assert get_token_user(credentials).id == owner_id
+    assert user_cache.hits == hits + 1
+
+
+def test_revoked_and_orphaned_tokens_are_rejected(owner_id):
+    old = _credentials(owner_id, 0)
+    get_token_user(old)
+
+    crud.revoke_user_tokens(owner_id)
+
+    assert _rejection(old) == "Token revoked"
+    assert get_token_user(_credentials(owner_id, 1)).token_version == 1
+
+    with db_session:
+        User[owner_id].delete()
+    assert _rejection(_credentials(owner_id, 1)) == "User not found"
+
+
+def test_invalid_token_is_rejected():
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="not-a-token")
+
+    assert _rejection(credentials) == "Invalid token"
+
+
+def test_concurrent_refresh_with_same_token_is_treated_as_reuse(owner_id, monkeypatch):
+    token = crud.issue_refresh_token(owner_id)
+    competitor = []
+
+    class Clock(datetime):
+        @classmethod
+        def utcnow(cls):
+            # Параллельный запрос с тем же токеном обменивает его между
+            # чтением токена и записью этого запроса
+            if not competitor:
+                competitor.append(None)
+                with ThreadPoolExecutor(1) as executor:
+                    competitor[0] = executor.submit(crud.rotate_refresh_token, token).result()
+            return datetime.utcnow()
+
+    monkeypatch.setattr(crud, "datetime", Clock)
+    with pytest.raises(ValueError, match="Refresh token reused"):
+        crud.rotate_refresh_token(token)
+
+    assert competitor[0]["user_id"] == owner_id
+    with db_session:
+        assert not RefreshToken.select(lambda t: t.user.id == owner_id and t.revoked_at is None).exists()
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+from pony.orm import db_session
+
+from db.models import db, Planting
+from fields.crud import get_all_fields_with_plantings
+
+
+def _selects(func, *args, **kwargs) -> tuple[int, list]:
+    """Число SELECT, выполненных вызовом, по локальной статистике Pony"""
+    db.merge_local_stats()
+    result = func(*args, **kwargs)
+    count = sum(
+        stat.db_count for sql, stat in db.local_stats.items()
+        if sql is not None and sql.lstrip().upper().startswith("SELECT")
+    )
+    return count, result
+
+
+@pytest.mark.parametrize("fields_count", [1, 25])
+def test_fields_with_plantings_use_two_selects(owner_id, make_field, season_id, crop_ids, fields_count):
+    field_ids = [make_field(index) for index in range(fields_count)]
+    with db_session:
+        for field_id in field_ids:
+            for crop_id in crop_ids[:3]:
+                Planting(field=field_id, crop=crop_id, season=season_id, planting_date=datetime(2024, 4, 1))
+
+    selects, fields = _selects(get_all_fields_with_plantings, owner_id)
+
+    assert selects == 2
+    assert [field["id"] for field in fields] == field_ids
+    assert all(len(field["plantings"]) == 3 for field in fields)
+    assert all(planting["crop_family"] and planting["season"] == "2024"
+               for field in fields for planting in field["plantings"])
+
+
+def test_fields_with_plantings_page_uses_two_selects(owner_id, make_field, season_id, crop_ids):
+    field_ids = [make_field(index) for index in range(5)]
+    with db_session:
+        for field_id in field_ids:
+            Planting(field=field_id, crop=crop_ids[0], season=season_id, planting_date=datetime(2024, 4, 1))
+
+    selects, fields = _selects(get_all_fields_with_plantings, owner_id, after_id=field_ids[0], limit=2)
+
+    assert selects == 2
+    assert [field["id"] for field in fields] == field_ids[1:3]
@@ -0,0 +1,16 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from auth.security import create_access_token
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("path", ["/api/fields/tiles/stats", "/api/fields/index/stats"])
+def test_stats_require_token(owner_id, path):
+    token = create_access_token(owner_id, settings.SECRET_KEY, settings.ALGORITHM, 5)
+
+    assert client.get(path).status_code in (401, 403)
+    assert client.get(path, headers={"Authorization": f"Bearer {token}"}).status_code == 200
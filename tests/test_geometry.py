@@ -0,0 +1,127 @@
+import math
+
+import numpy as np
+import pytest
+
+from fields import geometry
+
+
+def _square(lat: float, lon: float, side_m: float) -> list[list[float]]:
+    """Квадрат со стороной side_m метров и юго-западным углом в (lat, lon)"""
+    dlat = side_m / geometry.METERS_PER_DEGREE
+    dlon = dlat / math.cos(math.radians(lat + dlat / 2))
+    return [[lat, lon], [lat + dlat, lon], [lat + dlat, lon + dlon], [lat, lon + dlon], [lat, lon]]
+
+
+@pytest.mark.parametrize("lat", [0, 47.5, 60])
+def test_area_of_square_kilometre(lat):
+    ring = geometry.ring_array(_square(lat, 39.0, 1000))
+
+    assert geometry.geodesic_area_ha(ring) == pytest.approx(100, rel=1e-3)
+
+
+def test_area_does_not_depend_on_orientation_and_closing_point():
+    square = _square(47.5, 39.0, 1000)
+
+    areas = {
+        round(geometry.geodesic_area_ha(geometry.ring_array(coordinates)), 6)
+        for coordinates in (square, square[:-1], square[::-1])
+    }
+
+    assert len(areas) == 1
+
+
+def test_area_across_antimeridian():
+    square = [[lat, lon - 360 if lon > 180 else lon] for lat, lon in _square(10, 179.995, 1000)]
+
+    assert geometry.geodesic_area_ha(geometry.ring_array(square)) == pytest.approx(100, rel=1e-3)
+
+
+def test_centroid_of_symmetric_polygon_is_its_centre():
+    # Правильный восьмиугольник вокруг (55.75, 37.62) в локальной проекции
+    angles = np.linspace(0, 2 * math.pi, 8, endpoint=False)
+    lat = 55.75 + 0.01 * np.sin(angles)
+    lon = 37.62 + 0.01 * np.cos(angles) / math.cos(math.radians(55.75))
+
+    centroid = geometry.centroid(np.column_stack((lat, lon)))
+
+    assert centroid == pytest.approx((55.75, 37.62), abs=1e-9)
+
+
+def test_centroid_of_triangle_is_mean_of_vertices():
+    ring = np.array([[47.0, 39.0], [47.03, 39.01], [47.01, 39.05]])
+
+    assert geometry.centroid(ring) == pytest.approx(tuple(ring.mean(axis=0)), abs=1e-9)
+
+
+def test_compute_fills_bbox_and_centroid():
+    result = geometry.compute(_square(47.0, 39.0, 1000))
+
+    assert result.area_ha == pytest.approx(100, rel=1e-3)
+    assert result.bbox[:2] == [47.0, 39.0]
+    assert result.min_lat < result.centroid_lat < result.max_lat
+    assert result.min_lon < result.centroid_lon < result.max_lon
+    assert result.centroid == pytest.approx(
+        [(result.min_lat + result.max_lat) / 2, (result.min_lon + result.max_lon) / 2]
+    )
+
+
+def _noisy_circle(points: int = 400, radius_m: float = 600, seed: int = 0) -> list[list[float]]:
+    """Неровный контур поля: окружность с шумом радиуса до 5%"""
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * math.pi, points, endpoint=False)
+    radii = radius_m * (1 + 0.05 * rng.uniform(-1, 1, points)) / geometry.METERS_PER_DEGREE
+    lat = 47.0 + radii * np.sin(angles)
+    lon = 39.0 + radii * np.cos(angles) / math.cos(math.radians(47.0))
+    coordinates = np.column_stack((lat, lon)).tolist()
+    return coordinates + coordinates[:1]
+
+
+def _segments_cross(p1, p2, q1, q2) -> bool:
+    def side(a, b, c):
+        return np.sign((b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]))
+
+    return side(p1, p2, q1) * side(p1, p2, q2) < 0 and side(q1, q2, p1) * side(q1, q2, p2) < 0
+
+
+def _assert_valid_ring(ring: list[list[float]]):
+    assert ring[0] == ring[-1]
+    assert len(ring) >= 4
+    assert len({tuple(point) for point in ring[:-1]}) == len(ring) - 1
+    edges = list(zip(ring[:-1], ring[1:]))
+    for i, (p1, p2) in enumerate(edges):
+        for j in range(i + 2, len(edges)):
+            if i == 0 and j == len(edges) - 1:
+                continue
+            assert not _segments_cross(p1, p2, *edges[j]), f"рёбра {i} и {j} пересекаются"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pyramid_levels_shrink_and_stay_valid_rings(seed):
+    coordinates = _noisy_circle(seed=seed)
+    original = {tuple(np.round(point, 6)) for point in coordinates}
+
+    pyramid = geometry.compute(coordinates).simplified
+
+    assert list(pyramid) == list(geometry.SIMPLIFY_TOLERANCES_M)
+    counts = [len(pyramid[tolerance]) for tolerance in geometry.SIMPLIFY_TOLERANCES_M]
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] < len(coordinates)
+    for ring in pyramid.values():
+        _assert_valid_ring(ring)
+        # Упрощение только отбрасывает вершины
+        assert {tuple(point) for point in ring} <= original
+
+
+def test_pyramid_area_stays_close_at_fine_levels():
+    result = geometry.compute(_noisy_circle())
+
+    for tolerance in (2, 5, 25):
+        ring = geometry.ring_array(result.simplified[tolerance])
+        assert geometry.geodesic_area_ha(ring) == pytest.approx(result.area_ha, rel=0.05)
+
+
+def test_simplification_keeps_small_polygon_intact():
+    square = [[47.0, 39.0], [47.0001, 39.0], [47.0001, 39.0001], [47.0, 39.0001], [47.0, 39.0]]
+
+    assert geometry.simplify(geometry.ring_array(square), 500) == square
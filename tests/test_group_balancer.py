@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from recommendations.group_balancer import balance_group
+
+client = TestClient(app)
+
+
+def _instance(seed: int, fields: int = 40, crops: int = 6):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(0, 150, (fields, crops)).astype(np.int64)
+    allowed = rng.random((fields, crops)) > 0.2
+    areas = rng.uniform(5, 50, fields)
+    return scores, allowed, areas
+
+
+def _shares(result, areas) -> np.ndarray:
+    return result.loads / areas.sum()
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_assignment_respects_share_limits(seed):
+    scores, allowed, areas = _instance(seed)
+    # Лучшие культуры ограничены сверху, слабая — обязательна снизу
+    max_share = np.full(6, 0.3)
+    min_share = np.zeros(6)
+    min_share[int(np.argmin(scores.sum(axis=0)))] = 0.1
+
+    result = balance_group(scores, allowed, areas, max_share, min_share)
+
+    assert result.feasible
+    shares = _shares(result, areas)
+    assert np.all(shares <= max_share + 1e-9)
+    assert np.all(shares >= min_share - 1e-9)
+    assert np.allclose(result.loads, np.bincount(result.assignment, weights=areas, minlength=6))
+    assert result.total_score == int(scores[np.arange(len(areas)), result.assignment].sum())
+
+
+def test_unconstrained_assignment_takes_best_allowed_crop():
+    scores, allowed, areas = _instance(0)
+
+    result = balance_group(scores, allowed, areas, np.ones(6), np.zeros(6))
+
+    best = np.where(allowed, scores, -1).max(axis=1)
+    assert result.feasible
+    assert np.array_equal(scores[np.arange(len(areas)), result.assignment], best)
+
+
+def test_contradictory_min_shares_are_reported_infeasible():
+    scores, allowed, areas = _instance(1)
+    min_share = np.array([0.4, 0.4, 0.4, 0, 0, 0])
+
+    result = balance_group(scores, allowed, areas, np.ones(6), min_share, time_budget=0.2)
+
+    assert not result.feasible
+
+
+def test_unknown_crop_in_share_limits_is_400(make_field, make_group):
+    group_id = make_group(make_field())
+
+    response = client.post(
+        f"/api/recommendations/group/{group_id}/balance",
+        json={"target_year": 2030, "share_limits": [{"crop_id": 10 ** 9, "max_share": 0.5}]}
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,32 @@
+from pony.orm import db_session, select
+
+from db.migrations import ADDED_COLUMNS, migrate_schema
+from db.models import db, User, Field
+
+
+def _drop_added_columns():
+    # Схема до появления колонок: как у развёрнутой ранее БД
+    with db_session:
+        for entity_name, column, _, _, indexed in ADDED_COLUMNS:
+            if indexed:
+                db.execute(f'DROP INDEX IF EXISTS "{db.provider.get_default_index_name(entity_name, [column])}"')
+            db.execute(f'ALTER TABLE "{entity_name}" DROP COLUMN "{column}"')
+
+
+def test_migration_adds_missing_columns_once(owner_id, make_field):
+    make_field()
+    _drop_added_columns()
+
+    added = migrate_schema()
+
+    assert sorted(added) == sorted(f"{entity_name}.{column}" for entity_name, column, *_ in ADDED_COLUMNS)
+    assert migrate_schema() == []
+    with db_session:
+        indexes = set(db.select("SELECT name FROM sqlite_master WHERE type = 'index'"))
+    assert all(
+        db.provider.get_default_index_name(entity_name, [column]) in indexes
+        for entity_name, column, _, _, indexed in ADDED_COLUMNS if indexed
+    )
+    with db_session:
+        assert User[owner_id].token_version == 0
+        assert select(f for f in Field if f.owner.id == owner_id).count() == 1
@@ -0,0 +1,41 @@
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from calculator import price_history
+
+client = TestClient(app)
+
+
+def _simulate(culture: str, **params) -> dict:
+    response = client.post("/api/calculator/monte-carlo", json={
+        "culture": culture, "area": 100, "simulations": 1000, **params
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_same_seed_gives_same_distributions():
+    # Цена из справочника — расчёт не обращается к бирже
+    first = _simulate("Ячмень", volatility=0.2, seed=7)
+    second = _simulate("Ячмень", volatility=0.2, seed=7)
+    other = _simulate("Ячмень", volatility=0.2, seed=8)
+
+    for name in ("price_distribution", "yield_distribution", "profit_distribution"):
+        assert first[name] == second[name]
+        assert first[name] != other[name]
+
+
+def test_volatility_without_enough_history_is_400():
+    price_history.record_quotes([{
+        "prefix": "WHEAT", "secid": "W4H5", "trade_date": date(2024, 3, 1),
+        "price": 15000, "expires_at": None, "source": price_history.SOURCE_HISTORY
+    }])
+
+    response = client.post("/api/calculator/monte-carlo", json={
+        "culture": "Пшеница", "area": 100, "simulations": 1000, "pricing": "latest"
+    })
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Недостаточно истории котировок для оценки волатильности"
@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+from pony.orm import db_session
+
+from app.config import settings
+from app.main import app
+from auth.security import create_access_token
+from db.models import User
+
+client = TestClient(app)
+
+
+def _headers(user_id: int) -> dict:
+    token = create_access_token(user_id, settings.SECRET_KEY, settings.ALGORITHM, 5)
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def scopes(season_id, make_field, make_group) -> list[str]:
+    return [f"season_id={season_id}", f"group_id={make_group(make_field())}"]
+
+
+def test_portfolio_requires_token(scopes):
+    for scope in scopes:
+        assert client.get(f"/api/calculator/portfolio?{scope}").status_code in (401, 403)
+
+
+def test_portfolio_of_another_user_is_404(owner_id, scopes):
+    with db_session:
+        stranger = User(email=f"stranger{owner_id}@example.com", password_hash="x")
+
+    for scope in scopes:
+        assert client.get(f"/api/calculator/portfolio?{scope}", headers=_headers(owner_id)).status_code == 200
+        assert client.get(f"/api/calculator/portfolio?{scope}", headers=_headers(stranger.id)).status_code == 404
+
+
+def test_missing_season_is_404(owner_id):
+    response = client.get(f"/api/calculator/portfolio?season_id={10 ** 9}", headers=_headers(owner_id))
+
+    assert response.status_code == 404
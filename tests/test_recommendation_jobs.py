@@ -0,0 +1,36 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def _wait_finished(url: str) -> dict:
+    for _ in range(100):
+        job = client.get(url).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("Задача не завершилась")
+
+
+def test_background_generation_is_accepted_with_job_location(make_field):
+    field_id = make_field()
+
+    response = client.post(f"/api/recommendations/field/{field_id}/generate?background=true&target_year=2030")
+
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["location"].endswith(f"/api/recommendations/jobs/{job['job_id']}")
+    assert _wait_finished(response.headers["location"])["status"] == "done"
+
+
+def test_synchronous_generation_returns_result(make_field):
+    field_id = make_field()
+
+    response = client.post(f"/api/recommendations/field/{field_id}/generate?target_year=2030")
+
+    assert response.status_code == 200
+    assert response.json()["generated_count"] > 0
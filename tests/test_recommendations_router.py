@@ -0,0 +1,23 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+MISSING_ID = 10 ** 9
+
+
+@pytest.mark.parametrize("method, url", [
+    ("get", f"/api/recommendations/field/{MISSING_ID}"),
+    ("get", f"/api/recommendations/field/{MISSING_ID}/plan"),
+    ("get", f"/api/recommendations/user/{MISSING_ID}/fields"),
+    ("get", f"/api/recommendations/group/{MISSING_ID}"),
+    ("post", f"/api/recommendations/group/{MISSING_ID}/balance"),
+])
+def test_missing_object_is_404(method, url):
+    kwargs = {"json": {}} if method == "post" else {}
+
+    response = getattr(client, method)(url, **kwargs)
+
+    assert response.status_code == 404
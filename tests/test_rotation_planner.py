@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from recommendations.rotation_planner import plan_rotation
+from recommendations.rule_index import COMPAT_BAD
+from recommendations.vector_scoring import CropArrays, FieldState
+
+START_YEAR = 2030
+
+
+def _arrays(seed: int, size: int = 8) -> CropArrays:
+    rng = np.random.default_rng(seed)
+    return CropArrays(
+        version=seed,
+        ids=np.arange(1, size + 1, dtype=np.int64),
+        rotation_interval=rng.integers(1, 5, size).astype(np.int64),
+        family=rng.integers(0, 3, size).astype(np.int64),
+        crop_type=rng.integers(0, 3, size).astype(np.int64),
+        ph=np.zeros(size, dtype=np.int8),
+        high_demand=np.zeros(size, dtype=bool),
+        compatibility=rng.choice([-1, -1, 0, 1], size=(size, size)).astype(np.int8)
+    )
+
+
+def _state(history: list[int]) -> FieldState:
+    # Посадки прошлых лет — от последней к ранним
+    return FieldState(
+        history=np.array(history, dtype=np.int64),
+        years=np.arange(START_YEAR - 1, START_YEAR - 1 - len(history), -1, dtype=np.int64)
+    )
+
+
+def _assert_rotation_rules(arrays: CropArrays, state: FieldState, plan):
+    planted = dict(zip(state.years.tolist(), state.history.tolist()))
+    for step in plan.steps:
+        last_years = [year for year, crop in planted.items() if crop == step.crop_index]
+        if last_years:
+            assert step.year - max(last_years) >= arrays.rotation_interval[step.crop_index]
+
+        previous = planted.get(step.year - 1)
+        if previous is not None:
+            assert arrays.compatibility[previous, step.crop_index] != COMPAT_BAD
+        planted[step.year] = step.crop_index
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_plans_respect_intervals_and_forbidden_predecessors(seed):
+    arrays = _arrays(seed)
+    state = _state([seed % 8, (seed + 3) % 8])
+
+    plans, truncated = plan_rotation(arrays, state, START_YEAR, years=5, plans=5, time_budget=10)
+
+    assert not truncated
+    for plan in plans:
+        assert [step.year for step in plan.steps] == list(range(START_YEAR, START_YEAR + 5))
+        assert plan.total_score == sum(step.score for step in plan.steps)
+        _assert_rotation_rules(arrays, state, plan)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_plans_are_sorted_by_total_score(seed):
+    plans, _ = plan_rotation(_arrays(seed), _state([0]), START_YEAR, years=4, plans=10, time_budget=10)
+
+    scores = [plan.total_score for plan in plans]
+    assert len(plans) > 1
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_exhausted_budget_truncates_and_completes_plans_greedily():
+    arrays = _arrays(0)
+    state = _state([1])
+
+    plans, truncated = plan_rotation(arrays, state, START_YEAR, years=4, plans=3, time_budget=0)
+
+    assert truncated
+    assert plans
+    for plan in plans:
+        assert len(plan.steps) == 4
+        _assert_rotation_rules(arrays, state, plan)
+
+
+def test_crop_with_interval_longer_than_plan_is_planted_once():
+    arrays = _arrays(0, size=2)
+    arrays = CropArrays(
+        **{**arrays.__dict__, "rotation_interval": np.array([10, 1]), "compatibility": np.zeros((2, 2), np.int8)}
+    )
+
+    plans, _ = plan_rotation(arrays, _state([]), START_YEAR, years=3, plans=10, time_budget=10)
+
+    for plan in plans:
+        assert [step.crop_index for step in plan.steps].count(0) <= 1
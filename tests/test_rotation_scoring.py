@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from pony.orm import db_session
+
+from db.models import db, Planting
+from recommendations.crop_rotation_service import CropRotationService
+from recommendations.rule_index import rule_index
+
+
+def _insert_crop_behind_hooks(template_id: int) -> int:
+    # Культура «из другого воркера»: хуки этого процесса о ней не знают
+    with db_session:
+        db.execute("""
+            INSERT INTO Crop (name, latin_name, family, appetite_level, crop_type, nutrient_demand,
+                              water_demand, disease_risk, preferred_ph, recommended_rotation_interval, created_at)
+            SELECT 'Новая культура', latin_name, family, appetite_level, crop_type, nutrient_demand,
+                   water_demand, disease_risk, preferred_ph, recommended_rotation_interval, created_at
+            FROM Crop WHERE id = $template_id
+        """)
+        return db.select("SELECT max(id) FROM Crop")[0]
+
+
+def test_history_with_crop_unknown_to_cached_matrix(make_field, season_id, crop_ids):
+    field_id = make_field()
+    rule_index.get()
+    crop_id = _insert_crop_behind_hooks(crop_ids[0])
+    assert crop_id not in rule_index.get().crops
+
+    with db_session:
+        Planting(field=field_id, crop=crop_id, season=season_id, planting_date=datetime(2024, 4, 1))
+
+    recommendations = CropRotationService().get_rotation_recommendations(field_id, 2025)
+
+    assert recommendations
+    assert crop_id in rule_index.get().crops
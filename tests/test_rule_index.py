@@ -0,0 +1,64 @@
+import time
+
+from pony.orm import db_session, select
+
+from db.models import db, Crop, CropRotationRule
+from recommendations.rule_index import RuleIndex
+
+
+def _rename_crop(crop_id: int, name: str):
+    with db_session:
+        Crop[crop_id].name = name
+
+
+def test_matrix_matches_rotation_rules():
+    matrix = RuleIndex().get()
+    with db_session:
+        rules = select((r.previous_crop.id, r.next_crop.id, r.compatibility) for r in CropRotationRule)[:]
+        crop_families = dict(select((c.id, c.family.id) for c in Crop))
+
+    assert rules
+    assert [crop.id for crop in matrix.crops_list] == sorted(crop_families)
+    assert all(matrix.crops_list[crop.index] is crop for crop in matrix.crops.values())
+    for previous_id, next_id, compatibility in rules:
+        assert matrix.compatibility_of(previous_id, next_id) == compatibility
+
+    # Пары без правила нейтральны
+    ruled = {(previous_id, next_id) for previous_id, next_id, _ in rules}
+    for previous in matrix.crops_list:
+        for following in matrix.crops_list:
+            if (previous.id, following.id) not in ruled:
+                assert matrix.compatibility_of(previous.id, following.id) is None
+
+    for crop_id, family_id in crop_families.items():
+        assert crop_id in matrix.crops_by_family[family_id]
+
+
+def test_followers_and_predecessors_follow_rules():
+    matrix = RuleIndex().get()
+    with db_session:
+        rules = select((r.previous_crop.id, r.next_crop.id, r.compatibility) for r in CropRotationRule)[:]
+
+    for crop_id in matrix.crops:
+        for compatibility in ("good", "bad"):
+            followers = {entry["crop_id"] for entry in matrix.followers(crop_id, compatibility)}
+            predecessors = {entry["crop_id"] for entry in matrix.predecessors(crop_id, compatibility)}
+            assert followers == {n for p, n, c in rules if p == crop_id and c == compatibility}
+            assert predecessors == {p for p, n, c in rules if n == crop_id and c == compatibility}
+
+
+def test_ttl_picks_up_changes_from_other_workers(crop_ids):
+    crop_id = crop_ids[0]
+    index = RuleIndex(ttl_seconds=0.05)
+    original = index.get().crops[crop_id].name
+
+    try:
+        # Изменение «из другого воркера»: SQL в обход хуков этого процесса
+        with db_session:
+            db.execute("UPDATE Crop SET name = 'Из другого воркера' WHERE id = $crop_id")
+        assert index.get().crops[crop_id].name == original
+
+        time.sleep(0.1)
+        assert index.get().crops[crop_id].name == "Из другого воркера"
+    finally:
+        _rename_crop(crop_id, original)
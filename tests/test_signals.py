@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+from pony.orm import db_session, flush
+
+from db.models import Field, Planting
+from recommendations.cache import recommendation_cache
+
+
+def _cached(field_id: int, value: str) -> str:
+    # Чтение кэша рекомендаций: compute вызывается только при промахе
+    return recommendation_cache.get_or_compute(field_id, 2030, 5, lambda: value)
+
+
+def _plant(field_id: int, season_id: int, crop_id: int):
+    Planting(field=field_id, crop=crop_id, season=season_id, planting_date=datetime(2024, 4, 1))
+
+
+def test_read_between_flush_and_commit_is_not_served_after_commit(make_field, season_id, crop_ids):
+    field_id = make_field()
+    assert _cached(field_id, "исходные данные") == "исходные данные"
+
+    with db_session:
+        _plant(field_id, season_id, crop_ids[0])
+        flush()
+        # Хуки уже сработали, транзакция ещё не зафиксирована: параллельное
+        # чтение видит старые данные и кэширует их
+        assert _cached(field_id, "до коммита") == "исходные данные"
+
+    assert _cached(field_id, "после коммита") == "после коммита"
+
+
+def test_rollback_keeps_cache(make_field, season_id, crop_ids):
+    field_id = make_field()
+    _cached(field_id, "исходные данные")
+
+    with pytest.raises(RuntimeError):
+        with db_session:
+            _plant(field_id, season_id, crop_ids[0])
+            flush()
+            raise RuntimeError
+
+    assert _cached(field_id, "после отката") == "исходные данные"
+
+
+def test_cascade_delete_invalidates_after_commit(make_field, season_id, crop_ids):
+    field_id = make_field()
+    with db_session:
+        _plant(field_id, season_id, crop_ids[0])
+    _cached(field_id, "с посадкой")
+
+    with db_session:
+        Field[field_id].delete()
+        flush()
+        assert _cached(field_id, "до коммита") == "с посадкой"
+
+    assert _cached(field_id, "после удаления") == "после удаления"
@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+import pytest
+from pony.orm import db_session
+
+from db.models import db
+from fields.geometry import METERS_PER_DEGREE
+from fields.spatial_index import SpatialIndex, distance_to_ring_m
+
+
+def _ids_at(index: SpatialIndex, owner_id: int) -> list[int]:
+    return index.get(owner_id).at_point(47.005, 39.005)
+
+
+def test_bbox_and_point_queries(owner_id, make_field):
+    # Квадраты 0.01° на широтах 47.00, 47.02, 47.04 с зазорами 0.01°
+    fields = [make_field(index) for index in range(3)]
+    grid = SpatialIndex(0.005).get(owner_id)
+
+    assert sorted(grid.in_bbox(46.9, 38.9, 47.1, 39.1)) == sorted(fields)
+    assert sorted(grid.in_bbox(47.005, 39.0, 47.025, 39.005)) == fields[:2]
+    # Окно в зазоре между полями и окно целиком внутри поля
+    assert grid.in_bbox(47.011, 39.0, 47.019, 39.01) == []
+    assert grid.in_bbox(47.021, 39.001, 47.029, 39.009) == [fields[1]]
+
+    assert grid.at_point(47.025, 39.005) == [fields[1]]
+    assert grid.at_point(47.015, 39.005) == []
+    assert grid.at_point(47.025, 39.02) == []
+
+
+def test_nearest_matches_brute_force(owner_id, make_field):
+    fields = [make_field(index) for index in range(3)]
+    grid = SpatialIndex(0.005).get(owner_id)
+    rng = np.random.default_rng(0)
+
+    for lat, lon in zip(rng.uniform(46.95, 47.1, 30), rng.uniform(38.95, 39.06, 30)):
+        expected = sorted(
+            (round(distance_to_ring_m(grid.rings[i], lat, lon), 2), int(grid.field_ids[i]))
+            for i in range(len(fields))
+        )
+        assert [(d, f) for f, d in grid.nearest(lat, lon, 2)] == expected[:2]
+
+
+def test_nearest_distances_in_metres(owner_id, make_field):
+    fields = [make_field(index) for index in range(2)]
+    grid = SpatialIndex(0.005).get(owner_id)
+
+    # 0.002° к северу от первого поля и 0.008° к югу от второго
+    (first, first_m), (second, second_m) = grid.nearest(47.012, 39.005, 5)
+
+    assert (first, second) == (fields[0], fields[1])
+    assert first_m == pytest.approx(0.002 * METERS_PER_DEGREE, rel=1e-3)
+    assert second_m == pytest.approx(0.008 * METERS_PER_DEGREE, rel=1e-3)
+    assert grid.nearest(47.012, 39.005, 5, max_distance_m=500) == [(first, first_m)]
+    assert grid.at_point(47.005, 39.005) == [fields[0]]
+    assert grid.nearest(47.005, 39.005, 1) == [(fields[0], 0)]
+
+
+def test_stale_check_picks_up_changes_from_other_workers(owner_id, make_field):
+    index = SpatialIndex(0.05, check_seconds=0.05)
+    field_id = make_field()
+    assert _ids_at(index, owner_id) == [field_id]
+
+    # Удаление «из другого воркера»: SQL в обход хуков этого процесса
+    with db_session:
+        db.execute("DELETE FROM Field WHERE id = $field_id")
+    assert _ids_at(index, owner_id) == [field_id]
+
+    time.sleep(0.1)
+    assert _ids_at(index, owner_id) == []
+    assert index.stats()["stale_checks"] == 1
@@ -0,0 +1,260 @@
+import math
+import os
+
+import numpy as np
+import pytest
+from pony.orm import db_session
+
+from db.models import Field
+from fields.tiles import build_tile, encode_tile, project, tile_cache
+
+EXTENT = 4096
+BUFFER = 64
+
+
+# --- Независимый разбор MVT: protobuf, команды геометрии, таблицы тегов ---
+
+def _read_varint(data: bytes, position: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def _messages(data: bytes) -> list[tuple[int, int | bytes]]:
+    """Поля сообщения protobuf: [(номер, varint или байты)]"""
+    fields, position = [], 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, position = _read_varint(data, position)
+        elif wire_type == 2:
+            length, position = _read_varint(data, position)
+            value, position = data[position:position + length], position + length
+        else:
+            raise AssertionError(f"Неожиданный тип поля {wire_type}")
+        fields.append((number, value))
+    return fields
+
+
+def _packed(data: bytes) -> list[int]:
+    values, position = [], 0
+    while position < len(data):
+        value, position = _read_varint(data, position)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _rings(commands: list[int]) -> list[list[tuple[int, int]]]:
+    rings, ring = [], None
+    x = y = position = 0
+    while position < len(commands):
+        command, count = commands[position] & 0x7, commands[position] >> 3
+        position += 1
+        if command == 7:
+            assert count == 1 and len(ring) >= 3
+            rings.append(ring)
+            continue
+        assert command in (1, 2)
+        assert command == 2 or count == 1
+        if command == 1:
+            ring = []
+        for _ in range(count):
+            x += _unzigzag(commands[position])
+            y += _unzigzag(commands[position + 1])
+            position += 2
+            ring.append((x, y))
+    return rings
+
+
+def decode_tile(data: bytes) -> dict:
+    """{имя слоя: {"version", "extent", "features": [(id, тип, атрибуты, кольца)]}}"""
+    layers = {}
+    for number, layer_data in _messages(data):
+        assert number == 3
+        layer = dict(version=1, extent=4096, raw_features=[], keys=[], values=[])
+        for field, value in _messages(layer_data):
+            if field == 1:
+                layer["name"] = value.decode()
+            elif field == 2:
+                layer["raw_features"].append(value)
+            elif field == 3:
+                layer["keys"].append(value.decode())
+            elif field == 4:
+                (string_field, string), = _messages(value)
+                assert string_field == 1
+                layer["values"].append(string.decode())
+            elif field == 5:
+                layer["extent"] = value
+            elif field == 15:
+                layer["version"] = value
+
+        features = []
+        for raw in layer.pop("raw_features"):
+            feature = dict(_messages(raw))
+            tags = _packed(feature.get(2, b""))
+            attributes = {
+                layer["keys"][key]: layer["values"][value] for key, value in zip(tags[::2], tags[1::2])
+            }
+            features.append((feature.get(1), feature[3], attributes, _rings(_packed(feature[4]))))
+        layers[layer.pop("name")] = {
+            "version": layer["version"], "extent": layer["extent"], "features": features
+        }
+    return layers
+
+
+def _tile_of(lat: float, lon: float, z: int) -> tuple[int, int]:
+    n = 2 ** z
+    lat_rad = math.radians(lat)
+    return int((lon + 180) / 360 * n), int((1 - math.asinh(math.tan(lat_rad)) / math.pi) / 2 * n)
+
+
+def _tile(owner_id: int, value: bytes) -> bytes:
+    tile, _ = tile_cache.get_or_build(owner_id, 10, 1, 1, lambda: value)
+    return tile
+
+
+def _wait_cleanup():
+    tile_cache._cleanup.submit(lambda: None).result()
+
+
+def test_first_build_racing_with_field_update_is_not_served(owner_id, make_field):
+    field_id = make_field()
+
+    def build():
+        # Поле изменено и зафиксировано, пока строился первый тайл владельца
+        with db_session:
+            Field[field_id].name = "Переименованное"
+        return b"stale"
+
+    assert tile_cache.get_or_build(owner_id, 10, 1, 1, build) == (b"stale", False)
+    assert _tile(owner_id, b"fresh") == b"fresh"
+
+
+def test_stale_epochs_are_removed_in_background(owner_id, make_field):
+    field_id = make_field()
+    _tile(owner_id, b"old")
+    old_epoch = tile_cache._epoch(owner_id)
+
+    with db_session:
+        Field[field_id].name = "Переименованное"
+    _wait_cleanup()
+
+    owner_dir = os.path.join(tile_cache.root, str(owner_id))
+    assert not os.path.exists(os.path.join(owner_dir, old_epoch))
+    assert tile_cache._epoch(owner_id) != old_epoch
+
+
+def test_tile_is_served_when_epoch_directory_cannot_be_written(owner_id):
+    epoch_path = os.path.join(tile_cache.root, str(owner_id), tile_cache._epoch(owner_id))
+
+    def build():
+        # Параллельная очистка удалила каталог эпохи, на его месте — файл
+        os.makedirs(os.path.dirname(epoch_path), exist_ok=True)
+        with open(epoch_path, "w"):
+            pass
+        return b"tile"
+
+    failures = tile_cache.write_failures
+    assert tile_cache.get_or_build(owner_id, 10, 1, 1, build) == (b"tile", False)
+    assert tile_cache.write_failures == failures + 1
+
+
+def test_field_without_pyramid_is_drawn_from_full_polygon(owner_id, make_field):
+    field_id = make_field()
+    # Поле, созданное до появления пирамиды: колонки после миграции пусты
+    with db_session:
+        Field[field_id].set(simplified_25m={}, simplified_100m={}, simplified_500m={}, geometry_version=None)
+
+    assert build_tile(owner_id, 8, 155, 90, 4096, 64)
+
+
+def test_encoded_tile_round_trips():
+    features = [
+        (7, {"name": "Северное", "crop": "Пшеница"}, [[(10, 10), (10, 4000), (2000, 4000), (2000, 10)]]),
+        (8, {"name": "Южное", "crop": None}, [[(-50, 100), (0, -64), (4100, 4150)]]),
+        (9, {"name": "Северное", "crop": "Пшеница"}, [[(3000, 3000), (3000, 3100), (3100, 3000)]]),
+    ]
+
+    layers = decode_tile(encode_tile(features, EXTENT))
+
+    assert list(layers) == ["fields"]
+    layer = layers["fields"]
+    assert (layer["version"], layer["extent"]) == (2, EXTENT)
+    assert layer["features"] == [
+        (7, 3, {"name": "Северное", "crop": "Пшеница"}, [features[0][2][0]]),
+        (8, 3, {"name": "Южное"}, [features[1][2][0]]),
+        (9, 3, {"name": "Северное", "crop": "Пшеница"}, [features[2][2][0]]),
+    ]
+
+
+def test_repeated_attributes_share_tag_tables():
+    features = [(i, {"crop": "Пшеница"}, [[(0, 0), (0, 10), (10, 0)]]) for i in range(3)]
+
+    layer = _messages(_messages(encode_tile(features, EXTENT))[0][1])
+
+    assert [value for field, value in layer if field == 3] == [b"crop"]
+    assert len([value for field, value in layer if field == 4]) == 1
+
+
+def test_empty_tile():
+    assert encode_tile([], EXTENT) == b""
+    assert decode_tile(b"") == {}
+
+
+def test_tile_without_owner_fields_is_empty(owner_id, make_field):
+    make_field()
+
+    # Тайл на другом конце света от полей владельца
+    assert build_tile(owner_id, 12, 0, 0, EXTENT, BUFFER) == b""
+
+
+def test_field_inside_tile_keeps_its_projected_geometry(owner_id, make_field):
+    field_id = make_field()
+    with db_session:
+        coordinates = Field[field_id].coordinates
+    z = 12
+    x, y = _tile_of(47.005, 39.005, z)
+
+    features = decode_tile(build_tile(owner_id, z, x, y, EXTENT, BUFFER))["fields"]["features"]
+
+    (feature_id, geom_type, attributes, rings), = features
+    assert (feature_id, geom_type, attributes) == (field_id, 3, {"name": "Поле 0"})
+    expected = np.rint(project(np.array(coordinates[:-1], dtype=float), z, x, y, EXTENT)).astype(int)
+    assert sorted(rings[0]) == sorted(map(tuple, expected.tolist()))
+
+
+def test_clipped_field_is_cut_at_tile_buffer(owner_id, make_field):
+    make_field()
+    # Тайл, в который попадает только юго-западный угол поля (47.0, 39.0)
+    z = 16
+    x, y = _tile_of(47.0, 39.0, z)
+    corner = np.rint(project(np.array([[47.0, 39.0]]), z, x, y, EXTENT))[0].astype(int)
+    assert 0 <= corner[0] < EXTENT and 0 <= corner[1] < EXTENT
+
+    (_, _, _, rings), = decode_tile(build_tile(owner_id, z, x, y, EXTENT, BUFFER))["fields"]["features"]
+
+    low, high = -BUFFER, EXTENT + BUFFER
+    cx, cy = corner.tolist()
+    assert sorted(rings[0]) == sorted([(cx, cy), (cx, low), (high, low), (high, cy)])
+    # Внешнее кольцо MVT — по часовой стрелке при оси y вниз
+    ring = np.array(rings[0])
+    assert np.sum(ring[:, 0] * np.roll(ring[:, 1], -1) - np.roll(ring[:, 0], -1) * ring[:, 1]) > 0
+
+
+@pytest.mark.parametrize("value", [0, 1, -1, 63, -64, 2 ** 31 - 1, -(2 ** 31)])
+def test_zigzag_round_trips(value):
+    features = [(1, {}, [[(value, 0), (value, 1), (value + 1, 0)]])]
+
+    (_, _, _, rings), = decode_tile(encode_tile(features, EXTENT))["fields"]["features"]
+
+    assert rings[0][0] == (value, 0)